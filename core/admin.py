@@ -1,3 +1,74 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render
+from django.urls import path
+from import_export import fields, resources, widgets
+from import_export.admin import ImportExportModelAdmin
 
-# Register your models here.
+from . import importers
+from .models import Author, Book, Category
+
+# ==========================================
+# BOOKS ADMIN
+# ==========================================
+
+class BookResource(resources.ModelResource):
+    """Same column layout as the bulk importer, so exports can be re-imported."""
+    authors = fields.Field(
+        attribute='authors', column_name='authors',
+        widget=widgets.ManyToManyWidget(Author, separator='،', field='name'),
+    )
+    category = fields.Field(
+        attribute='category', column_name='category',
+        widget=widgets.ForeignKeyWidget(Category, field='name'),
+    )
+
+    class Meta:
+        model = Book
+        fields = ('title', 'isbn', 'authors', 'category', 'publication_year', 'total_copies', 'available_copies', 'status')
+        import_id_fields = ('isbn',)
+        skip_unchanged = True
+
+
+class BulkImportForm(forms.Form):
+    file = forms.FileField(label='ملف الكتالوج (CSV / XLSX)')
+    chunk_size = forms.IntegerField(label='عدد الصفوف في كل دفعة', min_value=100,
+                                    max_value=importers.MAX_CHUNK_SIZE, initial=importers.DEFAULT_CHUNK_SIZE)
+
+
+@admin.register(Book)
+class BookAdmin(ImportExportModelAdmin):
+    resource_classes = [BookResource]
+    change_list_template = 'admin/core/book/change_list.html'
+    list_display = ('title', 'isbn', 'category', 'available_copies', 'status')
+    list_select_related = ('category',)
+
+    def get_urls(self):
+        urls = [
+            path('bulk-import/', self.admin_site.admin_view(self.bulk_import_view), name='core_book_bulk_import'),
+        ]
+        return urls + super().get_urls()
+
+    def bulk_import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = BulkImportForm(request.POST or None, request.FILES or None)
+        report = None
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                fmt = importers.detect_format(upload.name)
+                report = importers.import_books(upload.file, fmt, chunk_size=form.cleaned_data['chunk_size'])
+            except ValueError as e:
+                form.add_error('file', str(e))
+            else:
+                messages.success(request, f'تم استيراد {report.created} كتاب من أصل {report.rows} صف.')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'استيراد دفعي للكتب',
+            'form': form,
+            'report': report,
+        }
+        return render(request, 'admin/core/book/bulk_import.html', context)
@@ -0,0 +1,314 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_http_methods
+
+from .models import Author, Book, Category
+from .pagination import keyset_paginate
+from .text import isbn13
+
+# Field name -> model columns it needs (sparse ?fields= only loads these)
+BOOK_FIELDS = {
+    'id': ('id',),
+    'title': ('title',),
+    'isbn': ('isbn',),
+    'isbn13': ('isbn13',),
+    'authors': (),
+    'category': ('category', 'category__name'),
+    'publication_year': ('publication_year',),
+    'status': ('status',),
+    'total_copies': ('total_copies',),
+    'available_copies': ('available_copies',),
+    'cover_url': ('cover_image',),
+    'last_updated': ('last_updated',),
+}
+AVAILABILITY_FIELDS = ('id', 'status', 'available_copies', 'total_copies')
+SCAN_FIELDS = ('id', 'title', 'isbn', 'isbn13', *AVAILABILITY_FIELDS[1:])
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view):
+    """Session-authenticated JSON view: 401 instead of a login redirect, ApiError as JSON."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Authentication required.', 401)
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return _error(str(e), e.status)
+    return wrapper
+
+
+def _json(data):
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+def _int_list(value, name):
+    try:
+        return [int(part) for part in value.split(',') if part.strip()] if value else []
+    except ValueError:
+        raise ApiError(f'{name} must be a comma separated list of integers.')
+
+
+# ==========================================
+# BOOK SERIALIZATION
+# ==========================================
+
+def parse_fields(request, default=tuple(BOOK_FIELDS)):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = sorted(set(fields) - set(BOOK_FIELDS))
+    if unknown:
+        raise ApiError(f'Unknown field(s): {", ".join(unknown)}. Available: {", ".join(BOOK_FIELDS)}.')
+    return fields
+
+
+def book_queryset(fields):
+    """Books with only the columns and relations the requested fields need."""
+    books = Book.objects.all()
+    if 'category' in fields:
+        books = books.select_related('category')
+    if 'authors' in fields:
+        books = books.prefetch_related(Prefetch('authors', queryset=Author.objects.only('id', 'name').order_by('id')))
+    columns = {'id', 'last_updated'}
+    for field in fields:
+        columns.update(BOOK_FIELDS[field])
+    return books.only(*columns)
+
+
+def serialize_book(book, fields):
+    data = {}
+    for field in fields:
+        if field == 'authors':
+            data['authors'] = [{'id': a.id, 'name': a.name} for a in book.authors.all()]
+        elif field == 'category':
+            data['category'] = {'id': book.category.id, 'name': book.category.name} if book.category else None
+        elif field == 'cover_url':
+            data['cover_url'] = book.cover_image.url if book.cover_image else None
+        elif field == 'last_updated':
+            data['last_updated'] = book.last_updated.isoformat()
+        else:
+            data[field] = getattr(book, field)
+    return data
+
+
+def _filtered_books(request, books):
+    category = request.GET.get('category')
+    author = request.GET.get('author')
+    status = request.GET.get('status')
+    try:
+        if category:
+            books = books.filter(category_id=int(category))
+        if author:
+            books = books.filter(authors__id=int(author))
+    except ValueError:
+        raise ApiError('category and author must be integer ids.')
+    if status:
+        if status not in dict(Book.STATUS_CHOICES):
+            raise ApiError(f'Unknown status: {status}.')
+        books = books.filter(status=status)
+    return books
+
+
+def _page_links(request, page):
+    return {
+        'next': f'{request.path}?{page.next_query}' if page.has_next else None,
+        'previous': f'{request.path}?{page.prev_query}' if page.has_previous else None,
+    }
+
+
+# ==========================================
+# CONDITIONAL GET
+# ==========================================
+
+def _with_etag(request, response):
+    # No timestamp on these tables: validate against a hash of the body instead
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    response['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def _book_page_version(request):
+    # Keys and last_updated of the rows on the requested page only: one narrow keyset
+    # query, no serialization. Author/category renames bump last_updated (touch_books).
+    # Memoised on the request because both the ETag and Last-Modified hooks need it.
+    if not hasattr(request, '_api_version'):
+        try:
+            books = _filtered_books(request, Book.objects.only('id', 'last_updated'))
+        except ApiError:
+            request._api_version = None
+        else:
+            page = keyset_paginate(request, books, keys=('id',))
+            rows = [(book.id, book.last_updated.timestamp()) for book in page]
+            request._api_version = {
+                'key': f'{request.GET.urlencode()}|{rows}|{page.next_query}|{page.prev_query}',
+                'changed': max((book.last_updated for book in page), default=None),
+            }
+    return request._api_version
+
+
+def _book_list_etag(request):
+    version = _book_page_version(request)
+    return hashlib.md5(version['key'].encode()).hexdigest() if version else None
+
+
+def _book_list_last_modified(request):
+    version = _book_page_version(request)
+    return version['changed'] if version else None
+
+
+def _book_last_modified(request, pk):
+    if not hasattr(request, '_api_version'):
+        request._api_version = Book.objects.filter(pk=pk).values_list('last_updated', flat=True).first()
+    return request._api_version
+
+
+def _book_etag(request, pk):
+    changed = _book_last_modified(request, pk)
+    if changed is None:
+        return None
+    return hashlib.md5(f'{pk}|{changed.timestamp()}|{request.GET.urlencode()}'.encode()).hexdigest()
+
+
+# ==========================================
+# ENDPOINTS
+# ==========================================
+
+@require_GET
+@api_view
+@condition(etag_func=_book_list_etag, last_modified_func=_book_list_last_modified)
+def book_list(request):
+    fields = parse_fields(request)
+    books = _filtered_books(request, book_queryset(fields))
+    page = keyset_paginate(request, books, keys=('id',))
+    return _json({'results': [serialize_book(book, fields) for book in page], **_page_links(request, page)})
+
+
+@require_GET
+@api_view
+@condition(etag_func=_book_etag, last_modified_func=_book_last_modified)
+def book_detail(request, pk):
+    fields = parse_fields(request)
+    return _json(serialize_book(get_object_or_404(book_queryset(fields), pk=pk), fields))
+
+
+@require_GET
+@api_view
+@condition(etag_func=_book_etag, last_modified_func=_book_last_modified)
+def book_availability(request, pk):
+    book = get_object_or_404(Book.objects.only(*AVAILABILITY_FIELDS), pk=pk)
+    return _json(serialize_book(book, AVAILABILITY_FIELDS))
+
+
+@require_GET
+@api_view
+def book_scan(request):
+    """
+    Resolve one scanned code (?code=: ISBN-10/13, hyphenated, EAN-13 with an
+    add-on) to its book and live availability. One query on the isbn13
+    unique index and no template; codes that are not valid ISBNs are looked
+    up as typed, for legacy records.
+    """
+    code = request.GET.get('code', '').strip()
+    if not code:
+        raise ApiError('Pass the scanned code as ?code=.')
+    canonical = isbn13(code)
+    lookup = {'isbn13': canonical} if canonical else {'isbn__in': {code, code.replace('-', '')}}
+    book = Book.objects.only(*SCAN_FIELDS).filter(**lookup).first()
+    if book is None:
+        return JsonResponse({'error': 'No book with this code.', 'code': code, 'isbn13': canonical}, status=404)
+    return _json({'code': code, **serialize_book(book, SCAN_FIELDS)})
+
+
+def _named_list(request, model):
+    page = keyset_paginate(request, model.objects.only('id', 'name'), keys=('id',))
+    return _with_etag(request, _json({
+        'results': [{'id': obj.id, 'name': obj.name} for obj in page],
+        **_page_links(request, page),
+    }))
+
+
+@require_GET
+@api_view
+def author_list(request):
+    return _named_list(request, Author)
+
+
+@require_GET
+@api_view
+def category_list(request):
+    return _named_list(request, Category)
+
+
+@csrf_exempt  # read-only lookup: POST only so a few hundred ISBNs fit in the body
+@require_http_methods(['GET', 'POST'])
+@api_view
+def book_lookup(request):
+    """
+    Fetch many books in one call: ?ids=1,2&isbns=978...,978... or a JSON
+    body {"ids": [...], "isbns": [...]}. Costs one query plus one for
+    authors, whatever the number of books.
+    """
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body or b'{}')
+            ids = [int(pk) for pk in body.get('ids', [])]
+            isbns = [str(isbn).strip() for isbn in body.get('isbns', [])]
+        except (ValueError, TypeError, AttributeError):
+            raise ApiError('Body must be JSON like {"ids": [1, 2], "isbns": ["978..."]}.')
+    else:
+        ids = _int_list(request.GET.get('ids'), 'ids')
+        isbns = [isbn.strip() for isbn in request.GET.get('isbns', '').split(',') if isbn.strip()]
+
+    limit = getattr(settings, 'API_LOOKUP_LIMIT', 500)
+    if len(ids) + len(isbns) > limit:
+        raise ApiError(f'At most {limit} ids and ISBNs per call.')
+    if not ids and not isbns:
+        raise ApiError('Pass ids and/or isbns.')
+
+    fields = parse_fields(request)
+    # Any ISBN-10/13 form matches through the canonical column; other codes match as typed
+    keys = {isbn: isbn13(isbn) or isbn for isbn in isbns}
+    found = list(book_queryset(set(fields) | {'isbn', 'isbn13'}).filter(
+        Q(pk__in=ids) | Q(isbn13__in=keys.values()) | Q(isbn__in=keys.values()),
+    ))
+    by_id = {book.pk: book for book in found}
+    by_isbn = {book.isbn: book for book in found} | {book.isbn13: book for book in found if book.isbn13}
+    results = {}
+    for pk in ids:
+        if pk in by_id:
+            results[pk] = serialize_book(by_id[pk], fields)
+    for isbn in isbns:
+        if keys[isbn] in by_isbn:
+            book = by_isbn[keys[isbn]]
+            results[book.pk] = serialize_book(book, fields)
+    response = _json({
+        'results': list(results.values()),
+        'missing': {
+            'ids': [pk for pk in ids if pk not in by_id],
+            'isbns': [isbn for isbn in isbns if keys[isbn] not in by_isbn],
+        },
+    })
+    if found:
+        response['Last-Modified'] = http_date(max(book.last_updated for book in found).timestamp())
+    return response
@@ -0,0 +1,84 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ArchivedBorrow, Borrow
+
+# Returned loans from past years are moved to borrowing_borrow_archive, so the
+# live table only holds open and recent loans. Rows keep their id; pages and
+# exports read the archive only when asked for history.
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def get_keep_years():
+    return getattr(settings, 'LOAN_ARCHIVE_KEEP_YEARS', 1)
+
+
+def default_cutoff(today=None):
+    """1 January of the oldest year kept live: archiving always moves whole years."""
+    today = today or date.today()
+    return date(today.year - get_keep_years(), 1, 1)
+
+
+def archived_through():
+    """Latest return date in the archive: no archived loan has any date after it."""
+    return ArchivedBorrow.objects.aggregate(last=Max('return_date'))['last']
+
+
+def archivable(before):
+    return Borrow.objects.filter(status='returned', return_date__lt=before)
+
+
+def _move_sql():
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(f.column) for f in ArchivedBorrow._meta.concrete_fields if f.name != 'archived_at')
+    archive, live = quote(ArchivedBorrow._meta.db_table), quote(Borrow._meta.db_table)
+    # Same condition as archivable(), bounded by the last id of the chunk
+    where = f"{quote('id')} <= %s AND {quote('status')} = 'returned' AND {quote('return_date')} < %s"
+    return (
+        f'INSERT INTO {archive} ({columns}, {quote("archived_at")}) SELECT {columns}, %s FROM {live} WHERE {where}',
+        f'DELETE FROM {live} WHERE {where}',
+    )
+
+
+def archive_loans(before=None, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """
+    Move returned loans with a return date before `before` (default:
+    default_cutoff()) into ArchivedBorrow, `chunk_size` rows per transaction
+    so the write lock is only ever held briefly. Rows are copied and deleted
+    in SQL, without loading them or firing model signals: a returned loan
+    counts towards no counter, and the audit log records edits, not moves.
+    Returns the number of loans moved.
+    """
+    before = before or default_cutoff()
+    insert, delete = _move_sql()
+    cutoff = connection.ops.adapt_datefield_value(before)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(archivable(before).order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return moved
+            with connection.cursor() as cursor:
+                cursor.execute(insert, [connection.ops.adapt_datetimefield_value(timezone.now()), ids[-1], cutoff])
+                cursor.execute(delete, [ids[-1], cutoff])
+        moved += len(ids)
+        if on_chunk:
+            on_chunk(ids[0], ids[-1], len(ids))
+
+
+# ==========================================
+# HISTORY (live + archived)
+# ==========================================
+
+def member_loans(member_id, history=False):
+    """A member's loans as one queryset per table: only the live one unless `history`."""
+    related = ('book', 'employee__user')
+    loans = [Borrow.objects.filter(member_id=member_id).select_related(*related)]
+    if history:
+        loans.append(ArchivedBorrow.objects.filter(member_id=member_id).select_related(*related))
+    return loans
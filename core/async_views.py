@@ -0,0 +1,105 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import aget_object_or_404, render
+
+from .auth import get_role
+from .circulation import with_borrow_stats
+from .recommendations import also_borrowed, suggested_for
+from .models import Book, Borrow, Member
+from .pagination import akeyset_paginate
+from .stats import get_dashboard_counters
+
+# Async twins of the read-only views in views.py, routed when ASYNC_VIEWS is on
+# (library/asgi.py turns it on). Every query is awaited up front with related
+# rows joined or prefetched, so rendering the template never touches the DB.
+
+
+async def _load_user(request):
+    # Resolve the lazy request.user and the cached role before the context
+    # processors read them, since those would otherwise query synchronously
+    request.user = user = await request.auser()
+    if user.is_authenticated:
+        await sync_to_async(get_role)(user)
+
+
+async def _fetch(queryset):
+    return [obj async for obj in queryset]
+
+
+# ==========================================
+# DASHBOARD / HOME VIEW
+# ==========================================
+
+@login_required
+async def home(request):
+    # The independent reads are awaited together instead of one after another
+    counters, latest_books, latest_borrowings, _ = await asyncio.gather(
+        sync_to_async(get_dashboard_counters)(),
+        _fetch(Book.objects.select_related('category').order_by('-id')[:5]),
+        _fetch(Borrow.objects.select_related('book', 'member').order_by('-borrow_date')[:5]),
+        _load_user(request),
+    )
+    context = {**counters, 'latest_books': latest_books, 'latest_borrowings': latest_borrowings}
+    return render(request, 'index.html', context)
+
+
+# ==========================================
+# BOOKS VIEWS
+# ==========================================
+
+@login_required
+async def book_list(request):
+    books = Book.objects.select_related('category').prefetch_related('authors')
+    page, _ = await asyncio.gather(akeyset_paginate(request, books, keys=('id',)), _load_user(request))
+    return render(request, 'books/book_list.html', {'books': page, 'page': page})
+
+
+@login_required
+async def book_detail(request, pk):
+    book, neighbors, _ = await asyncio.gather(
+        aget_object_or_404(Book.objects.select_related('category').prefetch_related('authors'), pk=pk),
+        _fetch(also_borrowed(pk, limit=6)),
+        _load_user(request),
+    )
+    return render(request, 'books/book_detail.html', {'book': book, 'title': book.title, 'also_borrowed': neighbors})
+
+
+# ==========================================
+# MEMBERS VIEWS
+# ==========================================
+
+@login_required
+async def member_detail(request, pk):
+    member, suggestions, _ = await asyncio.gather(
+        aget_object_or_404(with_borrow_stats(Member.objects.all()), pk=pk),
+        _fetch(suggested_for(pk)),
+        _load_user(request),
+    )
+    return render(request, 'members/member_detail.html', {
+        'member': member, 'title': member.full_name, 'suggestions': suggestions,
+    })
+
+
+# ==========================================
+# BORROWING VIEWS
+# ==========================================
+
+@login_required
+async def borrowing_list(request):
+    borrowings = Borrow.objects.select_related('book', 'member', 'employee__user')
+    page, _ = await asyncio.gather(
+        akeyset_paginate(request, borrowings, keys=('borrow_date', 'id'), descending=True),
+        _load_user(request),
+    )
+    return render(request, 'borrowing/borrow_list.html', {'borrowings': page, 'page': page})
+
+
+@login_required
+async def borrowing_detail(request, pk):
+    borrow, _ = await asyncio.gather(
+        aget_object_or_404(Borrow.objects.select_related('book', 'member', 'employee__user'), pk=pk),
+        _load_user(request),
+    )
+    return render(request, 'borrowing/borrow_detail.html', {'borrow': borrow, 'title': 'تفاصيل الإعارة'})
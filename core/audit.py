@@ -0,0 +1,231 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import BufferingHandler, QueueHandler, QueueListener
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, transaction
+from django.db.models.fields.files import FieldFile, FileField
+from django.utils import timezone
+
+from .models import AuditEvent
+
+# Requests never touch the audit table: signal handlers put events on a
+# logging queue once the transaction commits, and one listener thread per
+# process writes them with bulk_create.
+
+logger = logging.getLogger('core.audit')
+
+# Bookkeeping columns that change on every save and would drown the real edits
+IGNORED_FIELDS = {'last_updated', 'cover_thumbnail_source', 'name_key', 'isbn13'}
+
+_actor = ContextVar('audit_actor', default=None)
+_queue = queue.Queue()
+_listener = []
+_listener_lock = threading.Lock()
+
+
+def get_batch_size():
+    return getattr(settings, 'AUDIT_BATCH_SIZE', 200)
+
+
+def get_flush_interval():
+    return getattr(settings, 'AUDIT_FLUSH_SECONDS', 1.0)
+
+
+# ==========================================
+# CAPTURE
+# ==========================================
+
+def set_actor(user):
+    """Attribute events from the current request/task to `user`; returns a token for reset_actor()."""
+    return _actor.set(user)
+
+
+def reset_actor(token):
+    _actor.reset(token)
+
+
+def _plain(value, field):
+    if isinstance(value, FieldFile):
+        value = value.name
+    if isinstance(field, FileField):
+        return value or None  # '' in the table, None on an unsaved instance
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _fields(model):
+    return [f for f in model._meta.concrete_fields if f.attname not in IGNORED_FIELDS]
+
+
+def snapshot(instance):
+    return {f.attname: _plain(f.value_from_object(instance), f) for f in _fields(type(instance))}
+
+
+def stored_snapshot(model, pk):
+    """The row as it is in the database, before a save changes it."""
+    fields = _fields(model)
+    row = model._default_manager.filter(pk=pk).values_list(*[f.attname for f in fields]).first()
+    return None if row is None else {f.attname: _plain(value, f) for f, value in zip(fields, row)}
+
+
+def diff(old, new):
+    old, new = old or {}, new or {}
+    return {name: [old.get(name), new.get(name)] for name in old.keys() | new.keys() if old.get(name) != new.get(name)}
+
+
+def field_changes(model, old, new):
+    """diff() of a few {attname: value} columns, for writes done by a set-based UPDATE instead of save()."""
+    fields = {f.attname: f for f in _fields(model)}
+    return diff(
+        {name: _plain(value, fields[name]) for name, value in old.items()},
+        {name: _plain(value, fields[name]) for name, value in new.items()},
+    )
+
+
+def _describe(instance):
+    label = getattr(instance, 'title', None) or getattr(instance, 'full_name', None)
+    if label:
+        return str(label)
+    # Loans and employees: __str__ reads relations, which a cascade may already have deleted
+    try:
+        return str(instance)
+    except ObjectDoesNotExist:
+        return ''
+
+
+def record(action, instance, changes, label=None):
+    """
+    Queue an audit event for `instance`, to be written after the current
+    transaction commits. `label` replaces the description taken from the
+    instance, for callers that only have its pk.
+    """
+    if action == 'update' and not changes:
+        return
+    user = _actor.get()
+    actor = user if user is not None and user.is_authenticated else None
+    event = {
+        'timestamp': timezone.now(),
+        'actor_id': actor.pk if actor else None,
+        'actor_name': actor.get_username() if actor else '',
+        'action': action,
+        'model': instance._meta.model_name,
+        'object_id': str(instance.pk),
+        'object_repr': (label or _describe(instance))[:200],
+        'changes': changes,
+    }
+    transaction.on_commit(lambda: _emit(event))
+
+
+# ==========================================
+# QUEUE / BATCHED WRITER
+# ==========================================
+
+def write(events):
+    AuditEvent.objects.bulk_create([AuditEvent(**event) for event in events], batch_size=get_batch_size())
+
+
+class AuditTableHandler(BufferingHandler):
+    """
+    Buffers audit records and writes them in one bulk_create when the
+    buffer is full, its oldest record is `interval` seconds old, or a
+    flush marker arrives. Runs on the listener thread only.
+    """
+
+    def __init__(self, capacity, interval):
+        super().__init__(capacity)
+        self.interval = interval
+        self._oldest = None
+
+    def shouldFlush(self, record):
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        return (
+            getattr(record, 'audit_flush', False)
+            or len(self.buffer) >= self.capacity
+            or time.monotonic() - self._oldest >= self.interval
+        )
+
+    def flush(self):
+        self.acquire()
+        try:
+            events = [r.audit for r in self.buffer if hasattr(r, 'audit')]
+            self.buffer, self._oldest = [], None
+            if not events:
+                return
+            try:
+                close_old_connections()
+                write(events)
+            except Exception:
+                logging.getLogger(__name__).exception('Could not write %d audit events', len(events))
+            finally:
+                close_old_connections()
+        finally:
+            self.release()
+
+
+class AuditListener(QueueListener):
+    """QueueListener that also flushes its handlers whenever the queue has been idle for `interval`."""
+
+    def __init__(self, queue, handler, interval):
+        super().__init__(queue, handler)
+        self.interval = interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+
+def _ensure_listener():
+    with _listener_lock:
+        if _listener:
+            return
+        handler = AuditTableHandler(get_batch_size(), get_flush_interval())
+        listener = AuditListener(_queue, handler, get_flush_interval())
+        logger.addHandler(QueueHandler(_queue))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        listener.start()
+        _listener[:] = [listener]
+        atexit.register(stop)
+
+
+def _emit(event):
+    if not getattr(settings, 'AUDIT_ASYNC', True):
+        write([event])
+        return
+    _ensure_listener()
+    logger.info('%s %s #%s', event['action'], event['model'], event['object_id'], extra={'audit': event})
+
+
+def flush(timeout=None):
+    """Block until every queued event is in the table (for commands and tests)."""
+    if not _listener:
+        return True
+    logger.info('flush', extra={'audit_flush': True})
+    with _queue.all_tasks_done:
+        return _queue.all_tasks_done.wait_for(lambda: not _queue.unfinished_tasks, timeout)
+
+
+def stop():
+    """Write whatever is still buffered and stop the listener thread."""
+    with _listener_lock:
+        if not _listener:
+            return
+        listener = _listener.pop()
+        # The sentinel is queued behind every pending record, and the marker makes the handler write them
+        logger.info('flush', extra={'audit_flush': True})
+        listener.stop()
+        for handler in list(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                logger.removeHandler(handler)
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Employee
+
+_NO_ROLE = ''
+
+
+def _role_key(user_id):
+    return f'auth:role:{user_id}'
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _ttl():
+    return getattr(settings, 'AUTH_CACHE_TTL', 3600)
+
+
+def get_role(user):
+    """
+    The user's Employee.role, or None for non-employees.
+    Looked up once per user and kept in the cache (and on the user object
+    for the rest of the request) until the Employee row changes.
+    """
+    if not user.is_authenticated:
+        return None
+    try:
+        return user._library_role or None
+    except AttributeError:
+        pass
+    role = cache.get(_role_key(user.pk))
+    if role is None:
+        role = Employee.objects.filter(user_id=user.pk).values_list('role', flat=True).first() or _NO_ROLE
+        cache.set(_role_key(user.pk), role, _ttl())
+    user._library_role = role
+    return role or None
+
+
+def is_manager(user):
+    return user.is_authenticated and (user.is_superuser or get_role(user) == 'manager')
+
+
+def invalidate_role(user_id):
+    transaction.on_commit(lambda: cache.delete(_role_key(user_id)))
+
+
+def invalidate_user(user_id):
+    transaction.on_commit(lambda: cache.delete(_user_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() (run by AuthenticationMiddleware on every
+    request) is served from the cache. Entries are dropped whenever the User
+    row is saved or deleted, so password changes still end other sessions.
+    """
+
+    def get_user(self, user_id):
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, _ttl())
+        return user if self.user_can_authenticate(user) else None
+
@@ -0,0 +1,113 @@
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+from django.urls import URLPattern, reverse
+
+from . import urls
+from .models import Book, Borrow, Employee, Member
+
+DEFAULT_REPEAT = 20
+DEFAULT_THRESHOLD = 1.25
+
+# URL prefix -> model whose first row fills <int:pk>
+_DETAIL_MODELS = {
+    'books/': Book,
+    'members/': Member,
+    'employees/': Employee,
+    'borrowing/': Borrow,
+}
+
+
+def discover_urls():
+    """Yield (name, path) for every GET-able route in core/urls.py."""
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        route = str(pattern.pattern)
+        name = f'{urls.app_name}:{pattern.name}'
+        if '<int:pk>' not in route:
+            yield name, reverse(name)
+            continue
+        model = next((m for prefix, m in _DETAIL_MODELS.items() if route.startswith(prefix)), None)
+        pk = model.objects.order_by('pk').values_list('pk', flat=True).first() if model else None
+        if pk is not None:
+            yield name, reverse(name, args=[pk])
+
+
+def _fetch(client, path):
+    response = client.get(path)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(client, path, repeat=DEFAULT_REPEAT):
+    # Warm-up request: template loading and first-hit caches are not what we measure
+    _fetch(client, path)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = _fetch(client, path)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Count through an execute wrapper: request_started resets connection.queries
+    queries = []
+    with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+        _fetch(client, path)
+
+    # Separate pass: tracemalloc slows every allocation down and would skew the timings
+    tracemalloc.start()
+    try:
+        _fetch(client, path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'path': path,
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'queries': len(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(client, repeat=DEFAULT_REPEAT, on_view=None):
+    results = {}
+    for name, path in discover_urls():
+        results[name] = measure(client, path, repeat)
+        if on_view:
+            on_view(name, results[name])
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Return a list of human-readable regressions against `baseline`.
+    Latency (p95) and peak memory may grow up to `threshold` times the
+    baseline; query counts are deterministic, so any increase counts.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in ('p95_ms', 'peak_kb'):
+            if before[metric] and current[metric] > before[metric] * threshold:
+                regressions.append(
+                    f'{name}: {metric} {before[metric]} -> {current[metric]} (x{current[metric] / before[metric]:.2f})'
+                )
+        if current['queries'] > before['queries']:
+            regressions.append(f'{name}: queries {before["queries"]} -> {current["queries"]}')
+    return regressions
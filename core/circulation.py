@@ -0,0 +1,504 @@
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case, Count, DecimalField, Exists, ExpressionWrapper, F, Func, IntegerField, Max, Min, OuterRef, Q, Subquery,
+    Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest, Least, Now
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from . import audit, stats
+from .models import Book, Borrow, Member, Reservation
+
+OPEN_STATUSES = ('active', 'overdue')
+
+
+class CirculationError(ValidationError):
+    """A checkout or return that the current stock/limits do not allow."""
+
+
+def _take_copy(book_id):
+    # Single guarded UPDATE: concurrent desks can never push the count below zero
+    return Book.objects.filter(pk=book_id, available_copies__gt=0).update(
+        available_copies=F('available_copies') - 1,
+        status=Case(
+            When(available_copies=1, status='available', then=Value('borrowed')),
+            default=F('status'),
+        ),
+        last_updated=Now(),
+    )
+
+
+def _release_copy(book_id):
+    return Book.objects.filter(pk=book_id).update(
+        available_copies=F('available_copies') + 1,
+        status=Case(When(status='borrowed', then=Value('available')), default=F('status')),
+        last_updated=Now(),
+    )
+
+
+def _take_slot(member_id):
+    return Member.objects.filter(pk=member_id, current_borrowed__lt=F('max_borrow_limit')).update(
+        current_borrowed=F('current_borrowed') + 1,
+    )
+
+
+def _release_slot(member_id):
+    return Member.objects.filter(pk=member_id, current_borrowed__gt=0).update(
+        current_borrowed=F('current_borrowed') - 1,
+    )
+
+
+def checkout(book, member, employee=None, due_date=None):
+    """
+    Lend one copy of `book` to `member` and return the new Borrow.
+    A member collecting a ready hold gets the copy set aside for them.
+    Raises CirculationError (and changes nothing) when no copy is available
+    or the member already holds `max_borrow_limit` books.
+    """
+    with transaction.atomic():
+        collected = Reservation.objects.filter(book=book, member=member, status='ready').update(status='fulfilled')
+        if not collected and not _take_copy(book.pk):
+            raise CirculationError('لا توجد نسخ متاحة من هذا الكتاب حالياً.', code='no_copies')
+        if not _take_slot(member.pk):
+            raise CirculationError('تجاوز العضو الحد الأقصى للإعارة.', code='limit_reached')
+        if collected:
+            _sync_hold_status(book.pk)
+        return Borrow.objects.create(book=book, member=member, employee=employee, due_date=due_date)
+
+
+def return_loan(borrow, return_date=None):
+    """
+    Close an open loan and give the copy and the member's slot back.
+    Raises CirculationError if the loan was already returned.
+    """
+    return_date = return_date or date.today()
+    with transaction.atomic():
+        stored = Borrow.objects.filter(pk=borrow.pk).values_list('status', 'return_date').first()
+        status = stored[0] if stored else None
+        # Guarded on the status just read: a concurrent return makes this UPDATE a no-op
+        if status not in OPEN_STATUSES or not Borrow.objects.filter(pk=borrow.pk, status=status).update(
+            status='returned', return_date=return_date,
+        ):
+            raise CirculationError('تم إرجاع هذه الإعارة مسبقاً.', code='already_returned')
+        # Neither the counter nor the audit log sees this UPDATE through post_save
+        audit.record('update', borrow, audit.field_changes(
+            Borrow, dict(zip(('status', 'return_date'), stored)), {'status': 'returned', 'return_date': return_date},
+        ))
+        if status == 'active':
+            stats.increment('total_borrowed', -1)
+        # Free the slot first: the returning member may be next in line for another hold
+        _release_slot(borrow.member_id)
+        _pass_on_copy(borrow.book_id)
+
+    borrow.status = 'returned'
+    borrow.return_date = return_date
+    return borrow
+
+
+# ==========================================
+# BATCH CHECKOUT / RETURN (circulation desk)
+# ==========================================
+
+def _per_row(counts):
+    # CASE pk WHEN .. THEN n ..: a different amount per row in one set-based UPDATE
+    return Case(
+        *[When(pk=pk, then=Value(n)) for pk, n in counts.items()], default=Value(0), output_field=IntegerField(),
+    )
+
+
+def _take_copies(counts):
+    taking = _per_row(counts)
+    return Book.objects.filter(pk__in=counts, available_copies__gte=taking).update(
+        available_copies=F('available_copies') - taking,
+        status=Case(
+            When(available_copies=taking, status='available', then=Value('borrowed')),
+            default=F('status'),
+        ),
+        last_updated=Now(),
+    )
+
+
+def _release_copies(counts):
+    giving = _per_row(counts)
+    return Book.objects.filter(pk__in=counts).update(
+        available_copies=F('available_copies') + giving,
+        status=Case(When(status='borrowed', then=Value('available')), default=F('status')),
+        last_updated=Now(),
+    )
+
+
+def checkout_many(books, member, employee=None, due_date=None):
+    """
+    Lend one copy of each of `books` (a book scanned twice lends two copies)
+    to `member` in one transaction, with the same handful of queries whatever
+    the basket size: one guarded UPDATE for the stock, one for the member's
+    slots and one bulk INSERT. Ready holds of the member are collected.
+    Raises CirculationError (and changes nothing) naming the books without
+    enough copies, or when the basket takes the member past max_borrow_limit.
+    Returns the new Borrow rows, in scan order.
+    """
+    wanted = Counter(book.pk for book in books)
+    if not wanted:
+        return []
+    due_date = due_date or date.today() + timedelta(days=14)
+    with transaction.atomic():
+        holds = Reservation.objects.filter(book_id__in=wanted, member=member, status='ready')
+        collected = set(holds.values_list('book_id', flat=True))
+        if collected:
+            holds.update(status='fulfilled')
+        # A collected hold covers one copy of its book
+        needed = {pk: n - (pk in collected) for pk, n in wanted.items() if n - (pk in collected)}
+        if needed:
+            stock = Book.objects.filter(pk__in=needed).values_list('pk', 'available_copies', 'title')
+            short = [title for pk, available, title in stock if available < needed[pk]]
+            if short or _take_copies(needed) != len(needed):
+                raise CirculationError(
+                    'لا توجد نسخ متاحة كافية من: %(titles)s', code='no_copies',
+                    params={'titles': '، '.join(short) or '-'},
+                )
+        basket = sum(wanted.values())
+        if not Member.objects.filter(pk=member.pk, current_borrowed__lte=F('max_borrow_limit') - basket).update(
+            current_borrowed=F('current_borrowed') + basket,
+        ):
+            raise CirculationError('تجاوز العضو الحد الأقصى للإعارة.', code='limit_reached')
+        if collected:
+            _sync_hold_status(*collected)
+        # bulk_create skips Borrow.save() and post_save: due date, counter and audit are done here
+        loans = Borrow.objects.bulk_create([
+            Borrow(book=book, member=member, employee=employee, due_date=due_date) for book in books
+        ])
+        stats.increment('total_borrowed', len(loans))
+        for loan in loans:
+            audit.record('create', loan, audit.diff(None, audit.snapshot(loan)))
+    return loans
+
+
+def open_loans_for(books, member=None):
+    """
+    The open loan each scanned book belongs to, in scan order (a book scanned
+    twice closes two loans). Without `member` a book lent to several members
+    cannot be told apart, and raises CirculationError.
+    """
+    wanted = Counter(book.pk for book in books)
+    loans = Borrow.objects.filter(book_id__in=wanted, status__in=OPEN_STATUSES).order_by('borrow_date', 'id')
+    if member is not None:
+        loans = loans.filter(member=member)
+    by_book = {}
+    for loan in loans.select_related('book', 'member'):
+        by_book.setdefault(loan.book_id, []).append(loan)
+
+    missing = [book.title for book in books if len(by_book.get(book.pk, ())) < wanted[book.pk]]
+    if missing:
+        raise CirculationError('لا توجد إعارة مفتوحة لـ: %(titles)s', code='not_borrowed',
+                               params={'titles': '، '.join(dict.fromkeys(missing))})
+    if member is None:
+        shared = [group[0].book.title for group in by_book.values() if len({loan.member_id for loan in group}) > 1]
+        if shared:
+            raise CirculationError('الكتاب مُعار لأكثر من عضو، امسح بطاقة العضو: %(titles)s', code='ambiguous',
+                                   params={'titles': '، '.join(shared)})
+    return [by_book[book.pk].pop(0) for book in books]
+
+
+def return_many(borrows, return_date=None):
+    """
+    Close several open loans in one transaction: one UPDATE for the loans,
+    one for the members' slots and one for the stock of books nobody is
+    waiting for. Copies of held books are passed on one by one, as in
+    return_loan(). Raises CirculationError if any loan is already returned.
+    Returns the number of loans closed.
+    """
+    return_date = return_date or date.today()
+    ids = {borrow.pk for borrow in borrows}
+    if not ids:
+        return 0
+    with transaction.atomic():
+        open_loans = Borrow.objects.filter(pk__in=ids, status__in=OPEN_STATUSES)
+        stored = list(open_loans.values_list('pk', 'book_id', 'member_id', 'status', 'return_date'))
+        if len(stored) != len(ids):
+            raise CirculationError('تم إرجاع بعض هذه الإعارات مسبقاً.', code='already_returned')
+        open_loans.update(status='returned', return_date=return_date)
+        # The UPDATE above bypasses post_save: counter and audit events are done here
+        rows = [(book_id, member_id, status) for _, book_id, member_id, status, _ in stored]
+        stats.increment('total_borrowed', -sum(status == 'active' for _, _, status in rows))
+        loans = {borrow.pk: borrow for borrow in borrows}
+        for pk, _, _, status, old_return_date in stored:
+            audit.record('update', loans[pk], audit.field_changes(
+                Borrow, {'status': status, 'return_date': old_return_date},
+                {'status': 'returned', 'return_date': return_date},
+            ))
+
+        slots = Counter(member_id for _, member_id, _ in rows)
+        Member.objects.filter(pk__in=slots).update(current_borrowed=Greatest(F('current_borrowed') - _per_row(slots), 0))
+
+        copies = Counter(book_id for book_id, _, _ in rows)
+        waiting = set(
+            Reservation.objects.filter(book_id__in=copies, status='waiting').values_list('book_id', flat=True)
+        )
+        for book_id in waiting:
+            for _ in range(copies.pop(book_id)):
+                _pass_on_copy(book_id)
+        if copies:
+            _release_copies(copies)
+            _sync_hold_status(*copies)
+    return len(rows)
+
+
+# ==========================================
+# OVERDUE SWEEP
+# ==========================================
+
+class DaysSince(Func):
+    """Whole days between a date column and a fixed `today`, computed in SQL."""
+    output_field = IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, **extra)
+        self.today = today
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f'(%s - {sql})', [self.today, *params]
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f'CAST(julianday(%s) - julianday({sql}) AS INTEGER)', [self.today.isoformat(), *params]
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f'DATEDIFF(%s, {sql})', [self.today, *params]
+
+
+def get_fine_rates():
+    rates = getattr(settings, 'FINE_RATES_PER_DAY', {})
+    return {level: Decimal(str(rate)) for level, rate in rates.items()}
+
+
+def _member_rate(rates):
+    # Correlated subquery: UPDATE cannot join, so look the member's rate up per row
+    rate = Case(
+        *[When(membership_level=level, then=Value(amount)) for level, amount in rates.items()],
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    return Subquery(Member.objects.filter(pk=OuterRef('member_id')).annotate(rate=rate).values('rate')[:1])
+
+
+def sweep_overdue(today=None, rates=None, chunk_size=10000, on_chunk=None):
+    """
+    Flip active loans past due_date to 'overdue' and recompute fine_amount
+    for every open overdue loan, as two set-based UPDATEs per id window.
+    No Borrow instance is loaded. Returns (flipped, fined) totals.
+    """
+    today = today or date.today()
+    rates = get_fine_rates() if rates is None else rates
+    late = Borrow.objects.filter(status__in=OPEN_STATUSES, due_date__lt=today)
+    bounds = late.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0, 0
+
+    fine = ExpressionWrapper(
+        DaysSince(F('due_date'), today) * _member_rate(rates),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    total_flipped = total_fined = 0
+    for number, start in enumerate(range(bounds['low'], bounds['high'] + 1, chunk_size), start=1):
+        started = time.monotonic()
+        window = late.filter(id__gte=start, id__lt=start + chunk_size)
+        with transaction.atomic():
+            before = {pk: rest for pk, *rest in window.values_list(
+                'pk', 'status', 'fine_amount', 'book__title', 'member__full_name',
+            )}
+            flipped = window.filter(status='active').update(status='overdue')
+            fined = window.update(fine_amount=fine)
+            # The UPDATEs bypass post_save: counter and audit events are done here
+            if flipped:
+                stats.increment('total_borrowed', -flipped)
+            for pk, status, fine_amount in window.values_list('pk', 'status', 'fine_amount'):
+                old_status, old_fine, title, member = before[pk]
+                audit.record('update', Borrow(pk=pk), audit.field_changes(
+                    Borrow, {'status': old_status, 'fine_amount': old_fine},
+                    {'status': status, 'fine_amount': fine_amount},
+                ), label=f'{title} - {member}')
+        total_flipped += flipped
+        total_fined += fined
+        if on_chunk:
+            on_chunk(number, start, start + chunk_size - 1, flipped, fined, time.monotonic() - started)
+    return total_flipped, total_fined
+
+
+# ==========================================
+# RESERVATIONS (HOLDS)
+# ==========================================
+
+def _pickup_deadline(now):
+    return now + timedelta(days=getattr(settings, 'HOLD_PICKUP_DAYS', 3))
+
+
+def _sync_hold_status(*book_ids):
+    # available while a copy is on the shelf, reserved while one waits on the hold shelf
+    ready = Reservation.objects.filter(book_id=OuterRef('pk'), status='ready')
+    Book.objects.filter(pk__in=book_ids, status__in=('available', 'borrowed', 'reserved')).update(
+        status=Case(
+            When(available_copies__gt=0, then=Value('available')),
+            When(Exists(ready), then=Value('reserved')),
+            default=Value('borrowed'),
+        ),
+        last_updated=Now(),
+    )
+
+
+def hold_queue(book_id):
+    """Waiting holds on a book whose member has a free slot, next in line first."""
+    return (
+        Reservation.objects
+        .filter(book_id=book_id, status='waiting', member__current_borrowed__lt=F('member__max_borrow_limit'))
+        .order_by('priority', 'requested_at', 'id')
+    )
+
+
+def next_in_line(book_id):
+    """
+    Primary key of the next eligible hold on a book. SQLite walks
+    reservation_queue_idx in queue order and stops at the first member with
+    a free slot, so the cost does not grow with the length of the queue.
+    """
+    return hold_queue(book_id).values_list('pk', flat=True).first()
+
+
+def allocate_copy(book_id, now=None):
+    """
+    Set a returned copy aside for the next member in line.
+    Returns the id of the hold now ready for pickup, or None if nobody is waiting.
+    """
+    now = now or timezone.now()
+    while True:
+        pk = next_in_line(book_id)
+        if pk is None:
+            return None
+        # Guarded like the stock updates: a concurrent desk may have taken this hold
+        if Reservation.objects.filter(pk=pk, status='waiting').update(
+            status='ready', ready_at=now, expires_at=_pickup_deadline(now),
+        ):
+            return pk
+
+
+def _pass_on_copy(book_id, now=None):
+    if allocate_copy(book_id, now) is None:
+        _release_copy(book_id)
+    _sync_hold_status(book_id)
+
+
+def place_hold(book, member):
+    """Queue `member` for `book`. Only books with no copy on the shelf can be held."""
+    if Book.objects.filter(pk=book.pk, available_copies__gt=0).exists():
+        raise CirculationError('توجد نسخ متاحة من هذا الكتاب، يمكن إعارته مباشرة.', code='copies_available')
+    try:
+        with transaction.atomic():
+            return Reservation.objects.create(
+                book=book, member=member, priority=Reservation.PRIORITIES.get(member.membership_level, 2),
+            )
+    except IntegrityError:
+        raise CirculationError('لدى العضو حجز قائم لهذا الكتاب.', code='duplicate_hold')
+
+
+def cancel_hold(reservation, now=None):
+    with transaction.atomic():
+        was_ready = Reservation.objects.filter(pk=reservation.pk, status='ready').update(status='cancelled')
+        if not was_ready and not Reservation.objects.filter(pk=reservation.pk, status='waiting').update(
+            status='cancelled',
+        ):
+            raise CirculationError('هذا الحجز غير قائم.', code='hold_closed')
+        if was_ready:
+            _pass_on_copy(reservation.book_id, now)
+    reservation.status = 'cancelled'
+    return reservation
+
+
+def expire_holds(now=None):
+    """
+    Expire ready holds not collected by their deadline and pass each copy
+    on to the next member in line (or back to the shelf). Returns the count.
+    """
+    now = now or timezone.now()
+    due = list(Reservation.objects.filter(status='ready', expires_at__lt=now).values_list('pk', 'book_id'))
+    expired = 0
+    for pk, book_id in due:
+        with transaction.atomic():
+            if not Reservation.objects.filter(pk=pk, status='ready').update(status='expired'):
+                continue
+            _pass_on_copy(book_id, now)
+        expired += 1
+    return expired
+
+
+# ==========================================
+# COUNTER RECONCILIATION
+# ==========================================
+
+def _count_per(queryset, field):
+    # Grouped correlated subquery: one COUNT per outer row, served by the FK index
+    counted = queryset.filter(**{field: OuterRef('pk')}).values(field).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def live_borrowed():
+    """Open loans per member, as an expression over Member rows."""
+    return _count_per(Borrow.objects.filter(status__in=OPEN_STATUSES), 'member')
+
+
+def live_available():
+    """Copies on the shelf per book: total minus open loans and copies set aside for holds."""
+    out = _count_per(Borrow.objects.filter(status__in=OPEN_STATUSES), 'book')
+    held = _count_per(Reservation.objects.filter(status='ready'), 'book')
+    return Greatest(F('total_copies') - out - held, 0)
+
+
+def with_borrow_stats(members):
+    """Annotate borrowed_count and borrow_percentage (0-100) from the Borrow rows, in the same query."""
+    return members.annotate(borrowed_count=live_borrowed()).annotate(
+        borrow_percentage=Case(
+            When(max_borrow_limit=0, then=Value(0)),
+            default=Least(F('borrowed_count') * 100 / F('max_borrow_limit'), 100),
+            output_field=IntegerField(),
+        ),
+    )
+
+
+def reconcile_counters():
+    """
+    Recompute Member.current_borrowed and Book.available_copies from the
+    Borrow (and ready Reservation) rows, with one UPDATE per table.
+    Returns {'members': [(id, stored, actual)], 'books': [...]} for the rows that had drifted.
+    """
+    with transaction.atomic():
+        members = Member.objects.annotate(actual=live_borrowed()).filter(~Q(current_borrowed=F('actual')))
+        books = Book.objects.annotate(actual=live_available()).filter(~Q(available_copies=F('actual')))
+        drift = {
+            'members': list(members.order_by('pk').values_list('pk', 'current_borrowed', 'actual')),
+            'books': list(books.order_by('pk').values_list('pk', 'available_copies', 'actual')),
+        }
+        if drift['members']:
+            members.update(current_borrowed=live_borrowed())
+        if drift['books']:
+            available = live_available()
+            books.update(
+                available_copies=available,
+                # Availability follows the repaired count; lost/damaged books keep their status
+                status=Case(
+                    When(~Q(status__in=('available', 'borrowed', 'reserved')), then=F('status')),
+                    When(GreaterThan(available, 0), then=Value('available')),
+                    When(Exists(Reservation.objects.filter(book_id=OuterRef('pk'), status='ready')),
+                         then=Value('reserved')),
+                    default=Value('borrowed'),
+                ),
+                last_updated=Now(),
+            )
+    return drift
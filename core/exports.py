@@ -0,0 +1,79 @@
+import csv
+
+from .models import ArchivedBorrow, Borrow
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+LOAN_HEADER = [
+    'رقم الإعارة', 'عنوان الكتاب', 'ISBN', 'العضو', 'الموظف المسؤول',
+    'تاريخ الإعارة', 'تاريخ الاستحقاق', 'تاريخ الإرجاع', 'الحالة', 'قيمة الغرامة',
+]
+
+_COLUMNS = (
+    'id', 'book__title', 'book__isbn', 'member__full_name',
+    'employee__user__first_name', 'employee__user__last_name', 'employee__user__username',
+    'borrow_date', 'due_date', 'return_date', 'status', 'fine_amount',
+)
+
+
+def loan_queryset(date_from=None, date_to=None, status=None, member=None, model=Borrow):
+    loans = model.objects.all()
+    if date_from:
+        loans = loans.filter(borrow_date__gte=date_from)
+    if date_to:
+        loans = loans.filter(borrow_date__lte=date_to)
+    if status:
+        loans = loans.filter(status=status)
+    if member:
+        loans = loans.filter(member=member)
+    return loans
+
+
+def archived_queryset(date_from=None, date_to=None, status=None, member=None):
+    return loan_queryset(date_from, date_to, status, member, model=ArchivedBorrow)
+
+
+def iter_loan_rows(loans, chunk_size=EXPORT_CHUNK_SIZE, archived=None):
+    """
+    Yield flat tuples for every loan, joined in SQL and read through a
+    server-side iterator, so memory stays flat whatever the table size.
+    With `archived` (an ArchivedBorrow queryset), archived loans are
+    merged in by a UNION ALL ordered by id.
+    """
+    statuses = dict(Borrow.STATUS_CHOICES)
+    rows = loans.order_by().values_list(*_COLUMNS)
+    if archived is not None:
+        rows = rows.union(archived.order_by().values_list(*_COLUMNS), all=True)
+    rows = rows.order_by('id').iterator(chunk_size=chunk_size)
+    for (pk, title, isbn, member, first, last, username,
+         borrowed, due, returned, status, fine) in rows:
+        employee = ' '.join(part for part in (first, last) if part) or username or ''
+        yield (pk, title, isbn, member, employee, borrowed, due, returned, str(statuses.get(status, status)), fine)
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the Arabic text as UTF-8
+    yield '\ufeff' + writer.writerow(LOAN_HEADER)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def write_xlsx(rows, stream):
+    """Write rows with openpyxl's write-only mode, which keeps one row in memory at a time."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('loans')
+    sheet.append(LOAN_HEADER)
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(stream)
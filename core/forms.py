@@ -1,6 +1,11 @@
+import re
+
 from django import forms
-from .models import Book, Author, Category, Member, Employee, Borrow
+from .models import Book, Author, Category, Member, Employee, Borrow, Reservation
 from django.contrib.auth.models import User
+from django.db.models import Q
+
+from .text import isbn13
 
 # ==========================================
 # BOOKS FORMS
@@ -18,13 +23,15 @@ class BookForm(forms.ModelForm):
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'أدخل اسم التصنيف'}),
         required=True
     )
+    # Wider than the column: hyphenated and ISBN-10 forms are accepted and stored as ISBN-13
+    isbn = forms.CharField(label='الرقم التسلسلي (ISBN)', max_length=32,
+                           widget=forms.TextInput(attrs={'class': 'form-control', 'dir': 'ltr'}))
 
     class Meta:
         model = Book
         fields = ['title', 'isbn', 'publication_year', 'total_copies', 'available_copies', 'cover_image', 'status']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
-            'isbn': forms.TextInput(attrs={'class': 'form-control'}),
             'publication_year': forms.NumberInput(attrs={'class': 'form-control'}),
             'total_copies': forms.NumberInput(attrs={'class': 'form-control'}),
             'available_copies': forms.NumberInput(attrs={'class': 'form-control'}),
@@ -42,6 +49,17 @@ class BookForm(forms.ModelForm):
             if self.instance.category:
                 self.fields['category_name'].initial = self.instance.category.name
 
+    def clean_isbn(self):
+        isbn = self.cleaned_data['isbn']
+        # A legacy code that is not a valid ISBN stays editable as long as it is left unchanged
+        if self.instance.pk and isbn == self.instance.isbn:
+            return isbn
+        canonical = isbn13(isbn)
+        if canonical is None:
+            raise forms.ValidationError('رقم ISBN غير صالح، تأكد من الأرقام وخانة التحقق.')
+        # Duplicates under another form of the same ISBN are rejected by Book.clean()
+        return canonical
+
     def save(self, commit=True):
         
         book = super(BookForm, self).save(commit=False)
@@ -49,8 +67,7 @@ class BookForm(forms.ModelForm):
        
         cat_name = self.cleaned_data['category_name'].strip()
         if cat_name:
-            category, created = Category.objects.get_or_create(name=cat_name)
-            book.category = category
+            book.category = Category.objects.resolve([cat_name])[0]
         
         if commit:
             book.save()
@@ -60,13 +77,8 @@ class BookForm(forms.ModelForm):
            
             names = [name.strip() for name in author_names_str.replace(',', '،').split('،') if name.strip()]
             
-            new_authors = []
-            for name in names:
-                author, created = Author.objects.get_or_create(name=name)
-                new_authors.append(author)
-            
-           
-            book.authors.set(new_authors)
+            # One round trip for all names instead of a get_or_create per author
+            book.authors.set(Author.objects.resolve(names))
             
         return book
 
@@ -170,3 +182,74 @@ class BorrowForm(forms.ModelForm):
             'return_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
         }
+
+
+class DeskCheckoutForm(forms.Form):
+    """A member card and a stream of scanned ISBNs, one basket per POST."""
+    member = forms.IntegerField(label='رقم بطاقة العضو', min_value=1,
+                                widget=forms.NumberInput(attrs={'class': 'form-control', 'autofocus': True}))
+    codes = forms.CharField(label='الرموز الممسوحة (ISBN)',
+                            widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 8, 'dir': 'ltr'}))
+    due_date = forms.DateField(label='تاريخ الاستحقاق', required=False,
+                               widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+
+    def clean_member(self):
+        member = Member.objects.filter(pk=self.cleaned_data['member']).first()
+        if member is None:
+            raise forms.ValidationError('لا يوجد عضو بهذا الرقم.')
+        return member
+
+    def clean_codes(self):
+        # Scanners send each code followed by Enter; any ISBN-10/13 or EAN form is accepted
+        codes = [code for code in re.split(r'[\s,;]+', self.cleaned_data['codes']) if code]
+        # Valid ISBNs by their canonical form; legacy codes as typed or without hyphens, like api.book_scan
+        candidates = [[isbn13(code)] if isbn13(code) else [code, code.replace('-', '')] for code in codes]
+        keys = {key for options in candidates for key in options}
+        found = list(Book.objects.filter(Q(isbn13__in=keys) | Q(isbn__in=keys)))
+        books = {book.isbn: book for book in found} | {book.isbn13: book for book in found if book.isbn13}
+        matches = [next((books[key] for key in options if key in books), None) for options in candidates]
+        unknown = dict.fromkeys(code for code, book in zip(codes, matches) if book is None)
+        if unknown:
+            raise forms.ValidationError('رموز غير معروفة: %(codes)s', params={'codes': '، '.join(unknown)})
+        return matches
+
+
+class DeskReturnForm(DeskCheckoutForm):
+    due_date = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['member'].required = False
+        self.fields['member'].help_text = 'اختياري: يلزم فقط إذا كان الكتاب مُعاراً لأكثر من عضو.'
+        self.fields['member'].widget.attrs.pop('autofocus')
+        self.fields['codes'].widget.attrs['autofocus'] = True
+
+    def clean_member(self):
+        return super().clean_member() if self.cleaned_data['member'] else None
+
+
+class ReservationForm(forms.ModelForm):
+    class Meta:
+        model = Reservation
+        fields = ['book', 'member']
+        widgets = {
+            'book': forms.Select(attrs={'class': 'form-control'}),
+            'member': forms.Select(attrs={'class': 'form-control'}),
+        }
+
+
+class LoanExportForm(forms.Form):
+    date_from = forms.DateField(label='من تاريخ', required=False)
+    date_to = forms.DateField(label='إلى تاريخ', required=False)
+    status = forms.ChoiceField(label='الحالة', required=False, choices=[('', '---')] + Borrow.STATUS_CHOICES)
+    member = forms.IntegerField(label='رقم العضو', required=False, min_value=1)
+    format = forms.ChoiceField(label='الصيغة', required=False, choices=[('csv', 'CSV'), ('xlsx', 'Excel')])
+    history = forms.BooleanField(label='يشمل الأرشيف', required=False)
+
+
+class ReportPeriodForm(forms.Form):
+    # Reports are summed per month, so the period is picked in whole months
+    date_from = forms.DateField(label='من شهر', required=False, input_formats=['%Y-%m', '%Y-%m-%d'],
+                                widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'month'}, format='%Y-%m'))
+    date_to = forms.DateField(label='إلى شهر', required=False, input_formats=['%Y-%m', '%Y-%m-%d'],
+                              widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'month'}, format='%Y-%m'))
@@ -0,0 +1,37 @@
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import metrics
+from .models import Book
+
+
+def fragment_key(name, obj):
+    """
+    Versioned key: a row is keyed on its pk and last_updated, so an edit
+    simply makes the old entry unreachable and no delete is ever needed.
+    """
+    return f'fragment:{name}:{obj.pk}:{obj.last_updated.timestamp():.6f}'
+
+
+def get_or_render(name, obj, render):
+    # Own per-process alias (see CACHES): the timeout is the alias's TIMEOUT
+    cache = caches['fragments']
+    key = fragment_key(name, obj)
+    html = cache.get(key)
+    if html is not None:
+        metrics.increment('fragment_cache_hits')
+        return html
+    metrics.increment('fragment_cache_misses')
+    html = render()
+    cache.set(key, html)
+    return html
+
+
+def touch_books(ids):
+    """
+    Bump last_updated for books whose rendered row changed without a
+    Book.save() (author/category renames, queryset updates of stock).
+    """
+    ids = list(ids)
+    if ids:
+        Book.objects.filter(pk__in=ids).update(last_updated=timezone.now())
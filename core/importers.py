@@ -0,0 +1,235 @@
+import csv
+import io
+import time
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import search, stats
+from .models import Author, Book, Category
+from .text import isbn13, normalize_name
+
+DEFAULT_CHUNK_SIZE = 5000
+# Per-chunk lookups bind up to 4 parameters per row (raw and canonical ISBN, twice);
+# this keeps them under SQLite's 32766 host-parameter limit
+MAX_CHUNK_SIZE = 8000
+SUPPORTED_FORMATS = ('csv', 'xlsx')
+MAX_INT = 2 ** 31 - 1  # PositiveIntegerField range on every backend
+
+# Accepted column headers (English keys, or the Arabic labels used in the UI)
+COLUMN_ALIASES = {
+    'title': 'title', 'عنوان الكتاب': 'title',
+    'isbn': 'isbn', 'الرقم التسلسلي (isbn)': 'isbn',
+    'authors': 'authors', 'المؤلفين': 'authors',
+    'category': 'category', 'التصنيف': 'category',
+    'publication_year': 'publication_year', 'سنة النشر': 'publication_year',
+    'total_copies': 'total_copies', 'عدد النسخ الكلي': 'total_copies',
+    'available_copies': 'available_copies', 'النسخ المتاحة': 'available_copies',
+}
+
+
+class ChunkReport:
+    def __init__(self, number, rows, created, rejected, elapsed):
+        self.number = number
+        self.rows = rows
+        self.created = created
+        self.rejected = rejected
+        self.elapsed = elapsed
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else float(self.rows)
+
+
+class ImportReport:
+    def __init__(self):
+        self.chunks = []
+        self.rejected = []  # (line number, reason)
+
+    @property
+    def created(self):
+        return sum(chunk.created for chunk in self.chunks)
+
+    @property
+    def rows(self):
+        return sum(chunk.rows for chunk in self.chunks)
+
+
+def detect_format(filename):
+    fmt = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f'Unsupported file format: {filename!r} (expected .csv or .xlsx)')
+    return fmt
+
+
+def _normalize_header(header):
+    return [COLUMN_ALIASES.get(str(name or '').strip().lower(), str(name or '').strip().lower()) for name in header]
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (line number, row dict) from a binary file object without loading
+    the whole file: csv is read line by line, xlsx in openpyxl read-only mode.
+    """
+    if fmt == 'csv':
+        reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        header = _normalize_header(next(reader, []))
+        for line, values in enumerate(reader, start=2):
+            if any(values):
+                yield line, dict(zip(header, values))
+    elif fmt == 'xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = _normalize_header(next(rows, ()))
+            for line, values in enumerate(rows, start=2):
+                if any(value not in (None, '') for value in values):
+                    yield line, dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _split_names(value):
+    # Same separators as BookForm: latin or Arabic comma
+    return [name.strip() for name in _text(value).replace(',', '،').split('،') if name.strip()]
+
+
+def _positive_int(value, default=None):
+    value = _text(value)
+    if not value:
+        return default
+    try:
+        number = int(float(value))
+    except OverflowError:  # 'inf', '1e400'
+        raise ValueError(value)
+    if not 0 <= number <= MAX_INT:
+        raise ValueError(value)
+    return number
+
+
+def _parse(row):
+    title = _text(row.get('title'))
+    isbn = _text(row.get('isbn'))
+    if isbn.endswith('.0'):  # numeric ISBN cells come back from xlsx as floats
+        isbn = isbn[:-2]
+    if not title:
+        raise ValueError('عنوان الكتاب مطلوب')
+    if not isbn or len(isbn) > 13:
+        raise ValueError(f'رقم ISBN غير صالح: {isbn!r}')
+    try:
+        total = _positive_int(row.get('total_copies'), 1)
+        available = _positive_int(row.get('available_copies'), total)
+        year = _positive_int(row.get('publication_year'))
+    except ValueError:
+        raise ValueError('قيمة رقمية غير صالحة')
+    return {
+        'title': title[:200],
+        'isbn': isbn,
+        'isbn13': isbn13(isbn),
+        'authors': [name[:200] for name in _split_names(row.get('authors'))],
+        'category': _text(row.get('category'))[:100],
+        'publication_year': year,
+        'total_copies': total,
+        'available_copies': min(available, total),
+    }
+
+
+def _resolve(model, names):
+    """Map name keys to instances: one INSERT OR IGNORE plus one lookup per chunk."""
+    return {obj.name_key: obj for obj in model.objects.resolve(list(names))}
+
+
+def _import_chunk(rows, report):
+    parsed = []
+    seen_isbns = set()
+    for line, row in rows:
+        try:
+            data = _parse(row)
+        except ValueError as e:
+            report.rejected.append((line, str(e)))
+            continue
+        # The same ISBN typed as ISBN-10 and ISBN-13 is still a duplicate
+        codes = {data['isbn'], data['isbn13']} - {None}
+        if codes & seen_isbns:
+            report.rejected.append((line, f'رقم ISBN مكرر في الملف: {data["isbn"]}'))
+            continue
+        seen_isbns |= codes
+        parsed.append((line, data))
+
+    existing = set()
+    for isbn, canonical in Book.objects.filter(Q(isbn__in=seen_isbns) | Q(isbn13__in=seen_isbns)).values_list(
+        'isbn', 'isbn13',
+    ):
+        existing |= {isbn, canonical} - {None}
+    fresh = []
+    for line, data in parsed:
+        if data['isbn'] in existing or data['isbn13'] in existing:
+            report.rejected.append((line, f'الكتاب موجود مسبقاً: {data["isbn"]}'))
+        else:
+            fresh.append(data)
+    if not fresh:
+        return 0
+
+    with transaction.atomic():
+        categories = _resolve(Category, {data['category'] for data in fresh if data['category']})
+        authors = _resolve(Author, {name for data in fresh for name in data['authors']})
+        books = Book.objects.bulk_create([
+            Book(
+                title=data['title'], isbn=data['isbn'], isbn13=data['isbn13'], category=categories.get(normalize_name(data['category'])),
+                publication_year=data['publication_year'], total_copies=data['total_copies'],
+                available_copies=data['available_copies'],
+            )
+            for data in fresh
+        ])
+        Through = Book.authors.through
+        Through.objects.bulk_create([
+            Through(book_id=book.pk, author_id=authors[key].pk)
+            for book, data in zip(books, fresh)
+            for key in dict.fromkeys(normalize_name(name) for name in data['authors'])
+            if key in authors
+        ])
+        # bulk_create skips signals: keep the search index and dashboard in step
+        search.index_books([book.pk for book in books])
+        stats.increment('total_books', len(books))
+    return len(books)
+
+
+def import_books(stream, fmt, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """
+    Import a CSV/XLSX catalog in chunks of `chunk_size` rows (at most
+    MAX_CHUNK_SIZE).
+    Each chunk costs a fixed handful of queries regardless of its size and
+    is committed on its own, so a bad row never rolls back earlier chunks.
+    """
+    chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    report = ImportReport()
+    chunk = []
+
+    def flush():
+        started = time.monotonic()
+        rejected_before = len(report.rejected)
+        created = _import_chunk(chunk, report)
+        result = ChunkReport(
+            len(report.chunks) + 1, len(chunk), created,
+            len(report.rejected) - rejected_before, time.monotonic() - started,
+        )
+        report.chunks.append(result)
+        if on_chunk:
+            on_chunk(result)
+        chunk.clear()
+
+    for line, row in iter_rows(stream, fmt):
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return report
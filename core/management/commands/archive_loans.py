@@ -0,0 +1,36 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move returned loans from past years out of the live loan table into the archive '
+        '(safe to rerun; run from cron once a year or month, outside opening hours).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help=(
+            'Archive loans returned before this ISO date (YYYY-MM-DD). '
+            'Default: 1 January, LOAN_ARCHIVE_KEEP_YEARS years back.'
+        ))
+        parser.add_argument('--chunk-size', type=int, default=archive.DEFAULT_CHUNK_SIZE,
+                            help=f'Loans moved per transaction (default: {archive.DEFAULT_CHUNK_SIZE}).')
+
+    def handle(self, *args, **options):
+        try:
+            before = date.fromisoformat(options['before']) if options['before'] else archive.default_cutoff()
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        def on_chunk(first, last, count):
+            self.stdout.write(f'#{first} .. #{last}: {count} loans')
+
+        started = time.monotonic()
+        moved = archive.archive_loans(before, chunk_size=options['chunk_size'], on_chunk=on_chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f'{moved} loans returned before {before} archived in {time.monotonic() - started:.2f}s.'
+        ))
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from core import circulation
+from core.models import Book, Member, Reservation
+
+
+def naive_next_in_line(book_id):
+    # What allocation looks like without the queue index: load the whole queue and sort it in Python
+    waiting = Reservation.objects.filter(book_id=book_id, status='waiting').select_related('member')
+    eligible = [r for r in waiting if r.member.current_borrowed < r.member.max_borrow_limit]
+    eligible.sort(key=lambda r: (r.priority, r.requested_at, r.id))
+    return eligible[0].pk if eligible else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Time next-in-line hold allocation on a throwaway test database as the queue for '
+        'one title grows, against a load-and-sort scan, and print the query plan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000,50000',
+                            help='Comma separated queue lengths (default: 100,1000,10000,50000).')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed allocations per size (default: 20).')
+        parser.add_argument('--ineligible', type=float, default=0.3,
+                            help='Share of queued members already at their borrow limit (default: 0.3).')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(sizes, options['repeat'], options['ineligible'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, sizes, repeat, ineligible):
+        rng = random.Random(0)
+        users = User.objects.bulk_create(
+            [User(username=f'bench_member{i}') for i in range(sizes[-1])], batch_size=5000,
+        )
+        members = Member.objects.bulk_create([
+            Member(
+                user=user, full_name=f'Bench member {i}', email=f'bench{i}@example.com', phone='0',
+                membership_level=rng.choice(('gold', 'silver', 'regular', 'regular')), max_borrow_limit=5,
+                current_borrowed=5 if rng.random() < ineligible else 0,
+            )
+            for i, user in enumerate(users)
+        ], batch_size=5000)
+        # Each size gets its own title, so the larger queues share the table with the smaller ones
+        now = timezone.now()
+        self.stdout.write(f"{'queue':>8} {'indexed ms':>11} {'naive ms':>10} {'speed-up':>9}")
+        for size in sizes:
+            book = Book.objects.create(title=f'Bench title {size}', isbn=f'{size:013d}', total_copies=1,
+                                       available_copies=0, status='borrowed')
+            Reservation.objects.bulk_create([
+                Reservation(
+                    book=book, member=member, priority=Reservation.PRIORITIES[member.membership_level],
+                    requested_at=now - timedelta(seconds=size - i),
+                )
+                for i, member in enumerate(members[:size])
+            ], batch_size=5000)
+            indexed = self._time(lambda: circulation.next_in_line(book.pk), repeat)
+            naive = self._time(lambda: naive_next_in_line(book.pk), max(1, repeat // 10))
+            assert circulation.next_in_line(book.pk) == naive_next_in_line(book.pk)
+            self.stdout.write(f'{size:>8} {indexed:>11.3f} {naive:>10.3f} {naive / indexed:>8.0f}x')
+
+        plan = circulation.hold_queue(book.pk).values_list('pk', flat=True)[:1].explain()
+        self.stdout.write(f'\nQuery plan for next_in_line:\n{plan}')
+
+    def _time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
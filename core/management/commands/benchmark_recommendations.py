@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the co-occurrence build, top-K ranking and an incremental update on synthetic '
+        'loans with a skewed (Zipf) book popularity. Runs in memory; no database needed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=1_000_000, help='Loans to generate (default: 1000000).')
+        parser.add_argument('--books', type=int, default=200_000, help='Catalog size (default: 200000).')
+        parser.add_argument('--members', type=int, default=50_000, help='Members (default: 50000).')
+        parser.add_argument('--new-loans', type=int, default=10_000,
+                            help='Loans added for the incremental step (default: 10000).')
+        parser.add_argument('--top-k', type=int, default=recommendations.get_top_k())
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        import numpy as np
+
+        rng = np.random.default_rng(options['seed'])
+        popularity = 1.0 / np.arange(1, options['books'] + 1)
+        popularity /= popularity.sum()
+
+        def loans(count):
+            return (rng.integers(1, options['members'] + 1, count),
+                    rng.choice(np.arange(1, options['books'] + 1), count, p=popularity))
+
+        members, books = loans(options['loans'])
+        shape = (options['members'] + 1, options['books'] + 1)
+
+        def timed(label, func):
+            started = time.perf_counter()
+            result = func()
+            self.stdout.write(f'{label:<28} {time.perf_counter() - started:>8.2f}s')
+            return result
+
+        self.stdout.write(f"{options['loans']} loans, {options['books']} books, {options['members']} members")
+        matrix = timed('borrow matrix', lambda: recommendations.borrow_matrix(members, books, shape))
+        matrix = timed('co-occurrence (A^T A)', lambda: recommendations.cooccurrence(matrix))
+        neighbors = timed('top-k (all books)', lambda: recommendations.top_neighbors(
+            matrix, options['top_k'], recommendations.get_min_support()))
+
+        new_members, new_books = loans(options['new_loans'])
+        touched = np.isin(members, new_members)
+        matrix, rows = timed(f"add {options['new_loans']} loans", lambda: recommendations.add_loans(
+            matrix, members[touched], books[touched], new_members, new_books))
+        timed(f'top-k ({len(rows)} changed books)', lambda: recommendations.top_neighbors(
+            matrix, options['top_k'], recommendations.get_min_support(), rows))
+
+        size_mb = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2 ** 20
+        self.stdout.write(
+            f'matrix: {matrix.nnz} non-zeros, {size_mb:.1f} MiB; '
+            f'neighbour table: {len(neighbors[0])} rows for {len(np.unique(neighbors[0]))} books'
+        )
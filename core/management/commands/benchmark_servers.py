@@ -0,0 +1,135 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import seeding
+
+DEFAULT_PATHS = ('/dashboard/', '/books/', '/books/1/', '/borrowing/', '/borrowing/1/', '/members/1/')
+
+# Creates a manager account and prints a session key for it
+_SESSION_SCRIPT = '''
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+user = User.objects.create_superuser('bench_admin', password=None)
+session = SessionStore()
+session[SESSION_KEY] = str(user.pk)
+session[BACKEND_SESSION_KEY] = 'core.auth.CachedModelBackend'
+session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+session.create()
+print(session.session_key)
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare WSGI (gunicorn sync workers) and ASGI (gunicorn + uvicorn workers) throughput '
+        'on the read-only pages, with the same worker count and a seeded scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes per server (default: 2).')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client connections (default: 16).')
+        parser.add_argument('--requests', type=int, default=600, help='Requests per server (default: 600).')
+        parser.add_argument('--size', choices=seeding.DATASET_SIZES, default='small',
+                            help='Dataset preset to seed (default: small).')
+        parser.add_argument('--port', type=int, default=8765, help='Port the servers listen on (default: 8765).')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                'SQLITE_PATH': os.path.join(tmp, 'bench.sqlite3'),
+                'CACHE_LOCATION': os.path.join(tmp, 'cache'),
+                'METRICS_DIR': '',
+                'DEBUG': 'False',
+            }
+            self.stdout.write(f"Seeding '{options['size']}' dataset...")
+            self._manage(env, 'migrate', '--verbosity', '0')
+            self._manage(env, 'seed_library', '--size', options['size'])
+            session = self._manage(env, 'shell', '-c', _SESSION_SCRIPT).strip().splitlines()[-1]
+
+            servers = (
+                ('wsgi', ['library.wsgi:application']),
+                ('asgi', ['library.asgi:application', '-k', 'uvicorn_worker.UvicornWorker']),
+            )
+            self.stdout.write(f"{'server':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+            for name, target in servers:
+                result = self._run_server(env, target, session, options)
+                self.stdout.write(
+                    f"{name:<6} {result['rps']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['errors']:>7}"
+                )
+
+    def _manage(self, env, *args):
+        done = subprocess.run(
+            [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if done.returncode:
+            raise CommandError(f'manage.py {args[0]} failed:\n{done.stderr}')
+        return done.stdout
+
+    def _run_server(self, env, target, session, options):
+        port = options['port']
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *target, '--workers', str(options['workers']),
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_for_port(port)
+            # Warm every worker (imports, persistent connections, caches) before timing
+            self._load(port, session, options['concurrency'], options['workers'] * len(DEFAULT_PATHS) * 2)
+            return self._load(port, session, options['concurrency'], options['requests'])
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def _wait_for_port(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server did not start listening on port {port}')
+
+    def _load(self, port, session, concurrency, total):
+        headers = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={session}', 'Host': '127.0.0.1'}
+
+        def fetch(i):
+            path = DEFAULT_PATHS[i % len(DEFAULT_PATHS)]
+            started = time.perf_counter()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except OSError:
+                ok = False
+            finally:
+                connection.close()
+            return ok, (time.perf_counter() - started) * 1000
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, range(total)))
+        elapsed = time.monotonic() - started
+
+        timings = sorted(ms for ok, ms in results if ok)
+        return {
+            'rps': len(timings) / elapsed,
+            'p50': statistics.median(timings) if timings else 0.0,
+            'p95': timings[int(0.95 * (len(timings) - 1))] if timings else 0.0,
+            'errors': sum(1 for ok, _ in results if not ok),
+        }
@@ -0,0 +1,85 @@
+import json
+import platform
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import benchmarks, seeding
+from core.models import Employee
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and time every view in core/urls.py. '
+        'Writes latency percentiles, query counts and peak memory as JSON, and '
+        'fails when a view regresses past --threshold against --baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=seeding.DATASET_SIZES, default='small',
+                            help='Dataset preset to seed (default: small).')
+        parser.add_argument('--repeat', type=int, default=benchmarks.DEFAULT_REPEAT,
+                            help=f'Timed requests per view (default: {benchmarks.DEFAULT_REPEAT}).')
+        parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare against a JSON file written by an earlier run.')
+        parser.add_argument('--threshold', type=float, default=benchmarks.DEFAULT_THRESHOLD,
+                            help='Allowed growth factor for p95 latency and peak memory '
+                                 f'(default: {benchmarks.DEFAULT_THRESHOLD}).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['views']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']!r}: {e}")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Seeding '{options['size']}' dataset...")
+            seeding.seed(**seeding.DATASET_SIZES[options['size']])
+            results = benchmarks.run_benchmarks(self._client(), options['repeat'], on_view=self._report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'meta': {
+                        'size': options['size'],
+                        'repeat': options['repeat'],
+                        'python': platform.python_version(),
+                        'created': datetime.now().isoformat(timespec='seconds'),
+                    },
+                    'views': results,
+                }, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmarks.compare(results, baseline, options['threshold'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f'{len(regressions)} regression(s) past x{options["threshold"]}.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def _client(self):
+        # A manager sees every page, so no view is skipped behind a permission redirect
+        user = User.objects.create_superuser('benchmark', password=None)
+        Employee.objects.create(user=user, role='manager', phone='05')
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        return client
+
+    def _report(self, name, result):
+        self.stdout.write(
+            f"{name:<28} {result['status']}  p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+            f"{result['queries']:3d} queries  {result['peak_kb']:9.1f} KiB"
+        )
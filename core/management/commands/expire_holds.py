@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import circulation
+
+
+class Command(BaseCommand):
+    help = 'Expire holds not collected by their pickup deadline and pass the copies on (safe to run from cron).'
+
+    def handle(self, *args, **options):
+        expired = circulation.expire_holds()
+        self.stdout.write(self.style.SUCCESS(f'{expired} holds expired.'))
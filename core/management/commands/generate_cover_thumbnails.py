@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from core import thumbnails
+from core.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Render list/detail WebP and JPEG thumbnails for book covers that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render thumbnails that already exist.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Covers rendered in parallel; Pillow releases the GIL while resizing (default: 4).')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+        if not options['force']:
+            books = books.exclude(cover_thumbnail_source=F('cover_image'))
+        pending = dict(books.values_list('pk', 'cover_image'))
+        self.stdout.write(f'{len(pending)} covers to render')
+
+        started = time.monotonic()
+        done = failed = 0
+        # Only the image work runs in the pool; the database is touched from this thread
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {pool.submit(thumbnails.render, cover): (pk, cover) for pk, cover in pending.items()}
+            for future in as_completed(futures):
+                pk, cover = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'book {pk} ({cover}): {e}')
+                    continue
+                Book.objects.filter(pk=pk, cover_image=cover).update(
+                    cover_thumbnail_source=cover, last_updated=timezone.now(),
+                )
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{done} covers rendered, {failed} failed in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import importers
+
+
+class Command(BaseCommand):
+    help = 'Bulk import books from a CSV or XLSX catalog file, chunk by chunk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .csv or .xlsx file.')
+        parser.add_argument('--format', choices=importers.SUPPORTED_FORMATS,
+                            help='File format (default: guessed from the extension).')
+        parser.add_argument('--chunk-size', type=int, default=importers.DEFAULT_CHUNK_SIZE,
+                            help=f'Rows per batch (default: {importers.DEFAULT_CHUNK_SIZE}, '
+                                 f'at most {importers.MAX_CHUNK_SIZE}).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = options['format'] or importers.detect_format(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def on_chunk(chunk):
+            self.stdout.write(
+                f'chunk {chunk.number}: {chunk.rows} rows, {chunk.created} created, '
+                f'{chunk.rejected} rejected in {chunk.elapsed:.2f}s ({chunk.rows_per_second:.0f} rows/s)'
+            )
+
+        started = time.monotonic()
+        try:
+            with open(path, 'rb') as stream:
+                report = importers.import_books(stream, fmt, chunk_size=options['chunk_size'], on_chunk=on_chunk)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for line, reason in report.rejected:
+            self.stdout.write(self.style.WARNING(f'line {line}: {reason}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} of {report.rows} rows '
+            f'({len(report.rejected)} rejected) in {time.monotonic() - started:.2f}s.'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core import circulation
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Member.current_borrowed and Book.available_copies from the loan '
+        'and hold records, report the rows that had drifted and repair them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help='Drifted rows listed per table (default: 50).')
+
+    def handle(self, *args, **options):
+        drift = circulation.reconcile_counters()
+        if not drift['members'] and not drift['books']:
+            self.stdout.write(self.style.SUCCESS('All circulation counters are in sync.'))
+            return
+        for table, label in (('members', 'member'), ('books', 'book')):
+            rows = drift[table]
+            for pk, stored, actual in rows[:options['limit']]:
+                self.stdout.write(self.style.WARNING(f'{label} {pk}: {stored} -> {actual}'))
+            if len(rows) > options['limit']:
+                self.stdout.write(f'... and {len(rows) - options["limit"]} more {table}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired {len(drift['members'])} member(s) and {len(drift['books'])} book(s)."
+        ))
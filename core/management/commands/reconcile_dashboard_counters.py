@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard counters from the source tables and repair any drift.'
+
+    def handle(self, *args, **options):
+        drift = stats.reconcile()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('All counters are in sync.'))
+            return
+        for name, (stored, actual) in drift.items():
+            self.stdout.write(self.style.WARNING(f'{name}: {stored} -> {actual}'))
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(drift)} counter(s).'))
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from core import sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure multi-process read/write throughput and "database is locked" rates on a scratch '
+        'SQLite file, with stock settings and with the SQLITE_PRAGMAS/transaction_mode in settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help='Concurrent worker processes (default: 4).')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Run time per profile (default: 5).')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Share of operations that write (default: 0.2).')
+
+    def handle(self, *args, **options):
+        profiles = (('stock', sqlite.STOCK_PROFILE), ('tuned', sqlite.tuned_profile()))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'contention.sqlite3')
+            self.stdout.write(f"{'profile':<8} {'ops/s':>10} {'reads':>8} {'writes':>8} {'errors':>8} {'error rate':>11}")
+            for name, profile in profiles:
+                result = sqlite.run_contention(
+                    path, profile, options['processes'], options['seconds'], options['write_ratio'],
+                )
+                self.stdout.write(
+                    f"{name:<8} {result['ops_per_second']:>10} {result['reads']:>8} {result['writes']:>8} "
+                    f"{result['errors']:>8} {result['error_rate']:>10.2%}"
+                )
@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Field order of one per-view record
+REQUESTS, LATENCY_SUM, SQL_QUERIES, SQL_SECONDS, RESPONSE_BYTES, BUCKETS = range(6)
+
+
+def _new_record():
+    return [0, 0.0, 0, 0.0, 0, [0] * (len(LATENCY_BUCKETS) + 1)]
+
+
+class _Shard(threading.local):
+    """
+    Per-thread slice of the registry. A worker thread only ever writes to
+    its own shard, so recording a request takes no lock; shards are summed
+    when metrics are scraped.
+    """
+
+    def __init__(self):
+        self.views = {}
+        self.counters = {}
+        with _shards_lock:
+            _retire_finished_shards()
+            _shards.append((weakref.ref(threading.current_thread()), self.views, self.counters))
+
+
+_shards = []
+_shards_lock = threading.Lock()
+# Totals of threads that have exited ({views}, {counters})
+_retired = ({}, {})
+
+
+def _retire_finished_shards():
+    # Caller holds _shards_lock. A finished thread never writes again, so its numbers
+    # are folded into _retired: recycled threads don't grow the list or the scrape.
+    running = []
+    for shard in _shards:
+        thread = shard[0]()
+        if thread is not None and thread.is_alive():
+            running.append(shard)
+        else:
+            _merge_into(_retired[0], shard[1])
+            _merge_counters(_retired[1], shard[2])
+    _shards[:] = running
+_local = _Shard()
+_last_flush = [0.0]
+
+
+def record(view, seconds, queries, sql_seconds, response_bytes):
+    views = _local.views
+    entry = views.get(view)
+    if entry is None:
+        entry = views[view] = _new_record()
+    entry[REQUESTS] += 1
+    entry[LATENCY_SUM] += seconds
+    entry[SQL_QUERIES] += queries
+    entry[SQL_SECONDS] += sql_seconds
+    entry[RESPONSE_BYTES] += response_bytes
+    entry[BUCKETS][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    _maybe_flush()
+
+
+def increment(name, amount=1):
+    """Bump a plain counter (e.g. fragment cache hits); lock-free like record()."""
+    counters = _local.counters
+    counters[name] = counters.get(name, 0) + amount
+
+
+def _merge_into(total, views):
+    for view, entry in views.items():
+        merged = total.get(view)
+        if merged is None:
+            merged = total[view] = _new_record()
+        for field in (REQUESTS, LATENCY_SUM, SQL_QUERIES, SQL_SECONDS, RESPONSE_BYTES):
+            merged[field] += entry[field]
+        merged[BUCKETS] = [a + b for a, b in zip(merged[BUCKETS], entry[BUCKETS])]
+
+
+def _merge_counters(total, counters):
+    for name, value in counters.items():
+        total[name] = total.get(name, 0) + value
+
+
+def snapshot():
+    """Sum of every thread shard of this process: {'views': ..., 'counters': ...}."""
+    views, counters = {}, {}
+    with _shards_lock:
+        _retire_finished_shards()
+        _merge_into(views, _retired[0])
+        _merge_counters(counters, _retired[1])
+        shards = list(_shards)
+    for _, shard_views, shard_counters in shards:
+        # Copy first: the owning thread may be adding a view concurrently
+        copied = {view: [*entry[:BUCKETS], list(entry[BUCKETS])] for view, entry in list(shard_views.items())}
+        _merge_into(views, copied)
+        _merge_counters(counters, dict(shard_counters))
+    return {'views': views, 'counters': counters}
+
+
+# ------------------------------------------
+# Multi-process (gunicorn workers) support
+# ------------------------------------------
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _maybe_flush():
+    # Each worker drops its snapshot in METRICS_DIR now and then, so a scrape
+    # that lands on any one worker can report the whole pool.
+    directory = _metrics_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    if now - _last_flush[0] < getattr(settings, 'METRICS_FLUSH_INTERVAL', 15):
+        return
+    _last_flush[0] = now
+    flush(directory)
+
+
+def flush(directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def collect():
+    """This process' live numbers plus the last snapshot of every other worker."""
+    total = snapshot()
+    directory = _metrics_dir()
+    if directory and os.path.isdir(directory):
+        own = f'{os.getpid()}.json'
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    other = json.load(f)
+                _merge_into(total['views'], other.get('views', {}))
+                _merge_counters(total['counters'], other.get('counters', {}))
+            except (OSError, ValueError, AttributeError):
+                continue
+    return total
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(registry):
+    """Render the merged registry in the Prometheus text exposition format."""
+    views = registry['views']
+    lines = [
+        '# HELP library_request_duration_seconds Request latency per view.',
+        '# TYPE library_request_duration_seconds histogram',
+    ]
+    for view, entry in sorted(views.items()):
+        label = _label(view)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, entry[BUCKETS]):
+            cumulative += count
+            lines.append(f'library_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'library_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {entry[REQUESTS]}')
+        lines.append(f'library_request_duration_seconds_sum{{view="{label}"}} {entry[LATENCY_SUM]:.6f}')
+        lines.append(f'library_request_duration_seconds_count{{view="{label}"}} {entry[REQUESTS]}')
+
+    counters = (
+        ('library_sql_queries_total', 'SQL queries executed per view.', SQL_QUERIES, '{}'),
+        ('library_sql_seconds_total', 'Time spent in SQL per view.', SQL_SECONDS, '{:.6f}'),
+        ('library_response_bytes_total', 'Response body bytes per view.', RESPONSE_BYTES, '{}'),
+    )
+    for name, help_text, field, fmt in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for view, entry in sorted(views.items()):
+            lines.append(f'{name}{{view="{_label(view)}"}} {fmt.format(entry[field])}')
+
+    for name, value in sorted(registry['counters'].items()):
+        lines.append(f'# TYPE library_{name}_total counter')
+        lines.append(f'library_{name}_total {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,96 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+
+from . import audit, metrics
+
+
+class _QueryTimer:
+    """connection.execute_wrapper hook counting queries and their time."""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, SQL query count/time and response size per URL name.
+    Exposed by the staff-only `metrics` view.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        # The async ORM runs queries on a worker thread, but it shares this
+        # context's connection object, so the same wrapper sees them
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    def _record(self, request, response, elapsed, timer):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        metrics.record(view, elapsed, timer.count, timer.seconds, size)
+
+
+class AuditActorMiddleware:
+    """Attribute audit events raised while handling a request to request.user."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = audit.set_actor(request.user)
+        try:
+            return self.get_response(request)
+        finally:
+            audit.reset_actor(token)
+
+    async def __acall__(self, request):
+        token = audit.set_actor(request.user)
+        try:
+            return await self.get_response(request)
+        finally:
+            audit.reset_actor(token)
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS books_book_fts USING fts5("
+        "title, isbn, authors, category, "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS books_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_remove_category_parent'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    DashboardCounter = apps.get_model('core', 'DashboardCounter')
+    counts = {
+        'total_books': apps.get_model('core', 'Book').objects.count(),
+        'total_members': apps.get_model('core', 'Member').objects.count(),
+        'total_employees': apps.get_model('core', 'Employee').objects.count(),
+        'total_borrowed': apps.get_model('core', 'Borrow').objects.filter(status='active').count(),
+    }
+    DashboardCounter.objects.bulk_create(
+        [DashboardCounter(name=name, value=value) for name, value in counts.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='اسم العداد')),
+                ('value', models.BigIntegerField(default=0, verbose_name='القيمة')),
+            ],
+            options={
+                'verbose_name': 'عداد لوحة التحكم',
+                'verbose_name_plural': 'عدادات لوحة التحكم',
+                'db_table': 'stats_dashboardcounter',
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+import re
+
+from django.db import migrations, models
+
+_DIACRITICS = re.compile('[\u064B-\u0652\u0670\u0640]')
+_LETTER_MAP = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي'})
+
+
+def normalize_name(name):
+    # Frozen copy of core.text.normalize_name at the time of this migration
+    return ' '.join(_DIACRITICS.sub('', name or '').translate(_LETTER_MAP).lower().split())
+
+
+def _group_duplicates(model):
+    survivors, duplicates = {}, {}
+    for pk, name in model.objects.order_by('pk').values_list('pk', 'name'):
+        key = normalize_name(name) or f'#{pk}'
+        if key in survivors:
+            duplicates[pk] = survivors[key]
+        else:
+            survivors[key] = pk
+    model.objects.bulk_update(
+        [model(pk=pk, name_key=key) for key, pk in survivors.items()], ['name_key'], batch_size=1000,
+    )
+    return duplicates
+
+
+def merge_duplicates(apps, schema_editor):
+    Author = apps.get_model('core', 'Author')
+    Category = apps.get_model('core', 'Category')
+    Book = apps.get_model('core', 'Book')
+    Through = Book.authors.through
+
+    for duplicate, survivor in _group_duplicates(Category).items():
+        Book.objects.filter(category_id=duplicate).update(category_id=survivor)
+        Category.objects.filter(pk=duplicate).delete()
+
+    for duplicate, survivor in _group_duplicates(Author).items():
+        linked = set(Through.objects.filter(author_id=survivor).values_list('book_id', flat=True))
+        moved = Through.objects.filter(author_id=duplicate).exclude(book_id__in=linked)
+        moved.update(author_id=survivor)
+        Through.objects.filter(author_id=duplicate).delete()
+        Author.objects.filter(pk=duplicate).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='author',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=200, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+    ]
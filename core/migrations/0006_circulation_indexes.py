@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_author_category_name_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['status'], name='book_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['member', 'status'], name='borrow_member_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['borrow_date', 'id'], name='borrow_date_id_idx'),
+        ),
+    ]
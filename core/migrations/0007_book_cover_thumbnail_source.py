@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_circulation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_thumbnail_source',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
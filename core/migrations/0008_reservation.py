@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_book_cover_thumbnail_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priority', models.PositiveSmallIntegerField(default=2, verbose_name='الأولوية')),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='وقت الطلب')),
+                ('status', models.CharField(choices=[('waiting', 'في الانتظار'), ('ready', 'جاهز للاستلام'), ('fulfilled', 'تم الاستلام'), ('expired', 'منتهي'), ('cancelled', 'ملغى')], default='waiting', max_length=20, verbose_name='الحالة')),
+                ('ready_at', models.DateTimeField(blank=True, null=True, verbose_name='وقت التجهيز')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='آخر موعد للاستلام')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.book', verbose_name='الكتاب')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.member', verbose_name='العضو')),
+            ],
+            options={
+                'verbose_name': 'حجز',
+                'verbose_name_plural': 'الحجوزات',
+                'db_table': 'reservations_reservation',
+                'indexes': [models.Index(fields=['book', 'status', 'priority', 'requested_at', 'id'], name='reservation_queue_idx'), models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'), models.Index(fields=['member', 'status'], name='reservation_member_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['waiting', 'ready'])), fields=('book', 'member'), name='reservation_one_open_hold')],
+            },
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCirculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('membership_type', models.CharField(choices=[('student', 'طالب'), ('teacher', 'معلم'), ('visitor', 'زائر')], max_length=20, verbose_name='نوع العضوية')),
+                ('loans', models.PositiveIntegerField(default=0, verbose_name='الإعارات')),
+                ('returns', models.PositiveIntegerField(default=0, verbose_name='المرتجعات')),
+                ('overdue', models.PositiveIntegerField(default=0, verbose_name='المتأخرات')),
+                ('fines', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='الغرامات')),
+            ],
+            options={
+                'verbose_name': 'إحصائية إعارة يومية',
+                'verbose_name_plural': 'إحصائيات الإعارة اليومية',
+                'db_table': 'reports_dailycirculation',
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyBookCirculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='الشهر')),
+                ('loans', models.PositiveIntegerField(default=0, verbose_name='الإعارات')),
+                ('overdue', models.PositiveIntegerField(default=0, verbose_name='المتأخرات')),
+            ],
+            options={
+                'verbose_name': 'إحصائية إعارة شهرية لكتاب',
+                'verbose_name_plural': 'إحصائيات الإعارة الشهرية للكتب',
+                'db_table': 'reports_monthlybookcirculation',
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyCirculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='الشهر')),
+                ('membership_type', models.CharField(choices=[('student', 'طالب'), ('teacher', 'معلم'), ('visitor', 'زائر')], max_length=20, verbose_name='نوع العضوية')),
+                ('loans', models.PositiveIntegerField(default=0, verbose_name='الإعارات')),
+                ('returns', models.PositiveIntegerField(default=0, verbose_name='المرتجعات')),
+                ('overdue', models.PositiveIntegerField(default=0, verbose_name='المتأخرات')),
+                ('fines', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='الغرامات')),
+            ],
+            options={
+                'verbose_name': 'إحصائية إعارة شهرية',
+                'verbose_name_plural': 'إحصائيات الإعارة الشهرية',
+                'db_table': 'reports_monthlycirculation',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['return_date'], name='borrow_return_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['due_date'], name='borrow_due_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailycirculation',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.book', verbose_name='الكتاب'),
+        ),
+        migrations.AddField(
+            model_name='dailycirculation',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.category', verbose_name='التصنيف'),
+        ),
+        migrations.AddField(
+            model_name='monthlybookcirculation',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.book', verbose_name='الكتاب'),
+        ),
+        migrations.AddField(
+            model_name='monthlycirculation',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.category', verbose_name='التصنيف'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycirculation',
+            constraint=models.UniqueConstraint(fields=('day', 'book', 'membership_type'), name='daily_circulation_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlybookcirculation',
+            index=models.Index(fields=['month', 'book', 'loans', 'overdue'], name='monthly_book_ranking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlycirculation',
+            index=models.Index(fields=['month'], name='monthly_circulation_month_idx'),
+        ),
+    ]
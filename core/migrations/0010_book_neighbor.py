@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_circulation_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='الدرجة')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='الترتيب')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='core.book', verbose_name='الكتاب')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.book', verbose_name='كتاب مقترح')),
+            ],
+            options={
+                'verbose_name': 'كتاب مقترح',
+                'verbose_name_plural': 'الكتب المقترحة',
+                'db_table': 'recommendations_bookneighbor',
+                'constraints': [models.UniqueConstraint(fields=('book', 'rank'), name='book_neighbor_rank_unique')],
+            },
+        ),
+    ]
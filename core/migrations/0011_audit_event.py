@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_book_neighbor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, verbose_name='الوقت')),
+                ('actor_name', models.CharField(blank=True, max_length=150, verbose_name='اسم المستخدم')),
+                ('action', models.CharField(choices=[('create', 'إضافة'), ('update', 'تعديل'), ('delete', 'حذف')], max_length=10, verbose_name='العملية')),
+                ('model', models.CharField(max_length=50, verbose_name='النوع')),
+                ('object_id', models.CharField(max_length=64, verbose_name='رقم السجل')),
+                ('object_repr', models.CharField(blank=True, max_length=200, verbose_name='السجل')),
+                ('changes', models.JSONField(default=dict, verbose_name='التغييرات')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'سجل تدقيق',
+                'verbose_name_plural': 'سجلات التدقيق',
+                'db_table': 'audit_auditevent',
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'), models.Index(fields=['model', 'object_id', 'timestamp'], name='audit_object_idx'), models.Index(fields=['actor', 'timestamp'], name='audit_actor_idx')],
+            },
+        ),
+    ]
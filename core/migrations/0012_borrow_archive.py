@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_audit_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrow',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('borrow_date', models.DateField(verbose_name='تاريخ الإعارة')),
+                ('due_date', models.DateField(blank=True, null=True, verbose_name='تاريخ الاستحقاق')),
+                ('return_date', models.DateField(blank=True, null=True, verbose_name='تاريخ الإرجاع')),
+                ('fine_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10, verbose_name='قيمة الغرامة')),
+                ('status', models.CharField(choices=[('active', 'نشط'), ('returned', 'تم الإرجاع'), ('overdue', 'متأخر')], default='returned', max_length=20, verbose_name='الحالة')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ الأرشفة')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.book', verbose_name='الكتاب')),
+                ('employee', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.employee', verbose_name='الموظف المسؤول')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.member', verbose_name='العضو')),
+            ],
+            options={
+                'verbose_name': 'سجل إعارة مؤرشف',
+                'verbose_name_plural': 'سجلات الإعارة المؤرشفة',
+                'db_table': 'borrowing_borrow_archive',
+                'indexes': [models.Index(fields=['member', 'borrow_date', 'id'], name='archive_member_date_idx'), models.Index(fields=['borrow_date', 'id'], name='archive_date_id_idx'), models.Index(fields=['return_date'], name='archive_return_date_idx')],
+            },
+        ),
+    ]
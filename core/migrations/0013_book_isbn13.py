@@ -0,0 +1,62 @@
+import re
+
+from django.db import migrations, models
+
+_DIGIT_MAP = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '0123456789' * 2)
+_NOT_ISBN = re.compile('[^0-9X]')
+
+
+def _ean_check_digit(first12):
+    return str(-sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(first12)) % 10)
+
+
+def isbn13(code):
+    # Frozen copy of core.text.isbn13 at the time of this migration
+    code = _NOT_ISBN.sub('', str(code or '').translate(_DIGIT_MAP).upper())
+    if len(code) in (15, 18) and code[:3] in ('978', '979'):
+        code = code[:13]
+    if len(code) == 10 and 'X' not in code[:9]:
+        if sum((10 - i) * (10 if d == 'X' else int(d)) for i, d in enumerate(code)) % 11 == 0:
+            body = '978' + code[:9]
+            return body + _ean_check_digit(body)
+    if len(code) == 13 and code.isdigit() and code[:3] in ('978', '979') and _ean_check_digit(code[:12]) == code[12]:
+        return code
+    return None
+
+
+def backfill_isbn13(apps, schema_editor):
+    Book = apps.get_model('core', 'Book')
+    seen, batch = set(), []
+    for pk, isbn in Book.objects.order_by('pk').values_list('pk', 'isbn').iterator(chunk_size=5000):
+        canonical = isbn13(isbn)
+        # Two legacy rows for the same ISBN (e.g. typed as ISBN-10 and ISBN-13): the oldest
+        # keeps the canonical code, the other stays NULL until someone merges or fixes it
+        if canonical is None or canonical in seen:
+            continue
+        seen.add(canonical)
+        batch.append(Book(pk=pk, isbn13=canonical))
+        if len(batch) >= 5000:
+            Book.objects.bulk_update(batch, ['isbn13'])
+            batch = []
+    Book.objects.bulk_update(batch, ['isbn13'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_borrow_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True, verbose_name='ISBN-13'),
+        ),
+        migrations.RunPython(backfill_isbn13, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True, unique=True, verbose_name='ISBN-13'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_book_isbn13'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='auditevent',
+            name='audit_actor_idx',
+        ),
+        migrations.AddIndex(
+            model_name='auditevent',
+            index=models.Index(fields=['actor_name', 'timestamp', 'id'], name='audit_actor_name_idx'),
+        ),
+    ]
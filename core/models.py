@@ -1,31 +1,87 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from datetime import timedelta, date
 
+from .text import isbn13, normalize_name
+
 # ==========================================
 # BOOKS MODELS
 # ==========================================
 
+class NamedQuerySet(models.QuerySet):
+    """Lookups by the normalized `name_key` shared by Author and Category."""
+
+    def resolve(self, names):
+        """
+        Return one instance per name (same order, duplicates share an instance),
+        creating the missing ones. Two queries whatever the number of names:
+        INSERT ... ON CONFLICT DO NOTHING, then a lookup on the unique key.
+        """
+        keys = [normalize_name(name) for name in names]
+        spelling = {}
+        for name, key in zip(names, keys):
+            if key:
+                spelling.setdefault(key, ' '.join(name.split()))
+        if not spelling:
+            return []
+        self.bulk_create(
+            [self.model(name=name, name_key=key) for key, name in spelling.items()],
+            ignore_conflicts=True,
+        )
+        found = self.in_bulk(list(spelling), field_name='name_key')
+        return [found[key] for key in keys if key]
+
+    def get_by_name(self, name):
+        return self.get(name_key=normalize_name(name))
+
+
+def _name_key(obj):
+    # Same rule as migration 0005: a row left without a usable name is keyed by its pk,
+    # so blank names never collide on the unique name_key
+    key = normalize_name(obj.name)
+    if key:
+        return key
+    if obj.pk is None:
+        raise ValidationError({'name': 'الاسم مطلوب.'})
+    return f'#{obj.pk}'
+
+
 class Category(models.Model):
     name = models.CharField(_('اسم التصنيف'), max_length=100)
+    name_key = models.CharField(max_length=100, unique=True, editable=False)
+
+    objects = NamedQuerySet.as_manager()
     
     class Meta:
         db_table = 'books_category'
         verbose_name = _('تصنيف')
         verbose_name_plural = _('التصنيفات')
+
+    def save(self, *args, **kwargs):
+        self.name_key = _name_key(self)
+        super().save(*args, **kwargs)
         
     def __str__(self):
         return self.name
 
 class Author(models.Model):
     name = models.CharField(_('اسم المؤلف'), max_length=200)
+    name_key = models.CharField(max_length=200, unique=True, editable=False)
     biography = models.TextField(_('السيرة الذاتية'), blank=True)
+
+    objects = NamedQuerySet.as_manager()
     
     class Meta:
         db_table = 'books_author'
         verbose_name = _('مؤلف')
         verbose_name_plural = _('المؤلفين')
+
+    def save(self, *args, **kwargs):
+        self.name_key = _name_key(self)
+        super().save(*args, **kwargs)
         
     def __str__(self):
         return self.name
@@ -40,12 +96,16 @@ class Book(models.Model):
     
     title = models.CharField(_('عنوان الكتاب'), max_length=200)
     isbn = models.CharField(_('الرقم التسلسلي (ISBN)'), max_length=13, unique=True)
+    # Canonical ISBN-13 of `isbn` (core.text.isbn13), kept by save(); NULL for codes that are not valid ISBNs
+    isbn13 = models.CharField(_('ISBN-13'), max_length=13, unique=True, null=True, blank=True, editable=False)
     authors = models.ManyToManyField(Author, verbose_name=_('المؤلفين'), related_name='books', db_table='books_book_authors')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, verbose_name=_('التصنيف'))
     publication_year = models.PositiveIntegerField(_('سنة النشر'), null=True, blank=True)
     total_copies = models.PositiveIntegerField(_('عدد النسخ الكلي'), default=1)
     available_copies = models.PositiveIntegerField(_('النسخ المتاحة'), default=1)
     cover_image = models.ImageField(_('صورة الغلاف'), upload_to='books/covers/', blank=True, null=True)
+    # Name of the cover the current thumbnails were rendered from (see core/thumbnails.py)
+    cover_thumbnail_source = models.CharField(max_length=100, blank=True, editable=False)
     status = models.CharField(_('الحالة'), max_length=20, choices=STATUS_CHOICES, default='available')
     added_date = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
@@ -54,10 +114,48 @@ class Book(models.Model):
         db_table = 'books_book'
         verbose_name = _('كتاب')
         verbose_name_plural = _('الكتب')
+        indexes = [
+            models.Index(fields=['status'], name='book_status_idx'),
+        ]
         
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        book = super().from_db(db, field_names, values)
+        book._loaded_isbn = book.__dict__.get('isbn')
+        return book
+
+    def _isbn_changed(self):
+        # Only a new or edited isbn re-derives isbn13: a legacy duplicate left NULL by
+        # migration 0013 must stay savable until someone actually changes its code
+        return 'isbn' in self.__dict__ and (self._state.adding or self.isbn != getattr(self, '_loaded_isbn', None))
+
+    def clean(self):
+        # isbn13 is not editable, so form validation never sees its unique constraint
+        if self._isbn_changed():
+            canonical = isbn13(self.isbn)
+            if canonical and Book.objects.filter(models.Q(isbn13=canonical) | models.Q(isbn=canonical)).exclude(pk=self.pk).exists():
+                raise ValidationError({'isbn': 'يوجد كتاب مسجل بنفس رقم ISBN.'})
+
+    def save(self, *args, **kwargs):
+        if self._isbn_changed():
+            self.isbn13 = isbn13(self.isbn)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'isbn' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'isbn13'}
+        super().save(*args, **kwargs)
+        self._loaded_isbn = self.__dict__.get('isbn')
+
     def __str__(self):
         return self.title
 
+    @property
+    def cover_thumbnails(self):
+        """srcset URLs per rendition, or None until the worker has rendered this cover."""
+        if not self.cover_image or self.cover_thumbnail_source != self.cover_image.name:
+            return None
+        from .thumbnails import srcsets
+        return srcsets(self.cover_image.name)
+
 # ==========================================
 # MEMBERS MODELS
 # ==========================================
@@ -115,7 +213,7 @@ class Employee(models.Model):
         verbose_name_plural = _('الموظفين')
         
     def __str__(self):
-        return f"{self.user.get_full_name()} - {self.get_role_display()}"
+        return f"{self.user.get_full_name() or self.user.get_username()} - {self.get_role_display()}"
 
 # ==========================================
 # BORROWING MODELS
@@ -141,6 +239,17 @@ class Borrow(models.Model):
         db_table = 'borrowing_borrow'
         verbose_name = _('سجل إعارة')
         verbose_name_plural = _('سجلات الإعارة')
+        indexes = [
+            # Active loans (status prefix) and the overdue sweep (status, due_date)
+            models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+            # A member's open loans
+            models.Index(fields=['member', 'status'], name='borrow_member_status_idx'),
+            # Dashboard "latest loans" and the keyset-paginated borrowing list
+            models.Index(fields=['borrow_date', 'id'], name='borrow_date_id_idx'),
+            # Incremental report rollups read returns and due dates by day
+            models.Index(fields=['return_date'], name='borrow_return_date_idx'),
+            models.Index(fields=['due_date'], name='borrow_due_date_idx'),
+        ]
         
     def save(self, *args, **kwargs):
         if not self.due_date:
@@ -150,3 +259,219 @@ class Borrow(models.Model):
         
     def __str__(self):
         return f"{self.book.title} - {self.member.full_name}"
+
+
+class ArchivedBorrow(models.Model):
+    """
+    A returned loan moved out of borrowing_borrow by archive_loans (core/archive.py).
+    Same columns and the same id as the Borrow row it replaces.
+    """
+    id = models.IntegerField(primary_key=True)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', verbose_name=_('الكتاب'))
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='+', verbose_name=_('العضو'))
+    employee = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True, related_name='+',
+                                 verbose_name=_('الموظف المسؤول'))
+    borrow_date = models.DateField(_('تاريخ الإعارة'))
+    due_date = models.DateField(_('تاريخ الاستحقاق'), null=True, blank=True)
+    return_date = models.DateField(_('تاريخ الإرجاع'), null=True, blank=True)
+    fine_amount = models.DecimalField(_('قيمة الغرامة'), max_digits=10, decimal_places=2, default=0.00)
+    status = models.CharField(_('الحالة'), max_length=20, choices=Borrow.STATUS_CHOICES, default='returned')
+    archived_at = models.DateTimeField(_('تاريخ الأرشفة'), default=timezone.now)
+
+    class Meta:
+        db_table = 'borrowing_borrow_archive'
+        verbose_name = _('سجل إعارة مؤرشف')
+        verbose_name_plural = _('سجلات الإعارة المؤرشفة')
+        indexes = [
+            # A member's history, newest first (same keys as the live list)
+            models.Index(fields=['member', 'borrow_date', 'id'], name='archive_member_date_idx'),
+            models.Index(fields=['borrow_date', 'id'], name='archive_date_id_idx'),
+            # archived_through() and report rebuilds over archived days
+            models.Index(fields=['return_date'], name='archive_return_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book.title} - {self.member.full_name}"
+
+# ==========================================
+# RESERVATIONS MODELS
+# ==========================================
+
+class Reservation(models.Model):
+    STATUS_CHOICES = [
+        ('waiting', _('في الانتظار')),
+        ('ready', _('جاهز للاستلام')),
+        ('fulfilled', _('تم الاستلام')),
+        ('expired', _('منتهي')),
+        ('cancelled', _('ملغى')),
+    ]
+
+    # Lower is served first; copied from Member.membership_level when the hold is placed
+    PRIORITIES = {'gold': 0, 'silver': 1, 'regular': 2}
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='reservations', verbose_name=_('الكتاب'))
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='reservations', verbose_name=_('العضو'))
+    priority = models.PositiveSmallIntegerField(_('الأولوية'), default=2)
+    requested_at = models.DateTimeField(_('وقت الطلب'), default=timezone.now)
+    status = models.CharField(_('الحالة'), max_length=20, choices=STATUS_CHOICES, default='waiting')
+    ready_at = models.DateTimeField(_('وقت التجهيز'), null=True, blank=True)
+    expires_at = models.DateTimeField(_('آخر موعد للاستلام'), null=True, blank=True)
+
+    class Meta:
+        db_table = 'reservations_reservation'
+        verbose_name = _('حجز')
+        verbose_name_plural = _('الحجوزات')
+        indexes = [
+            # The queue itself: next in line for a book is one seek on this index
+            models.Index(fields=['book', 'status', 'priority', 'requested_at', 'id'], name='reservation_queue_idx'),
+            # Uncollected holds past their pickup deadline
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+            models.Index(fields=['member', 'status'], name='reservation_member_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['book', 'member'], condition=models.Q(status__in=['waiting', 'ready']),
+                name='reservation_one_open_hold',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.book.title} - {self.member.full_name}"
+
+# ==========================================
+# REPORTS MODELS
+# ==========================================
+
+class DailyCirculation(models.Model):
+    """Loans, returns, overdue loans and fines per day, book and membership type (see core/reports.py)."""
+    day = models.DateField(_('اليوم'))
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', verbose_name=_('الكتاب'))
+    # The book's category when the day was rolled up
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+',
+                                 verbose_name=_('التصنيف'))
+    membership_type = models.CharField(_('نوع العضوية'), max_length=20, choices=Member.MEMBERSHIP_TYPES)
+    loans = models.PositiveIntegerField(_('الإعارات'), default=0)
+    returns = models.PositiveIntegerField(_('المرتجعات'), default=0)
+    overdue = models.PositiveIntegerField(_('المتأخرات'), default=0)
+    fines = models.DecimalField(_('الغرامات'), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'reports_dailycirculation'
+        verbose_name = _('إحصائية إعارة يومية')
+        verbose_name_plural = _('إحصائيات الإعارة اليومية')
+        constraints = [
+            # Leading on day, so it also serves the date-range scans of every report
+            models.UniqueConstraint(fields=['day', 'book', 'membership_type'], name='daily_circulation_unique'),
+        ]
+
+
+class MonthlyCirculation(models.Model):
+    """DailyCirculation summed per month, category and membership type: what the report pages read."""
+    month = models.DateField(_('الشهر'))
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+',
+                                 verbose_name=_('التصنيف'))
+    membership_type = models.CharField(_('نوع العضوية'), max_length=20, choices=Member.MEMBERSHIP_TYPES)
+    loans = models.PositiveIntegerField(_('الإعارات'), default=0)
+    returns = models.PositiveIntegerField(_('المرتجعات'), default=0)
+    overdue = models.PositiveIntegerField(_('المتأخرات'), default=0)
+    fines = models.DecimalField(_('الغرامات'), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'reports_monthlycirculation'
+        verbose_name = _('إحصائية إعارة شهرية')
+        verbose_name_plural = _('إحصائيات الإعارة الشهرية')
+        indexes = [models.Index(fields=['month'], name='monthly_circulation_month_idx')]
+
+
+class MonthlyBookCirculation(models.Model):
+    """Loans per month and book, for the most-borrowed ranking."""
+    month = models.DateField(_('الشهر'))
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', verbose_name=_('الكتاب'))
+    loans = models.PositiveIntegerField(_('الإعارات'), default=0)
+    overdue = models.PositiveIntegerField(_('المتأخرات'), default=0)
+
+    class Meta:
+        db_table = 'reports_monthlybookcirculation'
+        verbose_name = _('إحصائية إعارة شهرية لكتاب')
+        verbose_name_plural = _('إحصائيات الإعارة الشهرية للكتب')
+        indexes = [
+            # Covering: the ranking is answered from the index alone
+            models.Index(fields=['month', 'book', 'loans', 'overdue'], name='monthly_book_ranking_idx'),
+        ]
+
+# ==========================================
+# RECOMMENDATIONS MODELS
+# ==========================================
+
+class BookNeighbor(models.Model):
+    """Top-K "also borrowed" books per book, written by core/recommendations.py."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbors', verbose_name=_('الكتاب'))
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', verbose_name=_('كتاب مقترح'))
+    # Share of the book's borrowers who also borrowed the neighbour
+    score = models.FloatField(_('الدرجة'))
+    rank = models.PositiveSmallIntegerField(_('الترتيب'))
+
+    class Meta:
+        db_table = 'recommendations_bookneighbor'
+        verbose_name = _('كتاب مقترح')
+        verbose_name_plural = _('الكتب المقترحة')
+        constraints = [
+            # A book's neighbour list is one range scan on this index
+            models.UniqueConstraint(fields=['book', 'rank'], name='book_neighbor_rank_unique'),
+        ]
+
+# ==========================================
+# AUDIT MODELS
+# ==========================================
+
+class AuditEvent(models.Model):
+    """One create/update/delete of an audited model, written in batches by core/audit.py."""
+    ACTION_CHOICES = [
+        ('create', _('إضافة')),
+        ('update', _('تعديل')),
+        ('delete', _('حذف')),
+    ]
+
+    timestamp = models.DateTimeField(_('الوقت'), default=timezone.now)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                              verbose_name=_('المستخدم'))
+    # Kept as text so the entry still reads correctly after the account is deleted
+    actor_name = models.CharField(_('اسم المستخدم'), max_length=150, blank=True)
+    action = models.CharField(_('العملية'), max_length=10, choices=ACTION_CHOICES)
+    model = models.CharField(_('النوع'), max_length=50)
+    object_id = models.CharField(_('رقم السجل'), max_length=64)
+    object_repr = models.CharField(_('السجل'), max_length=200, blank=True)
+    # {field: [old, new]}
+    changes = models.JSONField(_('التغييرات'), default=dict)
+
+    class Meta:
+        db_table = 'audit_auditevent'
+        verbose_name = _('سجل تدقيق')
+        verbose_name_plural = _('سجلات التدقيق')
+        indexes = [
+            # Newest first, keyset paginated
+            models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'),
+            # History of one record
+            models.Index(fields=['model', 'object_id', 'timestamp'], name='audit_object_idx'),
+            # Filtered by name, which also finds events of deleted accounts
+            models.Index(fields=['actor_name', 'timestamp', 'id'], name='audit_actor_name_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.model} #{self.object_id}"
+
+# ==========================================
+# STATS MODELS
+# ==========================================
+
+class DashboardCounter(models.Model):
+    name = models.CharField(_('اسم العداد'), max_length=50, primary_key=True)
+    value = models.BigIntegerField(_('القيمة'), default=0)
+
+    class Meta:
+        db_table = 'stats_dashboardcounter'
+        verbose_name = _('عداد لوحة التحكم')
+        verbose_name_plural = _('عدادات لوحة التحكم')
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,170 @@
+import base64
+import itertools
+import json
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """
+    A single page of a keyset (cursor) paginated queryset.
+    Exposes ready-to-use query strings for the next/previous links.
+    """
+
+    def __init__(self, object_list, next_cursor, prev_cursor, params):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query(self, key, cursor):
+        params = self._params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[key] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query('after', self.next_cursor) if self.has_next else ''
+
+    @property
+    def prev_query(self):
+        return self._query('before', self.prev_cursor) if self.has_previous else ''
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, fields):
+    """
+    Turn a cursor token back into python values for the given model fields.
+    Returns None for anything that does not decode cleanly.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _seek_filter(keys, values, descending, forward):
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+    lookup = 'lt' if descending == forward else 'gt'
+    condition = Q()
+    for i, key in enumerate(keys):
+        term = Q(**{f'{key}__{lookup}': values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            term &= Q(**{prev_key: prev_value})
+        condition |= term
+    return condition
+
+
+def get_page_size(request):
+    default = getattr(settings, 'LIST_PAGE_SIZE', 25)
+    maximum = getattr(settings, 'LIST_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(request.GET.get('per_page', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+class _Seek:
+    """The query half of keyset pagination, shared by the sync and async entry points."""
+
+    def __init__(self, request, queryset, keys, descending, per_page):
+        self.keys = list(keys)
+        self.descending = descending
+        self.per_page = per_page or get_page_size(request)
+        self.fields = [queryset.model._meta.get_field(key) for key in self.keys]
+        self.params = request.GET
+
+        before = request.GET.get('before')
+        token = before or request.GET.get('after')
+        self.cursor = decode_cursor(token, self.fields) if token else None
+        self.forward = self.cursor is None or not before
+
+        prefix = '-' if descending == self.forward else ''
+        ordered = queryset.order_by(*[prefix + key for key in self.keys])
+        if self.cursor is not None:
+            ordered = ordered.filter(_seek_filter(self.keys, self.cursor, descending, self.forward))
+        self.queryset = ordered[:self.per_page + 1]
+
+    def _cursor_for(self, obj):
+        return encode_cursor([field.value_to_string(obj) for field in self.fields])
+
+    def page(self, rows):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not self.forward:
+            rows.reverse()
+
+        next_cursor = prev_cursor = None
+        if rows:
+            if self.forward:
+                if has_more:
+                    next_cursor = self._cursor_for(rows[-1])
+                if self.cursor is not None:
+                    prev_cursor = self._cursor_for(rows[0])
+            else:
+                next_cursor = self._cursor_for(rows[-1])
+                if has_more:
+                    prev_cursor = self._cursor_for(rows[0])
+
+        return KeysetPage(rows, next_cursor, prev_cursor, self.params)
+
+
+def keyset_paginate(request, queryset, keys=('id',), descending=False, per_page=None):
+    """
+    Paginate a queryset by seeking on `keys` (the last one must be unique),
+    reading the cursor from `?after=` / `?before=`.
+    Only fetches per_page + 1 rows: no COUNT(*) and no OFFSET.
+    """
+    seek = _Seek(request, queryset, keys, descending, per_page)
+    return seek.page(list(seek.queryset))
+
+
+async def akeyset_paginate(request, queryset, keys=('id',), descending=False, per_page=None):
+    """Async variant of keyset_paginate for async views."""
+    seek = _Seek(request, queryset, keys, descending, per_page)
+    return seek.page([obj async for obj in seek.queryset])
+
+
+def keyset_paginate_merged(request, querysets, keys=('id',), descending=False, per_page=None):
+    """
+    keyset_paginate over several querysets sharing `keys` whose rows never
+    collide (e.g. live and archived loans): each one is seeked with the same
+    cursor and the per_page + 1 rows of each are merged in Python.
+    """
+    seeks = [_Seek(request, queryset, keys, descending, per_page) for queryset in querysets]
+    seek = seeks[0]
+    rows = itertools.chain.from_iterable(s.queryset for s in seeks)
+    rows = sorted(rows, key=attrgetter(*seek.keys), reverse=descending == seek.forward)
+    return seek.page(rows[:seek.per_page + 1])
@@ -0,0 +1,216 @@
+import itertools
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from .models import ArchivedBorrow, Book, BookNeighbor, Borrow
+
+# NumPy/SciPy are only imported by the build (build_recommendations); the
+# pages read BookNeighbor rows and never need them.
+
+_DELETE_CHUNK = 500
+
+
+def get_top_k():
+    return getattr(settings, 'RECOMMENDATIONS_TOP_K', 10)
+
+
+def get_min_support():
+    return getattr(settings, 'RECOMMENDATIONS_MIN_SUPPORT', 2)
+
+
+# ==========================================
+# CO-OCCURRENCE MATRIX
+# ==========================================
+
+def borrow_matrix(members, books, shape):
+    """Binary member x book CSR matrix from parallel id arrays: repeat loans count once."""
+    import numpy as np
+    import scipy.sparse as sp
+
+    matrix = sp.csr_matrix((np.ones(len(members), dtype=np.int32), (members, books)), shape=shape)
+    matrix.data[:] = 1
+    return matrix
+
+
+def cooccurrence(loans):
+    """Book x book matrix: entry (i, j) is the number of members who borrowed both, (i, i) the borrowers of i."""
+    return (loans.T @ loans).tocsr()
+
+
+def add_loans(matrix, old_members, old_books, new_members, new_books):
+    """
+    Fold new loans into a co-occurrence matrix without recomputing it.
+    `old_*` are the earlier loans of the members in `new_*`. Returns the
+    updated matrix and the ids of the books whose rows changed.
+    """
+    import numpy as np
+
+    size = max(matrix.shape[0], int(new_books.max()) + 1, int(old_books.max(initial=0)) + 1)
+    shape = (int(max(new_members.max(), old_members.max(initial=0))) + 1, size)
+    old = borrow_matrix(old_members, old_books, shape)
+    new = borrow_matrix(new_members, new_books, shape)
+    new = (new - new.multiply(old)).tocsr()  # a book borrowed again adds nothing
+    new.eliminate_zeros()
+
+    # (old + new)^T (old + new) - old^T old
+    cross = new.T @ old
+    delta = (cross + cross.T + new.T @ new).tocsr()
+    matrix = matrix.copy()
+    matrix.resize((size, size))
+    return (matrix + delta).tocsr(), np.unique(delta.nonzero()[0])
+
+
+def top_neighbors(matrix, k, min_support=1, rows=None):
+    """
+    The k best neighbours of every book (or only `rows`), fully vectorised.
+    Score is the share of a book's borrowers who also borrowed the neighbour,
+    so a row depends only on its own entries and incremental updates stay exact.
+    Returns parallel arrays (book, neighbor, score, rank).
+    """
+    import numpy as np
+
+    if rows is None:
+        coo = matrix.tocoo()
+        book, neighbor = coo.row, coo.col
+    else:
+        coo = matrix[rows].tocoo()
+        book, neighbor = np.asarray(rows)[coo.row], coo.col
+    borrowers = matrix.diagonal()
+    keep = (book != neighbor) & (coo.data >= min_support)
+    book, neighbor, together = book[keep], neighbor[keep], coo.data[keep]
+    score = together / borrowers[book]
+
+    # Group by book, best score first, lowest id on ties; then cut each group at k
+    order = np.lexsort((neighbor, -score, book))
+    book, neighbor, score = book[order], neighbor[order], score[order]
+    starts = np.flatnonzero(np.r_[True, book[1:] != book[:-1]])
+    rank = np.arange(len(book)) - np.repeat(starts, np.diff(np.r_[starts, len(book)]))
+    keep = rank < k
+    return book[keep], neighbor[keep], score[keep], rank[keep]
+
+
+# ==========================================
+# BUILD / PERSISTENCE
+# ==========================================
+
+def _pairs(**filters):
+    """(member, book) id arrays for the loans matching `filters`, live and archived."""
+    import numpy as np
+
+    rows = itertools.chain.from_iterable(
+        model.objects.filter(**filters).order_by().values_list('member_id', 'book_id').iterator(chunk_size=10000)
+        for model in (Borrow, ArchivedBorrow)
+    )
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64)
+    pairs = flat.reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def _load_state(path):
+    import numpy as np
+    import scipy.sparse as sp
+
+    try:
+        with np.load(path) as saved:
+            matrix = sp.csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=tuple(saved['shape']))
+            return matrix, int(saved['watermark'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _save_state(path, matrix, watermark):
+    import numpy as np
+
+    # Written next to the target and renamed, so a crash never leaves half a file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.npz', delete=False) as f:
+        np.savez(f, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                 shape=np.array(matrix.shape), watermark=np.array(watermark))
+    os.replace(f.name, path)
+
+
+def _save_neighbors(book, neighbor, score, rank, rows=None):
+    import numpy as np
+
+    # Books deleted since their loans were counted must not be referenced
+    existing = np.fromiter(Book.objects.values_list('pk', flat=True).iterator(), dtype=np.int64)
+    keep = np.isin(book, existing) & np.isin(neighbor, existing)
+    objects = (
+        BookNeighbor(book_id=b, neighbor_id=n, score=s, rank=r)
+        for b, n, s, r in zip(book[keep].tolist(), neighbor[keep].tolist(), score[keep].tolist(),
+                              rank[keep].tolist())
+    )
+    with transaction.atomic():
+        if rows is None:
+            BookNeighbor.objects.all().delete()
+        else:
+            ids = rows.tolist()
+            for start in range(0, len(ids), _DELETE_CHUNK):
+                BookNeighbor.objects.filter(book_id__in=ids[start:start + _DELETE_CHUNK]).delete()
+        BookNeighbor.objects.bulk_create(objects, batch_size=5000)
+
+
+def build(rebuild=False, top_k=None, min_support=None, path=None):
+    """
+    Bring the BookNeighbor table up to date. The co-occurrence matrix and the
+    last loan id folded into it are kept in RECOMMENDATIONS_MATRIX; each run
+    adds only the loans after that id and rewrites only the rows they change.
+    Returns {'loans': new loans folded in, 'books': neighbour rows rewritten}.
+    """
+    top_k = top_k or get_top_k()
+    min_support = get_min_support() if min_support is None else min_support
+    path = path or settings.RECOMMENDATIONS_MATRIX
+    state = None if rebuild else _load_state(path)
+    last_id = max(model.objects.aggregate(last=Max('id'))['last'] or 0 for model in (Borrow, ArchivedBorrow))
+
+    if state is None:
+        members, books = _pairs(id__lte=last_id)
+        if not len(members):
+            return {'loans': 0, 'books': 0}
+        matrix = cooccurrence(borrow_matrix(members, books, (int(members.max()) + 1, int(books.max()) + 1)))
+        rows = None
+    else:
+        matrix, watermark = state
+        new = Borrow.objects.filter(id__gt=watermark, id__lte=last_id)
+        members, books = _pairs(id__gt=watermark, id__lte=last_id)
+        if not len(members):
+            return {'loans': 0, 'books': 0}
+        old_members, old_books = _pairs(id__lte=watermark, member_id__in=new.values('member_id'))
+        matrix, rows = add_loans(matrix, old_members, old_books, members, books)
+
+    neighbors = top_neighbors(matrix, top_k, min_support, rows)
+    _save_neighbors(*neighbors, rows=rows)
+    _save_state(path, matrix, last_id)
+    return {'loans': len(members), 'books': matrix.shape[0] if rows is None else len(rows)}
+
+
+# ==========================================
+# PAGE LOOKUPS
+# ==========================================
+
+def also_borrowed(book_id, limit=None):
+    """Neighbours of one book, best first: a range scan on (book, rank)."""
+    neighbors = BookNeighbor.objects.filter(book_id=book_id).select_related('neighbor').order_by('rank')
+    return neighbors[:limit] if limit else neighbors
+
+
+def suggested_for(member_id, limit=6, history=20):
+    """
+    Books to suggest to a member: neighbours of their `history` latest loans,
+    scores summed, minus anything they have already borrowed. One query.
+    """
+    loans = Borrow.objects.filter(member_id=member_id)
+    recent = loans.order_by('-borrow_date', '-id').values('book_id')[:history]
+    return (
+        BookNeighbor.objects
+        .filter(book_id__in=recent)
+        .exclude(neighbor_id__in=loans.values('book_id'))
+        .values('neighbor_id', 'neighbor__title')
+        .annotate(score=Sum('score'))
+        .order_by('-score', 'neighbor_id')[:limit]
+    )
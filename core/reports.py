@@ -0,0 +1,182 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from . import archive
+from .models import ArchivedBorrow, Book, Borrow, Category, DailyCirculation, MonthlyBookCirculation, MonthlyCirculation
+
+# Days rolled up per transaction: bounds memory and keeps each write lock short
+DEFAULT_WINDOW_DAYS = 31
+
+TOTALS = {
+    'loans': Sum('loans'),
+    'returns': Sum('returns'),
+    'overdue': Sum('overdue'),
+    'fines': Sum('fines'),
+}
+
+_GROUP = ('book_id', 'book__category_id', 'member__membership_type')
+
+
+# ==========================================
+# ROLLUP BUILD
+# ==========================================
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def rolled_up_through():
+    return DailyCirculation.objects.aggregate(last=Max('day'))['last']
+
+
+def _collect(querysets, day_field, shift=0):
+    # {(day, book, category, membership_type): totals} summed over grouped Borrow/ArchivedBorrow queries
+    collected = {}
+    for rows in querysets:
+        for row in rows:
+            key = (row[day_field] + timedelta(days=shift), *(row[name] for name in _GROUP))
+            totals = collected.setdefault(key, {})
+            for name in ('n', 'fines'):
+                if name in row:
+                    totals[name] = totals.get(name, 0) + (row[name] or 0)
+    return collected
+
+
+def _window_rows(start, end):
+    sources = [Borrow.objects.order_by()]
+    # Archived loans have no date after archived_through(), so later windows skip the archive
+    through = archive.archived_through()
+    if through is not None and start <= through:
+        sources.append(ArchivedBorrow.objects.order_by())
+    loans = _collect((
+        borrows.filter(borrow_date__range=(start, end))
+        .values('borrow_date', *_GROUP).annotate(n=Count('id'))
+        for borrows in sources
+    ), 'borrow_date')
+    returns = _collect((
+        borrows.filter(return_date__range=(start, end))
+        .values('return_date', *_GROUP).annotate(n=Count('id'), fines=Sum('fine_amount'))
+        for borrows in sources
+    ), 'return_date')
+    # A loan counts as overdue on the day after its due date, if it was still out then
+    overdue = _collect((
+        borrows.filter(due_date__range=(start - timedelta(days=1), end - timedelta(days=1)))
+        .filter(Q(return_date__isnull=True) | Q(return_date__gt=F('due_date')))
+        .values('due_date', *_GROUP).annotate(n=Count('id'))
+        for borrows in sources
+    ), 'due_date', shift=1)
+    for key in loans.keys() | returns.keys() | overdue.keys():
+        day, book_id, category_id, membership_type = key
+        returned = returns.get(key, {})
+        yield DailyCirculation(
+            day=day, book_id=book_id, category_id=category_id, membership_type=membership_type,
+            loans=loans.get(key, {}).get('n', 0),
+            returns=returned.get('n', 0),
+            overdue=overdue.get(key, {}).get('n', 0),
+            fines=returned.get('fines') or Decimal('0'),
+        )
+
+
+def _refresh_months(start, end):
+    # Re-sum the monthly tables for every month overlapping start..end from the daily rows
+    first, last = month_start(start), month_start(end)
+    daily = DailyCirculation.objects.filter(day__range=(first, month_end(end))).order_by()
+    MonthlyCirculation.objects.filter(month__range=(first, last)).delete()
+    MonthlyCirculation.objects.bulk_create([
+        MonthlyCirculation(**row)
+        for row in daily.annotate(month=TruncMonth('day')).values('month', 'category_id', 'membership_type')
+        .annotate(**TOTALS)
+    ], batch_size=2000)
+    MonthlyBookCirculation.objects.filter(month__range=(first, last)).delete()
+    MonthlyBookCirculation.objects.bulk_create([
+        MonthlyBookCirculation(**row)
+        for row in daily.annotate(month=TruncMonth('day')).values('month', 'book_id')
+        .annotate(loans=Sum('loans'), overdue=Sum('overdue'))
+    ], batch_size=2000)
+
+
+def build_rollups(since=None, until=None, window_days=DEFAULT_WINDOW_DAYS, on_window=None):
+    """
+    Roll Borrow activity up into DailyCirculation, from `since` (default:
+    the last day already rolled up, which may have been partial) through
+    `until` (default: today), then re-sum the monthly tables for the months
+    touched. Each window of days is deleted and rebuilt in one transaction,
+    so reruns are safe. Returns the number of daily rows written.
+    """
+    until = until or date.today()
+    if since is None:
+        since = rolled_up_through()
+    if since is None:
+        firsts = [model.objects.aggregate(first=Min('borrow_date'))['first'] for model in (ArchivedBorrow, Borrow)]
+        since = min([first for first in firsts if first], default=None)
+    if since is None or since > until:
+        return 0
+
+    written = 0
+    start = since
+    while start <= until:
+        end = min(start + timedelta(days=window_days - 1), until)
+        with transaction.atomic():
+            DailyCirculation.objects.filter(day__range=(start, end)).delete()
+            rows = DailyCirculation.objects.bulk_create(_window_rows(start, end), batch_size=2000)
+            _refresh_months(start, end)
+        written += len(rows)
+        if on_window:
+            on_window(start, end, len(rows))
+        start = end + timedelta(days=1)
+    return written
+
+
+# ==========================================
+# REPORTS (monthly rollups only)
+# ==========================================
+# Periods are whole months: start and end are widened to the months containing them
+
+def _period(model, start, end):
+    return model.objects.filter(month__range=(month_start(start), month_start(end))).order_by()
+
+
+def summary(start, end):
+    totals = _period(MonthlyCirculation, start, end).aggregate(**TOTALS)
+    return {name: value or 0 for name, value in totals.items()}
+
+
+def top_books(start, end, limit=10):
+    rows = list(
+        _period(MonthlyBookCirculation, start, end).values('book_id')
+        .annotate(loans=Sum('loans'), overdue=Sum('overdue')).order_by('-loans', 'book_id')[:limit]
+    )
+    titles = dict(Book.objects.filter(pk__in=[row['book_id'] for row in rows]).values_list('pk', 'title'))
+    for row in rows:
+        row['title'] = titles.get(row['book_id'], '')
+    return rows
+
+
+def by_category(start, end):
+    rows = list(_period(MonthlyCirculation, start, end).values('category_id').annotate(**TOTALS).order_by('-loans'))
+    names = dict(Category.objects.filter(pk__in=[row['category_id'] for row in rows]).values_list('pk', 'name'))
+    for row in rows:
+        row['name'] = names.get(row['category_id'])
+    return rows
+
+
+def by_membership_type(start, end):
+    labels = dict(MonthlyCirculation._meta.get_field('membership_type').choices)
+    rows = list(
+        _period(MonthlyCirculation, start, end).values('membership_type').annotate(**TOTALS).order_by('-loans')
+    )
+    for row in rows:
+        row['label'] = labels.get(row['membership_type'], row['membership_type'])
+    return rows
+
+
+def monthly_trend(start, end):
+    return list(_period(MonthlyCirculation, start, end).values('month').annotate(**TOTALS).order_by('month'))
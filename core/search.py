@@ -0,0 +1,122 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Book
+from .text import isbn13, normalize_arabic
+
+FTS_TABLE = 'books_book_fts'
+
+_TOKEN = re.compile(r'\w+')
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def _row(book_id, title, isbn, author_names, category_name):
+    return (
+        book_id,
+        normalize_arabic(title),
+        normalize_arabic(isbn),
+        normalize_arabic(' '.join(author_names)),
+        normalize_arabic(category_name or ''),
+    )
+
+
+def index_books(book_ids):
+    """Re-index the given books (insert, update or drop missing ones)."""
+    book_ids = list(book_ids)
+    if not book_ids or not is_supported():
+        return
+    books = Book.objects.filter(pk__in=book_ids).values_list('id', 'title', 'isbn', 'category__name')
+    authors = {}
+    for book_id, name in Book.authors.through.objects.filter(book_id__in=book_ids).values_list('book_id', 'author__name'):
+        authors.setdefault(book_id, []).append(name)
+    rows = [_row(pk, title, isbn, authors.get(pk, []), category) for pk, title, isbn, category in books]
+
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, isbn, authors, category) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+
+def remove_books(book_ids):
+    book_ids = list(book_ids)
+    if not book_ids or not is_supported():
+        return
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+
+
+def rebuild_index(chunk_size=2000):
+    """
+    Drop and repopulate the whole index, walking the catalog by id in chunks.
+    Returns the number of indexed books.
+    """
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    total, last_id = 0, 0
+    while True:
+        ids = list(
+            Book.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return total
+        index_books(ids)
+        total += len(ids)
+        last_id = ids[-1]
+
+
+def build_match_query(query):
+    """
+    Turn free user input into an FTS5 MATCH expression: every term must
+    match, and each term also matches as a prefix ("تار" finds "تاريخ").
+    """
+    tokens = _TOKEN.findall(normalize_arabic(query))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_books(query, limit=None):
+    """
+    Return books matching `query`, best match first.
+    Title hits weigh more than author, category or ISBN hits.
+    """
+    limit = limit or getattr(settings, 'SEARCH_RESULT_LIMIT', 50)
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    queryset = Book.objects.select_related('category').prefetch_related('authors')
+    # A scanned or typed ISBN in any form is an exact hit on the isbn13 index
+    canonical = isbn13(query)
+    if canonical:
+        exact = list(queryset.filter(isbn13=canonical))
+        if exact:
+            return exact
+    if not is_supported():
+        term = query.strip()
+        return list(queryset.filter(
+            Q(title__icontains=term) | Q(isbn__icontains=term)
+            | Q(authors__name__icontains=term) | Q(category__name__icontains=term)
+        ).distinct()[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 2.0, 5.0, 3.0) LIMIT %s',
+            [match, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    books = queryset.in_bulk(ids)
+    return [books[pk] for pk in ids if pk in books]
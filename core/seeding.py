@@ -0,0 +1,180 @@
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import search, stats
+from .models import Author, Book, Borrow, Category, Employee, Member
+from .text import ean13, normalize_name
+
+DATASET_SIZES = {
+    'small': {'categories': 20, 'authors': 500, 'books': 2000, 'members': 500, 'employees': 10, 'borrows': 10000},
+    'medium': {'categories': 60, 'authors': 5000, 'books': 20000, 'members': 5000, 'employees': 30, 'borrows': 100000},
+    'large': {'categories': 150, 'authors': 40000, 'books': 200000, 'members': 50000, 'employees': 80,
+              'borrows': 1000000},
+}
+
+_WORDS = (
+    'تاريخ', 'الأدب', 'العربي', 'رحلة', 'علم', 'الفلك', 'مقدمة', 'في', 'فلسفة', 'الحضارة', 'أسرار', 'البحر',
+    'ديوان', 'الشعر', 'قصص', 'الأطفال', 'موسوعة', 'الطب', 'الرياضيات', 'الحديثة', 'دليل', 'البرمجة', 'الفيزياء',
+)
+_FIRST_NAMES = ('محمد', 'أحمد', 'فاطمة', 'نورة', 'خالد', 'سارة', 'عبدالله', 'ريم', 'يوسف', 'مريم', 'علي', 'هند')
+_LAST_NAMES = ('العتيبي', 'الشمري', 'القحطاني', 'الحربي', 'الزهراني', 'الغامدي', 'المطيري', 'الدوسري')
+
+
+def _insert_borrows(loans, batch_size):
+    """
+    bulk_create, then put back the generated borrow dates: borrow_date is
+    auto_now_add, which stamps every inserted row with today. The field itself
+    is left alone, so saves in other threads keep their automatic date.
+    """
+    dates = [loan.borrow_date for loan in loans]
+    Borrow.objects.bulk_create(loans)
+    for loan, borrowed in zip(loans, dates):
+        loan.borrow_date = borrowed
+    Borrow.objects.bulk_update(loans, ['borrow_date'], batch_size=batch_size)
+
+
+def _zipf_cumulative(n, s=1.1):
+    # A few titles/categories get most of the traffic, like a real catalog.
+    # Cumulative weights let random.choices bisect instead of summing per draw.
+    return list(accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def _person(rng):
+    return f'{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}'
+
+
+def _bulk(model, objects, batch_size):
+    return model.objects.bulk_create(objects, batch_size=batch_size)
+
+
+def seed(categories, authors, books, members, employees, borrows, seed=0, batch_size=5000, log=None):
+    """
+    Generate a synthetic library with bulk_create only.
+    Loans respect copies and member limits, and stored counters match them.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    password = make_password(None)
+    prefix = f'seed{seed}_'
+
+    def tag(i):
+        # Keeps names unique per seed, so several seeds can share a database
+        return f'{seed}.{i}' if seed else str(i)
+
+    with transaction.atomic():
+        names = [f'{rng.choice(_WORDS)} {tag(i)}' for i in range(categories)]
+        cats = _bulk(Category, [Category(name=name, name_key=normalize_name(name)) for name in names], batch_size)
+        log(f'{len(cats)} categories')
+
+        names = [f'{_person(rng)} {tag(i)}' for i in range(authors)]
+        writers = _bulk(Author, [Author(name=name, name_key=normalize_name(name)) for name in names], batch_size)
+        log(f'{len(writers)} authors')
+
+        shelves = rng.choices(cats, cum_weights=_zipf_cumulative(len(cats)), k=books) if cats else [None] * books
+        catalog = []
+        for i, category in enumerate(shelves):
+            copies = rng.choice((1, 1, 2, 2, 3, 5))
+            # Valid check digits, so the seeded catalog can be scanned (bulk_create skips Book.save)
+            isbn = ean13(f'979{(seed * 10_000_000 + i) % 10 ** 9:09d}')
+            catalog.append(Book(
+                title=' '.join(rng.sample(_WORDS, 3)) + f' {tag(i)}',
+                isbn=isbn,
+                isbn13=isbn,
+                category=category,
+                publication_year=rng.randint(1950, 2025),
+                total_copies=copies,
+                available_copies=copies,
+            ))
+        catalog = _bulk(Book, catalog, batch_size)
+        Through = Book.authors.through
+        if writers:
+            _bulk(Through, [
+                Through(book_id=book.pk, author_id=author.pk)
+                for book in catalog
+                for author in rng.sample(writers, min(len(writers), rng.choice((1, 1, 1, 2, 3))))
+            ], batch_size)
+        log(f'{len(catalog)} books')
+
+        member_users = _bulk(User, [
+            User(username=f'{prefix}member{i}', password=password) for i in range(members)
+        ], batch_size)
+        staff_users = _bulk(User, [
+            User(username=f'{prefix}staff{i}', password=password, is_staff=True) for i in range(employees)
+        ], batch_size)
+
+        people = _bulk(Member, [
+            Member(
+                user=user, full_name=_person(rng), phone=f'05{rng.randint(10000000, 99999999)}',
+                membership_type=rng.choices(('student', 'teacher', 'visitor'), (70, 20, 10))[0],
+                membership_level=rng.choices(('regular', 'silver', 'gold'), (75, 18, 7))[0],
+                max_borrow_limit=rng.choice((3, 3, 5)),
+            )
+            for user in member_users
+        ], batch_size)
+        staff = _bulk(Employee, [
+            Employee(user=user, role='manager' if i == 0 else rng.choice(('librarian', 'assistant')), phone='05')
+            for i, user in enumerate(staff_users)
+        ], batch_size)
+        log(f'{len(people)} members, {len(staff)} employees')
+
+        if catalog and people:
+            _seed_borrows(rng, catalog, people, staff, borrows, batch_size, log)
+
+    search.rebuild_index()
+    stats.reconcile()
+
+
+def _seed_borrows(rng, catalog, people, staff, count, batch_size, log):
+    today = date.today()
+    popularity = _zipf_cumulative(len(catalog))
+    on_loan = [0] * len(catalog)
+    holding = [0] * len(people)
+    pending = []
+    created = 0
+
+    for book_index in rng.choices(range(len(catalog)), cum_weights=popularity, k=count):
+        # Most loans are recent; only the last month's can still be open
+        age = min(int(rng.expovariate(1 / 180)), 730)
+        borrowed = today - timedelta(days=age)
+        member_index = rng.randrange(len(people))
+        book, member = catalog[book_index], people[member_index]
+        due = borrowed + timedelta(days=14)
+        can_hold = on_loan[book_index] < book.total_copies and holding[member_index] < member.max_borrow_limit
+
+        if age < 30 and can_hold:
+            status = 'active' if due >= today else 'overdue'
+            returned = None
+            on_loan[book_index] += 1
+            holding[member_index] += 1
+        else:
+            status = 'returned'
+            returned = min(today, borrowed + timedelta(days=rng.randint(1, 21)))
+
+        pending.append(Borrow(
+            book=book, member=member, employee=rng.choice(staff) if staff else None,
+            borrow_date=borrowed, due_date=due, return_date=returned, status=status,
+        ))
+        if len(pending) >= batch_size:
+            _insert_borrows(pending, batch_size)
+            created += len(pending)
+            pending.clear()
+    if pending:
+        _insert_borrows(pending, batch_size)
+        created += len(pending)
+    log(f'{created} borrows')
+
+    for book, out in zip(catalog, on_loan):
+        book.available_copies = book.total_copies - out
+        if book.available_copies == 0:
+            book.status = 'borrowed'
+    Book.objects.bulk_update([b for b, out in zip(catalog, on_loan) if out],
+                             ['available_copies', 'status'], batch_size=batch_size)
+    for member, held in zip(people, holding):
+        member.current_borrowed = held
+    Member.objects.bulk_update([m for m, held in zip(people, holding) if held],
+                               ['current_borrowed'], batch_size=batch_size)
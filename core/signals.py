@@ -0,0 +1,193 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import audit, auth, fragments, search, sqlite, stats, thumbnails
+from .models import Author, Book, Borrow, Category, Employee, Member
+
+# ==========================================
+# STORED ROW
+# ==========================================
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=Member)
+@receiver(pre_save, sender=Employee)
+@receiver(pre_save, sender=Borrow)
+def remember_stored_row(sender, instance, raw=False, **kwargs):
+    # One SELECT per save, shared by the counter, thumbnail and audit receivers below
+    instance._stored_row = None
+    if instance.pk and not raw:
+        instance._stored_row = audit.stored_snapshot(sender, instance.pk)
+
+
+def _stored(instance):
+    """The row as it was before this save ({} for a new one), keyed by attname."""
+    return getattr(instance, '_stored_row', None) or {}
+
+
+# ==========================================
+# SEARCH INDEX SYNC
+# ==========================================
+
+def _books_changed(ids):
+    # The search row and the cached list row both embed author/category names
+    ids = list(ids)
+    search.index_books(ids)
+    fragments.touch_books(ids)
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book_on_delete(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def index_book_on_authors_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # author.books.clear(): remember the books before the links are gone
+        instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _books_changed([instance.pk])
+    elif action == 'post_clear':
+        _books_changed(getattr(instance, '_search_book_ids', []))
+    else:
+        _books_changed(pk_set)
+
+
+@receiver(post_save, sender=Author)
+def index_books_on_author_rename(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        _books_changed(instance.books.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Category)
+def remember_books_before_delete(sender, instance, **kwargs):
+    related = instance.books if sender is Author else instance.book_set
+    instance._search_book_ids = list(related.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+def index_books_after_delete(sender, instance, **kwargs):
+    _books_changed(getattr(instance, '_search_book_ids', []))
+
+
+@receiver(post_save, sender=Category)
+def index_books_on_category_rename(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        _books_changed(instance.book_set.values_list('pk', flat=True))
+
+
+# ==========================================
+# DASHBOARD COUNTERS
+# ==========================================
+
+_COUNTED_MODELS = {
+    Book: 'total_books',
+    Member: 'total_members',
+    Employee: 'total_employees',
+}
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Member)
+@receiver(post_save, sender=Employee)
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.increment(_COUNTED_MODELS[sender], 1)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Member)
+@receiver(post_delete, sender=Employee)
+def count_deleted(sender, instance, **kwargs):
+    stats.increment(_COUNTED_MODELS[sender], -1)
+
+
+@receiver(post_save, sender=Borrow)
+def count_borrow_status(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    was_active = _stored(instance).get('status') == 'active'
+    is_active = instance.status == 'active'
+    stats.increment('total_borrowed', int(is_active) - int(was_active))
+
+
+@receiver(post_delete, sender=Borrow)
+def count_borrow_deleted(sender, instance, **kwargs):
+    if instance.status == 'active':
+        stats.increment('total_borrowed', -1)
+
+
+# ==========================================
+# COVER THUMBNAILS
+# ==========================================
+
+@receiver(post_save, sender=Book)
+def render_cover_thumbnails(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_cover = _stored(instance).get('cover_image') or ''
+    new_cover = instance.cover_image.name or ''
+    if old_cover != new_cover:
+        # Rendering happens in the worker thread, never inside the request
+        thumbnails.schedule(instance.pk, old_cover)
+
+
+# ==========================================
+# AUDIT LOG
+# ==========================================
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Member)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=Borrow)
+def audit_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_stored_row', None)
+    audit.record('create' if created or old is None else 'update', instance, audit.diff(old, audit.snapshot(instance)))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Member)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Borrow)
+def audit_delete(sender, instance, **kwargs):
+    audit.record('delete', instance, audit.diff(audit.snapshot(instance), None))
+
+
+# ==========================================
+# AUTH CACHE
+# ==========================================
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_cached_role(sender, instance, **kwargs):
+    auth.invalidate_role(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    auth.invalidate_user(instance.pk)
+
+
+# ==========================================
+# SQLITE TUNING
+# ==========================================
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    sqlite.configure(connection)
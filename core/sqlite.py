@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import time
+
+from django.conf import settings
+
+# Contention profiles for the benchmark: Django's stock behaviour vs. this project's settings
+STOCK_PROFILE = {'pragmas': {}, 'timeout': 5.0, 'begin': 'BEGIN'}
+
+
+def get_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items() if value not in (None, '')]
+
+
+def configure(connection):
+    """
+    Apply SQLITE_PRAGMAS to a freshly opened connection.
+    Called from the connection_created signal, so it runs once per
+    connection; with CONN_MAX_AGE that is once per worker, not per request.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    raw = connection.connection
+    for statement in pragma_statements(get_pragmas()):
+        raw.execute(statement)
+
+
+def tuned_profile():
+    options = settings.DATABASES['default'].get('OPTIONS', {})
+    mode = options.get('transaction_mode')
+    return {
+        'pragmas': get_pragmas(),
+        'timeout': options.get('timeout', 5.0),
+        'begin': f'BEGIN {mode}' if mode else 'BEGIN',
+    }
+
+
+# ==========================================
+# CONTENTION BENCHMARK
+# ==========================================
+
+def _prepare(path, rows):
+    db = sqlite3.connect(path)
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS stock (id INTEGER PRIMARY KEY, copies INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS loans (id INTEGER PRIMARY KEY, stock_id INTEGER NOT NULL, day TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS loans_stock ON loans (stock_id);
+    ''')
+    db.executemany('INSERT INTO stock (id, copies) VALUES (?, 5)', [(i,) for i in range(rows)])
+    db.commit()
+    db.close()
+
+
+def _worker(path, profile, seconds, write_ratio, rows, seed, results):
+    db = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    for statement in pragma_statements(profile['pragmas']):
+        db.execute(statement)
+    rng = random.Random(seed)
+    reads = writes = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        stock_id = rng.randrange(rows)
+        try:
+            if rng.random() < write_ratio:
+                # Read-then-write, like a checkout: the pattern that deadlocks under DEFERRED
+                db.execute(profile['begin'])
+                db.execute('SELECT copies FROM stock WHERE id = ?', (stock_id,)).fetchone()
+                db.execute('UPDATE stock SET copies = copies + 1 WHERE id = ?', (stock_id,))
+                db.execute("INSERT INTO loans (stock_id, day) VALUES (?, date('now'))", (stock_id,))
+                db.execute('COMMIT')
+                writes += 1
+            else:
+                db.execute('SELECT COUNT(*) FROM loans WHERE stock_id = ?', (stock_id,)).fetchone()
+                reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+    db.close()
+    results.put((reads, writes, errors))
+
+
+def run_contention(path, profile, processes=4, seconds=5.0, write_ratio=0.2, rows=1000):
+    """
+    Hammer a fresh database file at `path` from `processes` OS processes.
+    Returns {'ops_per_second', 'reads', 'writes', 'errors', 'error_rate'}.
+    """
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    _prepare(path, rows)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(path, profile, seconds, write_ratio, rows, seed, results))
+        for seed in range(processes)
+    ]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    totals = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    reads, writes, errors = (sum(column) for column in zip(*totals))
+    attempts = reads + writes + errors
+    return {
+        'ops_per_second': round((reads + writes) / elapsed, 1),
+        'reads': reads,
+        'writes': writes,
+        'errors': errors,
+        'error_rate': round(errors / attempts, 4) if attempts else 0.0,
+    }
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Book, Borrow, DashboardCounter, Employee, Member
+
+CACHE_KEY = 'dashboard:counters'
+
+# Counter name -> the query it materializes (used only when reconciling)
+COUNTERS = {
+    'total_books': lambda: Book.objects.count(),
+    'total_members': lambda: Member.objects.count(),
+    'total_employees': lambda: Employee.objects.count(),
+    'total_borrowed': lambda: Borrow.objects.filter(status='active').count(),
+}
+
+
+def _invalidate():
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def increment(name, delta=1):
+    """Atomically shift a counter; a missing row is rebuilt from the real count."""
+    if not delta:
+        return
+    updated = DashboardCounter.objects.filter(name=name).update(value=F('value') + delta)
+    if not updated:
+        DashboardCounter.objects.update_or_create(name=name, defaults={'value': COUNTERS[name]()})
+    _invalidate()
+
+
+def get_dashboard_counters():
+    """
+    Counters for the dashboard, served from cache when possible.
+    A cache miss costs one primary-key scan of the small summary table.
+    """
+    counters = cache.get(CACHE_KEY)
+    if counters is None:
+        counters = dict.fromkeys(COUNTERS, 0)
+        counters.update(DashboardCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value'))
+        cache.set(CACHE_KEY, counters, getattr(settings, 'DASHBOARD_CACHE_TTL', 30))
+    return counters
+
+
+def reconcile():
+    """
+    Recompute every counter from its source table.
+    Returns {name: (stored, actual)} for the counters that had drifted.
+    """
+    drift = {}
+    with transaction.atomic():
+        stored = dict(DashboardCounter.objects.select_for_update().values_list('name', 'value'))
+        for name, count in COUNTERS.items():
+            actual = count()
+            if stored.get(name) != actual:
+                drift[name] = (stored.get(name), actual)
+                DashboardCounter.objects.update_or_create(name=name, defaults={'value': actual})
+    cache.delete(CACHE_KEY)
+    return drift
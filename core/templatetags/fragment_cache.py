@@ -0,0 +1,32 @@
+from django import template
+
+from core.fragments import get_or_render
+
+register = template.Library()
+
+
+class CachedRowNode(template.Node):
+    def __init__(self, name, obj, nodelist):
+        self.name = name
+        self.obj = obj
+        self.nodelist = nodelist
+
+    def render(self, context):
+        obj = self.obj.resolve(context)
+        return get_or_render(self.name.resolve(context), obj, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cachedrow(parser, token):
+    """
+    {% cachedrow 'book_row' book %} ... {% endcachedrow %}
+
+    Cache the enclosed markup per object, keyed on its pk and last_updated.
+    The block must only depend on the object, never on the request.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and an object")
+    nodelist = parser.parse(('endcachedrow',))
+    parser.delete_first_token()
+    return CachedRowNode(parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), nodelist)
@@ -1,3 +1,1777 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import Count, Q
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncRequestFactory, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+
+from . import (
+    archive, async_views, audit, benchmarks, circulation, exports, importers, metrics, recommendations, reports, search, seeding, sqlite,
+    stats, thumbnails,
+)
+from .forms import BookForm, DeskCheckoutForm
+from .text import isbn13
+from .models import ArchivedBorrow, AuditEvent, Author, Book, Borrow, Category, DailyCirculation, DashboardCounter, Employee, Member, Reservation
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='pass')
+        cls.member = Member.objects.create(user=cls.user, full_name='عضو', phone='0500000000')
+        cls.books = Book.objects.bulk_create(
+            [Book(title=f'كتاب {i}', isbn=f'978000000{i:04d}') for i in range(7)]
+        )
+        borrows = Borrow.objects.bulk_create(
+            [Borrow(book=book, member=cls.member, due_date=date(2026, 1, 30)) for book in cls.books]
+        )
+        # Two loans share each borrow_date so the id tie-breaker is exercised
+        for i, borrow in enumerate(borrows):
+            Borrow.objects.filter(pk=borrow.pk).update(borrow_date=date(2026, 1, 1) + timedelta(days=i // 2))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, url):
+        seen, pages, query = [], [], ''
+        while True:
+            response = self.client.get(f'{url}?per_page=3&{query}')
+            page = response.context['page']
+            pages.append(page)
+            seen.extend(obj.pk for obj in page)
+            if not page.has_next:
+                return seen, pages
+            query = page.next_query
+
+    def test_book_list_walks_every_row_once(self):
+        seen, pages = self.walk(reverse('core:book_list'))
+        self.assertEqual(seen, [book.pk for book in self.books])
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous)
+
+    def test_borrowing_list_orders_newest_first(self):
+        seen, _ = self.walk(reverse('core:borrowing_list'))
+        expected = list(Borrow.objects.order_by('-borrow_date', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_same_page(self):
+        url = reverse('core:borrowing_list')
+        first = self.client.get(f'{url}?per_page=3').context['page']
+        second = self.client.get(f'{url}?per_page=3&{first.next_query}').context['page']
+        back = self.client.get(f'{url}?per_page=3&{second.prev_query}').context['page']
+        self.assertEqual([b.pk for b in back], [b.pk for b in first])
+
+    def test_no_count_or_offset(self):
+        url = reverse('core:book_list')
+        first = self.client.get(f'{url}?per_page=3').context['page']
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'{url}?per_page=3&{first.next_query}')
+        sql = ' '.join(q['sql'].upper() for q in ctx.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('core:member_list') + '?after=not-a-cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m.pk for m in response.context['page']], [self.member.pk])
+
+
+class CatalogSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='pass')
+        history = Category.objects.create(name='تاريخ')
+        cls.book = Book.objects.create(title='مقدمة ابن خلدون', isbn='9789953000001', category=history)
+        cls.book.authors.set([Author.objects.create(name='عبد الرحمن بن خلدون')])
+        cls.other = Book.objects.create(title='الأيام', isbn='9789953000002')
+        cls.other.authors.set([Author.objects.create(name='طه حسين')])
+
+    def ids(self, query):
+        return [book.pk for book in search.search_books(query)]
+
+    def test_normalize_arabic(self):
+        self.assertEqual(search.normalize_arabic('إِسْلامـيّة'), 'اسلاميه')
+        self.assertEqual(search.normalize_arabic('أدب آسيا'), 'ادب اسيا')
+
+    def test_matches_title_author_category_and_isbn(self):
+        self.assertEqual(self.ids('مقدمه'), [self.book.pk])
+        self.assertEqual(self.ids('خلدون'), [self.book.pk])
+        self.assertEqual(self.ids('تاريخ'), [self.book.pk])
+        self.assertEqual(self.ids('9789953000002'), [self.other.pk])
+
+    def test_hamza_variants_and_prefix(self):
+        self.assertEqual(self.ids('الايام'), [self.other.pk])
+        self.assertEqual(self.ids('طه حس'), [self.other.pk])
+
+    def test_index_follows_author_and_category_changes(self):
+        author = self.other.authors.get()
+        author.name = 'عميد الأدب'
+        author.save()
+        self.assertEqual(self.ids('عميد'), [self.other.pk])
+        self.assertEqual(self.ids('حسين'), [])
+
+        self.book.category.delete()
+        self.assertEqual(self.ids('تاريخ'), [])
+
+    def test_deleted_book_leaves_index(self):
+        self.other.delete()
+        self.assertEqual(self.ids('الأيام'), [])
+
+    def test_rebuild_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.ids('خلدون'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.ids('خلدون'), [self.book.pk])
+
+    def test_search_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('core:book_search'), {'q': 'ابن خلدون'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['books']), [self.book])
+        # The catalog box searches the index; main.js' per-page filter must not hook onto it
+        self.assertContains(response, 'id="catalogSearch"')
+        self.assertNotContains(response, 'id="tableSearch"')
+
+
+class DashboardCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='pass')
+        cls.member = Member.objects.create(user=cls.user, full_name='عضو', phone='0500000000')
+        cls.book = Book.objects.create(title='كتاب', isbn='9780000000001')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_follow_creates_deletes_and_status_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            borrow = Borrow.objects.create(book=self.book, member=self.member)
+        self.assertEqual(stats.get_dashboard_counters(), {
+            'total_books': 1, 'total_members': 1, 'total_employees': 0, 'total_borrowed': 1,
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            borrow.status = 'returned'
+            borrow.save()
+        self.assertEqual(stats.get_dashboard_counters()['total_borrowed'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            borrow.status = 'active'
+            borrow.save()
+            self.book.delete()
+        counters = stats.get_dashboard_counters()
+        self.assertEqual((counters['total_books'], counters['total_borrowed']), (0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        DashboardCounter.objects.filter(name='total_books').update(value=42)
+        out = StringIO()
+        call_command('reconcile_dashboard_counters', stdout=out)
+        self.assertIn('total_books: 42 -> 1', out.getvalue())
+        self.assertEqual(stats.get_dashboard_counters()['total_books'], 1)
+
+    def test_dashboard_runs_no_count_queries(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('core:home'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('core:home'))
+        self.assertEqual(response.context['total_members'], 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()])
+        self.assertFalse([q for q in ctx.captured_queries if 'stats_dashboardcounter' in q['sql']])
+
+
+class CirculationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='pass')
+        cls.member = Member.objects.create(user=cls.user, full_name='عضو', phone='0500000000', max_borrow_limit=2)
+        cls.book = Book.objects.create(title='كتاب', isbn='9780000000001', total_copies=2, available_copies=2)
+        cls.employee = Employee.objects.create(user=cls.user, phone='0500000001')
+
+    def refresh(self):
+        self.book.refresh_from_db()
+        self.member.refresh_from_db()
+
+    def test_checkout_and_return_move_counters(self):
+        borrow = circulation.checkout(self.book, self.member)
+        circulation.checkout(self.book, self.member)
+        self.refresh()
+        self.assertEqual((self.book.available_copies, self.book.status), (0, 'borrowed'))
+        self.assertEqual(self.member.current_borrowed, 2)
+
+        circulation.return_loan(borrow)
+        self.refresh()
+        self.assertEqual((self.book.available_copies, self.book.status), (1, 'available'))
+        self.assertEqual(self.member.current_borrowed, 1)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.return_loan(borrow)
+
+    def test_checkout_rejected_without_copies(self):
+        Book.objects.filter(pk=self.book.pk).update(available_copies=0)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout(self.book, self.member)
+        self.refresh()
+        self.assertEqual(self.member.current_borrowed, 0)
+        self.assertFalse(Borrow.objects.exists())
+
+    def test_checkout_rejected_over_member_limit_rolls_back_copy(self):
+        Member.objects.filter(pk=self.member.pk).update(current_borrowed=2)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout(self.book, self.member)
+        self.refresh()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_create_view_reports_limit(self):
+        Member.objects.filter(pk=self.member.pk).update(current_borrowed=2)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('core:borrowing_create'), {
+            'book': self.book.pk, 'member': self.member.pk, 'employee': self.employee.pk, 'status': 'active',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+
+    def test_update_view_returns_through_service(self):
+        borrow = circulation.checkout(self.book, self.member)
+        self.client.force_login(self.user)
+        self.client.post(reverse('core:borrowing_update', args=[borrow.pk]), {
+            'book': self.book.pk, 'member': self.member.pk, 'employee': self.employee.pk,
+            'due_date': borrow.due_date, 'status': 'returned',
+        })
+        self.refresh()
+        borrow.refresh_from_db()
+        self.assertEqual(borrow.status, 'returned')
+        self.assertEqual(borrow.return_date, date.today())
+        self.assertEqual((self.book.available_copies, self.member.current_borrowed), (2, 0))
+
+
+class CirculationConcurrencyTests(TransactionTestCase):
+    """Parallel desks hammering the same title must never oversell it."""
+
+    COPIES = 5
+    DESKS = 12
+
+    def test_parallel_checkouts_never_oversell(self):
+        book = Book.objects.create(title='كتاب مطلوب', isbn='9780000000099', total_copies=self.COPIES,
+                                   available_copies=self.COPIES)
+        members = [
+            Member.objects.create(user=User.objects.create_user(f'm{i}'), full_name=f'عضو {i}', phone='05')
+            for i in range(self.DESKS)
+        ]
+        start = threading.Barrier(self.DESKS)
+        results = []
+
+        def desk(member):
+            try:
+                start.wait()
+                for _ in range(50):
+                    try:
+                        circulation.checkout(book, member)
+                        results.append('ok')
+                        return
+                    except circulation.CirculationError:
+                        results.append('rejected')
+                        return
+                    except OperationalError:
+                        # Writer contention on SQLite; the desk simply retries
+                        time.sleep(0.01)
+                results.append('gave_up')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=desk, args=(m,)) for m in members]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        book.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.COPIES)
+        self.assertEqual(results.count('rejected'), self.DESKS - self.COPIES)
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(Borrow.objects.filter(book=book).count(), self.COPIES)
+        self.assertEqual(sum(Member.objects.values_list('current_borrowed', flat=True)), self.COPIES)
+
+
+class BulkImportTests(TestCase):
+
+    CSV = (
+        'title,isbn,authors,category,publication_year,total_copies\n'
+        'الأيام,9780000000001,طه حسين,أدب,1929,3\n'
+        'دعاء الكروان,9780000000002,طه حسين،نجيب محفوظ,أدب,,\n'
+        ',9780000000003,مجهول,أدب,,\n'
+        'مكرر,9780000000001,طه حسين,أدب,,\n'
+        'قديم,9789999999999,,تاريخ,,\n'
+    )
+
+    def setUp(self):
+        Book.objects.create(title='قديم', isbn='9789999999999')
+        self.history = Category.objects.create(name='تاريخ')
+
+    def run_import(self, data, **kwargs):
+        return importers.import_books(BytesIO(data.encode()), 'csv', **kwargs)
+
+    def test_csv_import_creates_books_authors_and_categories(self):
+        report = self.run_import(self.CSV)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([line for line, _ in report.rejected], [4, 5, 6])
+        book = Book.objects.get(isbn='9780000000002')
+        self.assertEqual(sorted(a.name for a in book.authors.all()), ['طه حسين', 'نجيب محفوظ'])
+        self.assertEqual(Author.objects.filter(name='طه حسين').count(), 1)
+        self.assertEqual(Book.objects.get(isbn='9780000000001').available_copies, 3)
+        self.assertEqual(search.search_books('الكروان'), [book])
+
+    def test_out_of_range_numbers_reject_only_their_line(self):
+        report = self.run_import(
+            'title,isbn,authors,category,publication_year,total_copies\n'
+            'أ,9780000000021,,,,inf\n'
+            'ب,9780000000022,,,1e400,\n'
+            'ج,9780000000023,,,,1e300\n'
+            'د,9780000000024,,,,2\n'
+        )
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line for line, _ in report.rejected], [2, 3, 4])
+
+    def test_query_count_does_not_grow_with_chunk_size(self):
+        rows = ''.join(f'كتاب {i},97811{i:08d},مؤلف {i % 7},فئة {i % 3},,\n' for i in range(200))
+        header = 'title,isbn,authors,category,publication_year,total_copies\n'
+        with CaptureQueriesContext(connection) as ctx:
+            report = self.run_import(header + rows, chunk_size=200)
+        self.assertEqual(report.created, 200)
+        self.assertLess(len(ctx.captured_queries), 20)
+
+    def test_chunk_size_is_clamped_to_the_parameter_limit(self):
+        rows = 'title,isbn\n' + ''.join(f'كتاب {i},97812{i:08d}\n' for i in range(20))
+        with mock.patch.object(importers, 'MAX_CHUNK_SIZE', 8):
+            report = self.run_import(rows, chunk_size=10 ** 9)
+        self.assertEqual([chunk.rows for chunk in report.chunks], [8, 8, 4])
+        self.assertEqual(report.created, 20)
+
+    def test_xlsx_import(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['title', 'isbn', 'authors', 'category'])
+        sheet.append(['اللص والكلاب', 9780000000010, 'نجيب محفوظ', 'أدب'])
+        stream = BytesIO()
+        workbook.save(stream)
+        stream.seek(0)
+        report = importers.import_books(stream, 'xlsx')
+        self.assertEqual(report.created, 1)
+        self.assertTrue(Book.objects.filter(isbn='9780000000010').exists())
+
+    def test_admin_bulk_import_view(self):
+        admin_user = User.objects.create_superuser('admin', password='pass')
+        self.client.force_login(admin_user)
+        changelist = self.client.get(reverse('admin:core_book_changelist'))
+        self.assertContains(changelist, reverse('admin:core_book_bulk_import'))
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode(), content_type='text/csv')
+        response = self.client.post(reverse('admin:core_book_bulk_import'), {'file': upload, 'chunk_size': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report'].created, 2)
+
+
+class NameResolverTests(TestCase):
+
+    def test_resolve_reuses_normalized_matches_in_two_queries(self):
+        existing = Author.objects.create(name='أحمد شوقي')
+        with self.assertNumQueries(2):
+            authors = Author.objects.resolve(['احمد شوقي', 'نجيب  محفوظ', 'نجيب محفوظ'])
+        self.assertEqual(authors[0], existing)
+        self.assertEqual(authors[1], authors[2])
+        self.assertEqual(authors[1].name, 'نجيب محفوظ')
+        self.assertEqual(Author.objects.count(), 2)
+
+    def test_name_key_is_unique(self):
+        Category.objects.create(name='أدب')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Category.objects.create(name='ادب')
+
+    def test_blank_names_follow_the_migration_rule(self):
+        with self.assertRaises(ValidationError):
+            Author.objects.create(name='  ')
+        # Rows the migration keyed by pk stay savable and never collide
+        legacy = [Category.objects.create(name=f'قديم {i}') for i in range(2)]
+        for category in legacy:
+            Category.objects.filter(pk=category.pk).update(name='', name_key=f'#{category.pk}')
+            category.refresh_from_db()
+            category.save()
+        self.assertEqual(sorted(Category.objects.values_list('name_key', flat=True)),
+                         sorted(f'#{category.pk}' for category in legacy))
+
+    def test_book_form_reuses_existing_names(self):
+        category = Category.objects.create(name='رواية')
+        author = Author.objects.create(name='طه حسين')
+        form = BookForm(data={
+            'title': 'الأيام', 'isbn': '977-416-001-0', 'total_copies': 1, 'available_copies': 1,
+            'status': 'available', 'author_names': 'طه  حسين، توفيق الحكيم', 'category_name': 'روايه',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        book = form.save()
+        self.assertEqual(book.category, category)
+        self.assertIn(author, book.authors.all())
+        self.assertEqual(Author.objects.count(), 2)
+
+
+class NameKeyMigrationTests(TransactionTestCase):
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('core', target)])
+        return executor.loader.project_state([('core', target)]).apps
+
+    def tearDown(self):
+        # Leave the schema at the latest migration for the tests that follow
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        apps = self.migrate('0004_dashboardcounter')
+        OldAuthor = apps.get_model('core', 'Author')
+        OldCategory = apps.get_model('core', 'Category')
+        OldBook = apps.get_model('core', 'Book')
+        first, second = OldAuthor.objects.create(name='أحمد شوقي'), OldAuthor.objects.create(name='احمد  شوقي')
+        cat_a, cat_b = OldCategory.objects.create(name='شعر'), OldCategory.objects.create(name='شعر ')
+        book = OldBook.objects.create(title='الشوقيات', isbn='9780000000001', category=cat_b)
+        book.authors.set([first, second])
+
+        apps = self.migrate('0005_author_category_name_key')
+
+        self.assertEqual(list(apps.get_model('core', 'Author').objects.values_list('pk', flat=True)), [first.pk])
+        self.assertEqual(list(apps.get_model('core', 'Category').objects.values_list('pk', flat=True)), [cat_a.pk])
+        book = apps.get_model('core', 'Book').objects.get(pk=book.pk)
+        self.assertEqual(book.category_id, cat_a.pk)
+        self.assertEqual(list(book.authors.values_list('pk', flat=True)), [first.pk])
+
+
+class OverdueSweepTests(TestCase):
+
+    TODAY = date(2026, 3, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='كتاب', isbn='9780000000001', total_copies=10, available_copies=10)
+        cls.regular = Member.objects.create(user=User.objects.create_user('r'), full_name='عادي', phone='05')
+        cls.gold = Member.objects.create(user=User.objects.create_user('g'), full_name='ذهبي', phone='05',
+                                         membership_level='gold')
+        cls.late = Borrow.objects.create(book=book, member=cls.regular, due_date=date(2026, 3, 1))
+        cls.late_gold = Borrow.objects.create(book=book, member=cls.gold, due_date=date(2026, 3, 6))
+        cls.on_time = Borrow.objects.create(book=book, member=cls.regular, due_date=date(2026, 3, 20))
+        cls.returned = Borrow.objects.create(book=book, member=cls.gold, due_date=date(2026, 1, 1),
+                                             status='returned', return_date=date(2026, 1, 1))
+
+    def test_sweep_flips_status_and_prices_fines(self):
+        with self.settings(FINE_RATES_PER_DAY={'regular': '1.50', 'gold': '0.25'}):
+            flipped, fined = circulation.sweep_overdue(self.TODAY, chunk_size=1)
+        self.assertEqual((flipped, fined), (2, 2))
+        self.late.refresh_from_db()
+        self.late_gold.refresh_from_db()
+        self.assertEqual((self.late.status, self.late.fine_amount), ('overdue', Decimal('13.50')))
+        self.assertEqual((self.late_gold.status, self.late_gold.fine_amount), ('overdue', Decimal('1.00')))
+        self.assertEqual(Borrow.objects.get(pk=self.on_time.pk).status, 'active')
+        self.assertEqual(Borrow.objects.get(pk=self.returned.pk).fine_amount, Decimal('0'))
+
+    def test_second_run_only_updates_fines(self):
+        circulation.sweep_overdue(self.TODAY)
+        flipped, fined = circulation.sweep_overdue(self.TODAY + timedelta(days=1))
+        self.assertEqual((flipped, fined), (0, 2))
+        self.late.refresh_from_db()
+        self.assertEqual(self.late.fine_amount, Decimal('10.00'))
+
+    def test_command_reports_chunks_and_keeps_dashboard_in_sync(self):
+        out = StringIO()
+        call_command('sweep_overdue', '--date', self.TODAY.isoformat(), stdout=out)
+        self.assertIn('2 loans marked overdue', out.getvalue())
+        self.assertEqual(DashboardCounter.objects.get(name='total_borrowed').value, 1)
+        self.assertEqual(stats.reconcile(), {})
+
+
+class LoanExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_superuser('manager', password='pass', first_name='سارة')
+        cls.employee = Employee.objects.create(user=cls.manager, role='manager', phone='05')
+        cls.member = Member.objects.create(user=User.objects.create_user('m'), full_name='عضو', phone='05')
+        book = Book.objects.create(title='الأيام', isbn='9780000000001')
+        cls.loans = [
+            Borrow.objects.create(book=book, member=cls.member, employee=cls.employee) for _ in range(3)
+        ]
+        Borrow.objects.filter(pk=cls.loans[0].pk).update(borrow_date=date(2025, 1, 5), status='returned')
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def read_csv(self, response):
+        body = b''.join(response.streaming_content)
+        if response.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return list(csv.reader(body.decode('utf-8-sig').splitlines()))
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.client.get(reverse('core:borrowing_export'), {'date_from': '2026-01-01'})
+        self.assertTrue(response.streaming)
+        rows = self.read_csv(response)
+        self.assertEqual(rows[0], exports.LOAN_HEADER)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [loan.pk for loan in self.loans[1:]])
+        self.assertEqual(rows[1][4], 'سارة')
+
+    def test_loan_without_employee(self):
+        Borrow.objects.filter(pk=self.loans[1].pk).update(employee=None)
+        rows = {row[0]: row for row in exports.iter_loan_rows(exports.loan_queryset())}
+        self.assertEqual(rows[self.loans[1].pk][4], '')
+        self.assertEqual(rows[self.loans[2].pk][4], 'سارة')
+
+    def test_status_filter_and_gzip(self):
+        response = self.client.get(reverse('core:borrowing_export'), {'status': 'returned'},
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = self.read_csv(response)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.loans[0].pk])
+
+    def test_xlsx_export(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse('core:borrowing_export'), {'format': 'xlsx', 'member': self.member.pk})
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.max_row, 4)
+
+    def test_export_requires_manager(self):
+        self.client.force_login(self.member.user)
+        response = self.client.get(reverse('core:borrowing_export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command_writes_gzipped_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'loans.csv.gz')
+            call_command('export_loans', '-o', path, '--gzip', '--status', 'active', stderr=StringIO())
+            with gzip.open(path, 'rt', encoding='utf-8-sig') as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 3)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Every hot circulation query must be answered through an index.
+    Fails if SQLite's EXPLAIN QUERY PLAN reports a bare `SCAN [TABLE] <table>`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(user=User.objects.create_user('m'), full_name='عضو', phone='05')
+        book = Book.objects.create(title='كتاب', isbn='9780000000001')
+        Borrow.objects.create(book=book, member=cls.member)
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        self.assertTrue(plan.strip(), f'Empty plan for: {queryset.query}')
+        # SQLite < 3.36 prints `SCAN TABLE <table>`, newer versions `SCAN <table>`
+        full_scans = [line for line in plan.splitlines() if re.search(r'\bSCAN (TABLE )?\w+$', line.strip())]
+        self.assertFalse(full_scans, f'Full table scan in plan:\n{plan}\nfor: {queryset.query}')
+
+    def test_active_loans(self):
+        self.assertIndexed(Borrow.objects.filter(status='active'))
+
+    def test_overdue_scan(self):
+        self.assertIndexed(Borrow.objects.filter(status__in=circulation.OPEN_STATUSES, due_date__lt=date.today()))
+
+    def test_member_open_loans(self):
+        self.assertIndexed(Borrow.objects.filter(member=self.member, status='active'))
+
+    def test_dashboard_latest_loans(self):
+        self.assertIndexed(Borrow.objects.select_related('book', 'member').order_by('-borrow_date')[:5])
+
+    def test_borrowing_list_page(self):
+        self.assertIndexed(
+            Borrow.objects.select_related('book', 'member', 'employee__user')
+            .filter(Q(borrow_date__lt=date.today()) | Q(borrow_date=date.today(), id__lt=100))
+            .order_by('-borrow_date', '-id')[:26]
+        )
+
+    def test_book_availability(self):
+        self.assertIndexed(Book.objects.filter(status='available'))
+
+
+class RequestMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        Book.objects.create(title='كتاب', isbn='9780000000001')
+
+    def scrape(self, **headers):
+        return self.client.get(reverse('core:metrics'), **headers)
+
+    def test_records_latency_queries_and_size_per_view(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('core:book_list'))
+        body = self.scrape().content.decode()
+        self.assertIn('library_request_duration_seconds_bucket{view="core:book_list",le="+Inf"}', body)
+        queries = re.search(r'library_sql_queries_total\{view="core:book_list"\} (\d+)', body)
+        self.assertGreater(int(queries.group(1)), 0)
+        size = re.search(r'library_response_bytes_total\{view="core:book_list"\} (\d+)', body)
+        self.assertGreater(int(size.group(1)), 0)
+
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    def test_finished_threads_are_folded_into_the_totals(self):
+        before = metrics.snapshot()['views'].get('test:threads', [0])[metrics.REQUESTS]
+
+        def handle():
+            metrics.record('test:threads', 0.01, 1, 0.001, 10)
+
+        for _ in range(20):
+            thread = threading.Thread(target=handle)
+            thread.start()
+            thread.join()
+        after = metrics.snapshot()
+        self.assertEqual(after['views']['test:threads'][metrics.REQUESTS] - before, 20)
+        # Only threads still running keep a shard of their own
+        self.assertLessEqual(len(metrics._shards), threading.active_count())
+
+    def test_merges_other_workers_snapshots(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            other = {
+                'views': {'core:home': [2, 0.5, 10, 0.1, 2048, [0] * (len(metrics.LATENCY_BUCKETS) + 1)]},
+                'counters': {'fragment_cache_hits': 3},
+            }
+            with open(os.path.join(tmp, '999999.json'), 'w') as f:
+                json.dump(other, f)
+            with self.settings(METRICS_DIR=tmp):
+                merged = metrics.collect()
+        self.assertGreaterEqual(merged['views']['core:home'][metrics.RESPONSE_BYTES], 2048)
+        self.assertGreaterEqual(merged['counters']['fragment_cache_hits'], 3)
+
+
+class SeedingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seeding.seed(categories=4, authors=10, books=30, members=12, employees=3, borrows=400, seed=7)
+
+    def test_creates_requested_volume(self):
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(Member.objects.count(), 12)
+        self.assertEqual(Borrow.objects.count(), 400)
+        self.assertTrue(Employee.objects.filter(role='manager').exists())
+        self.assertFalse(Book.objects.filter(authors=None).exists())
+
+    def test_stock_and_limits_match_open_loans(self):
+        books = Book.objects.annotate(out=Count('borrow', filter=Q(borrow__status__in=circulation.OPEN_STATUSES)))
+        for book in books:
+            self.assertEqual(book.available_copies, book.total_copies - book.out)
+        members = Member.objects.annotate(held=Count('borrow', filter=Q(borrow__status__in=circulation.OPEN_STATUSES)))
+        for member in members:
+            self.assertEqual(member.current_borrowed, member.held)
+            self.assertLessEqual(member.held, member.max_borrow_limit)
+        self.assertFalse(Borrow.objects.filter(status='returned', return_date__gt=date.today()).exists())
+
+    def test_loans_keep_generated_dates_without_touching_the_field(self):
+        self.assertGreater(Borrow.objects.filter(borrow_date__lt=date.today() - timedelta(days=30)).count(), 100)
+        self.assertTrue(Borrow._meta.get_field('borrow_date').auto_now_add)
+
+    def test_counters_and_search_index_are_in_step(self):
+        self.assertEqual(stats.reconcile(), {})
+        if search.is_supported():
+            title = Book.objects.first().title
+            self.assertIn(Book.objects.first(), search.search_books(title))
+
+    def test_same_seed_same_data(self):
+        first = list(Borrow.objects.order_by('pk').values_list('book__isbn', 'member__user__username', 'status'))
+        Borrow.objects.all().delete()
+        Book.objects.all().delete()
+        Member.objects.all().delete()
+        Employee.objects.all().delete()
+        User.objects.all().delete()
+        Author.objects.all().delete()
+        Category.objects.all().delete()
+        seeding.seed(categories=4, authors=10, books=30, members=12, employees=3, borrows=400, seed=7)
+        again = list(Borrow.objects.order_by('pk').values_list('book__isbn', 'member__user__username', 'status'))
+        self.assertEqual(first, again)
+
+
+class BenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seeding.seed(categories=2, authors=3, books=5, members=3, employees=1, borrows=10)
+        cls.manager = User.objects.get(username='seed0_staff0')
+
+    def test_measures_every_route(self):
+        # signup has no template yet; a 500 must be recorded, not abort the run
+        client = Client(raise_request_exception=False)
+        client.force_login(self.manager)
+        results = benchmarks.run_benchmarks(client, repeat=2)
+        self.assertIn('core:book_detail', results)
+        self.assertIn('core:borrowing_update', results)
+        book_list = results['core:book_list']
+        self.assertEqual(book_list['status'], 200)
+        self.assertGreater(book_list['queries'], 0)
+        self.assertGreater(book_list['peak_kb'], 0)
+        self.assertLessEqual(book_list['p50_ms'], book_list['p99_ms'])
+
+    def test_compare_flags_only_regressions(self):
+        baseline = {'core:home': {'p95_ms': 10.0, 'peak_kb': 100.0, 'queries': 4}}
+        steady = {'core:home': {'p95_ms': 12.0, 'peak_kb': 110.0, 'queries': 4}}
+        self.assertEqual(benchmarks.compare(steady, baseline, threshold=1.25), [])
+        slower = {'core:home': {'p95_ms': 20.0, 'peak_kb': 100.0, 'queries': 5}}
+        regressions = benchmarks.compare(slower, baseline, threshold=1.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(any('queries 4 -> 5' in line for line in regressions))
+
+
+def _cover_upload(name='cover.jpg', size=(600, 900)):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', size, (120, 40, 40)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class CoverThumbnailTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, THUMBNAILS_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user('staff', password='pass')
+
+    def test_renders_webp_and_jpeg_renditions_after_commit(self):
+        from PIL import Image
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            book = Book.objects.create(title='كتاب', isbn='9780000000001', cover_image=_cover_upload())
+        # Nothing is rendered inside the saving request/transaction
+        self.assertIsNone(book.cover_thumbnails)
+        for callback in callbacks:
+            callback()
+
+        book.refresh_from_db()
+        self.assertEqual(book.cover_thumbnail_source, book.cover_image.name)
+        with default_storage.open(thumbnails.thumbnail_name(book.cover_image.name, 'list', 2, 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (80, 120))
+        self.assertTrue(default_storage.exists(thumbnails.thumbnail_name(book.cover_image.name, 'detail', 1, 'jpg')))
+
+        self.client.force_login(self.user)
+        page = self.client.get(reverse('core:book_list')).content.decode()
+        self.assertIn('type="image/webp"', page)
+        self.assertIn('-80x120.webp 2x', page)
+
+    def test_replacing_cover_removes_old_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='كتاب', isbn='9780000000001', cover_image=_cover_upload('a.jpg'))
+        old = thumbnails.thumbnail_name(book.cover_image.name, 'list', 1, 'jpg')
+        self.assertTrue(default_storage.exists(old))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.cover_image = _cover_upload('b.jpg')
+            book.save()
+        self.assertFalse(default_storage.exists(old))
+        book.refresh_from_db()
+        self.assertIsNotNone(book.cover_thumbnails)
+
+    def test_backfill_command_renders_missing_thumbnails(self):
+        book = Book.objects.create(title='كتاب', isbn='9780000000001', cover_image=_cover_upload())
+        Book.objects.create(title='بدون غلاف', isbn='9780000000002')
+        self.assertIsNone(book.cover_thumbnails)
+
+        out = StringIO()
+        call_command('generate_cover_thumbnails', '--workers', '2', stdout=out)
+        self.assertIn('1 covers rendered', out.getvalue())
+        book.refresh_from_db()
+        self.assertIsNotNone(book.cover_thumbnails)
+
+
+class CoverThumbnailWorkerTests(TransactionTestCase):
+
+    def test_worker_thread_renders_off_the_request_path(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, THUMBNAILS_ASYNC=True):
+            book = Book.objects.create(title='كتاب', isbn='9780000000001', cover_image=_cover_upload())
+            self.assertTrue(thumbnails.wait(timeout=10))
+            book.refresh_from_db()
+            self.assertEqual(book.cover_thumbnail_source, book.cover_image.name)
+
+
+class FragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='pass')
+        cls.member = Member.objects.create(user=cls.user, full_name='عضو', phone='0500000000')
+        cls.author = Author.objects.create(name='نجيب محفوظ')
+        cls.books = [Book.objects.create(title=f'كتاب {i}', isbn=f'978000000000{i}') for i in range(3)]
+        for book in cls.books:
+            book.authors.add(cls.author)
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.client.force_login(self.user)
+
+    def render_list(self):
+        before = metrics.snapshot()['counters']
+        page = self.client.get(reverse('core:book_list')).content.decode()
+        after = metrics.snapshot()['counters']
+        hits = after.get('fragment_cache_hits', 0) - before.get('fragment_cache_hits', 0)
+        misses = after.get('fragment_cache_misses', 0) - before.get('fragment_cache_misses', 0)
+        return page, hits, misses
+
+    def test_unchanged_rows_render_from_cache(self):
+        self.assertEqual(self.render_list()[1:], (0, 3))
+        self.assertEqual(self.render_list()[1:], (3, 0))
+
+    def test_author_rename_invalidates_its_rows(self):
+        self.render_list()
+        self.author.name = 'توفيق الحكيم'
+        self.author.save()
+        page, hits, misses = self.render_list()
+        self.assertIn('توفيق الحكيم', page)
+        self.assertEqual(misses, 3)
+
+    def test_checkout_refreshes_status_badge(self):
+        self.render_list()
+        circulation.checkout(self.books[0], self.member, due_date=date(2026, 1, 30))
+        page, hits, misses = self.render_list()
+        self.assertEqual((hits, misses), (2, 1))
+        self.assertIn('مستعار', page)
+
+
+class AuthCacheTests(TestCase):
+
+    BACKEND = 'core.auth.CachedModelBackend'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('librarian', password='pass')
+        cls.employee = Employee.objects.create(user=cls.user, role='librarian', phone='0500000000')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user, backend=self.BACKEND)
+
+    def test_steady_state_page_view_runs_no_auth_or_session_queries(self):
+        self.client.get(reverse('core:book_list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:book_list'))
+        self.assertEqual(response.status_code, 200)
+        tables = ('django_session', 'auth_user', 'employees_employee')
+        self.assertEqual([q['sql'] for q in queries if any(t in q['sql'] for t in tables)], [])
+
+    def test_role_change_is_picked_up(self):
+        url = reverse('core:employee_list')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee.role = 'manager'
+            self.employee.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee.delete()
+        self.assertFalse(self.client.get(reverse('core:home')).context['is_manager'])
+
+    def test_sessions_from_the_old_backend_survive_the_switch(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get(reverse('core:home')).status_code, 200)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.get(reverse('core:home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(reverse('core:home')).status_code, 302)
+
+
+class SQLiteTuningTests(TestCase):
+
+    def test_pragmas_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def connect(self, path, profile):
+        db = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+        for statement in sqlite.pragma_statements(profile['pragmas']):
+            db.execute(statement)
+        self.addCleanup(db.close)
+        return db
+
+    def test_immediate_mode_makes_read_then_write_wait_instead_of_fail(self):
+        # Two desks each read a row then write it; the load benchmark is `manage.py sqlite_contention`
+        read, write = 'SELECT copies FROM stock WHERE id = 0', 'UPDATE stock SET copies = copies + 1 WHERE id = 0'
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'contention.sqlite3')
+            sqlite._prepare(path, rows=1)
+
+            # Django's default DEFERRED: the second desk's read snapshot is stale once the first commits
+            stock = {**sqlite.STOCK_PROFILE, 'pragmas': {'journal_mode': 'WAL'}}
+            first, second = self.connect(path, stock), self.connect(path, stock)
+            for db in (first, second):
+                db.execute(stock['begin'])
+                db.execute(read).fetchone()
+            first.execute(write)
+            first.execute('COMMIT')
+            with self.assertRaises(sqlite3.OperationalError):
+                second.execute(write)
+            second.execute('ROLLBACK')
+
+            # IMMEDIATE: the second desk waits at BEGIN, then reads the committed row
+            tuned = sqlite.tuned_profile()
+            self.assertEqual(tuned['begin'], 'BEGIN IMMEDIATE')
+            first, second = self.connect(path, tuned), self.connect(path, tuned)
+            first.execute(tuned['begin'])
+            first.execute(read).fetchone()
+            seen = []
+
+            def second_desk():
+                second.execute(tuned['begin'])
+                seen.append(second.execute(read).fetchone()[0])
+                second.execute(write)
+                second.execute('COMMIT')
+
+            desk = threading.Thread(target=second_desk)
+            desk.start()
+            first.execute(write)
+            first.execute('COMMIT')
+            desk.join()
+            self.assertEqual(seen, [7])
+            self.assertEqual(first.execute(read).fetchone()[0], 8)
+
+
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('manager', password='pass')
+        Employee.objects.create(user=cls.user, role='manager', phone='0500000000')
+        cls.member = Member.objects.create(user=cls.user, full_name='عضو', phone='0500000000')
+        author = Author.objects.create(name='طه حسين')
+        cls.books = [Book.objects.create(title=f'الأيام {i}', isbn=f'978000000000{i}') for i in range(3)]
+        cls.books[0].authors.add(author)
+        cls.borrow = circulation.checkout(cls.books[0], cls.member, due_date=date(2026, 1, 30))
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, path):
+        request = AsyncRequestFactory().get(path)
+        request.user = self.user
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        return request
+
+    async def test_home_renders_without_sync_queries(self):
+        # A template touching the DB would raise SynchronousOnlyOperation here
+        response = await async_views.home(self.request('/dashboard/'))
+        page = response.content.decode()
+        self.assertIn('الأيام 2', page)
+        self.assertIn('عضو', page)
+
+    async def test_list_views_paginate(self):
+        response = await async_views.book_list(self.request('/books/?per_page=2'))
+        page = response.content.decode()
+        self.assertIn('الأيام 0', page)
+        self.assertNotIn('الأيام 2', page)
+        self.assertIn('after=', page)
+        response = await async_views.borrowing_list(self.request('/borrowing/'))
+        self.assertIn('الأيام 0', response.content.decode())
+
+    async def test_detail_views(self):
+        response = await async_views.book_detail(self.request('/'), pk=self.books[0].pk)
+        self.assertIn('طه حسين', response.content.decode())
+        response = await async_views.member_detail(self.request('/'), pk=self.member.pk)
+        self.assertIn('عضو', response.content.decode())
+        response = await async_views.borrowing_detail(self.request('/'), pk=self.borrow.pk)
+        self.assertIn('الأيام 0', response.content.decode())
+
+    async def test_missing_object_is_404(self):
+        from django.http import Http404
+
+        with self.assertRaises(Http404):
+            await async_views.book_detail(self.request('/'), pk=999999)
+
+
+class CatalogApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('kiosk', password='pass')
+        cls.category = Category.objects.create(name='رواية')
+        cls.author = Author.objects.create(name='نجيب محفوظ')
+        cls.books = [
+            Book.objects.create(title=f'كتاب {i}', isbn=f'978000000000{i}', category=cls.category)
+            for i in range(5)
+        ]
+        cls.books[0].authors.add(cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(name, args=args), params)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.get('core:api_book_list').status_code, 401)
+
+    def test_book_list_paginates_with_sparse_fields(self):
+        data = self.get('core:api_book_list', per_page=2, fields='id,title').json()
+        self.assertEqual(data['results'], [
+            {'id': self.books[0].pk, 'title': 'كتاب 0'}, {'id': self.books[1].pk, 'title': 'كتاب 1'},
+        ])
+        self.assertIsNone(data['previous'])
+        second = self.client.get(data['next']).json()
+        self.assertEqual([b['id'] for b in second['results']], [self.books[2].pk, self.books[3].pk])
+        self.assertEqual(self.get('core:api_book_list', fields='nope').status_code, 400)
+
+    def test_detail_returns_304_until_the_book_changes(self):
+        book = self.books[0]
+        first = self.get('core:api_book_detail', book.pk)
+        self.assertEqual(first.json()['authors'], [{'id': self.author.pk, 'name': 'نجيب محفوظ'}])
+        etag = first['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(reverse('core:api_book_detail', args=[book.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        # Just the last_updated lookup: nothing is fetched or serialized
+        self.assertEqual(len([q for q in queries if 'books_' in q['sql']]), 1)
+
+        circulation.checkout(book, Member.objects.create(user=self.user, full_name='عضو', phone='05'))
+        changed = self.client.get(reverse('core:api_book_availability', args=[book.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json(), {'id': book.pk, 'status': 'borrowed', 'available_copies': 0, 'total_copies': 1})
+
+    def test_list_etag_changes_on_delete(self):
+        etag = self.get('core:api_book_list')['ETag']
+        self.assertEqual(self.client.get(reverse('core:api_book_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.books[4].delete()
+        self.assertEqual(self.client.get(reverse('core:api_book_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_304_costs_one_page_query_and_follows_author_renames(self):
+        first = self.get('core:api_book_list', per_page=2)
+        self.assertIn('Last-Modified', first)
+        etag = first['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(reverse('core:api_book_list'), {'per_page': 2},
+                                     HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(cached.status_code, 304)
+        [query] = [q['sql'] for q in queries if 'books_' in q['sql']]
+        self.assertNotIn('MAX(', query)
+        self.assertIn('LIMIT 3', query)
+
+        self.author.name = 'محفوظ'
+        self.author.save()
+        self.assertEqual(
+            self.client.get(reverse('core:api_book_list'), {'per_page': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200,
+        )
+
+    def test_bulk_lookup_by_ids_and_isbns(self):
+        body = {'ids': [self.books[0].pk, 999999], 'isbns': [self.books[3].isbn, '9789999999999']}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('core:api_book_lookup') + '?fields=id,isbn,authors', json.dumps(body),
+                content_type='application/json',
+            )
+        data = response.json()
+        self.assertEqual([b['id'] for b in data['results']], [self.books[0].pk, self.books[3].pk])
+        self.assertEqual(data['missing'], {'ids': [999999], 'isbns': ['9789999999999']})
+        self.assertLessEqual(len([q for q in queries if 'books_' in q['sql']]), 2)
+
+        with self.settings(API_LOOKUP_LIMIT=2):
+            self.assertEqual(self.get('core:api_book_lookup', ids='1,2,3').status_code, 400)
+
+    def test_authors_and_categories(self):
+        response = self.get('core:api_author_list')
+        self.assertEqual(response.json()['results'], [{'id': self.author.pk, 'name': 'نجيب محفوظ'}])
+        again = self.client.get(reverse('core:api_author_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.get('core:api_category_list').json()['results'][0]['name'], 'رواية')
+
+
+class ReservationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='كتاب', isbn='9780000000001', total_copies=1, available_copies=1)
+        cls.lender, cls.gold, cls.silver, cls.regular = (
+            Member.objects.create(
+                user=User.objects.create_user(f'member{i}'), full_name=f'عضو {i}', phone='0',
+                membership_level=level, max_borrow_limit=2,
+            )
+            for i, level in enumerate(('regular', 'gold', 'silver', 'regular'))
+        )
+
+    def setUp(self):
+        self.loan = circulation.checkout(self.book, self.lender)
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_queue_orders_by_priority_then_request_time(self):
+        regular = circulation.place_hold(self.book, self.regular)
+        silver = circulation.place_hold(self.book, self.silver)
+        gold = circulation.place_hold(self.book, self.gold)
+        self.assertEqual(list(circulation.hold_queue(self.book.pk)), [gold, silver, regular])
+        with self.assertRaises(circulation.CirculationError):
+            circulation.place_hold(self.book, self.gold)
+
+    def test_hold_rejected_while_copies_on_shelf(self):
+        circulation.return_loan(self.loan)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.place_hold(self.book, self.gold)
+
+    def test_return_sets_copy_aside_for_next_eligible_member(self):
+        regular = circulation.place_hold(self.book, self.regular)
+        gold = circulation.place_hold(self.book, self.gold)
+        Member.objects.filter(pk=self.gold.pk).update(current_borrowed=2)  # at the limit: skipped
+
+        circulation.return_loan(self.loan)
+        self.refresh(self.book, regular, gold)
+        self.assertEqual((self.book.available_copies, self.book.status), (0, 'reserved'))
+        self.assertEqual((regular.status, gold.status), ('ready', 'waiting'))
+        self.assertGreater(regular.expires_at, regular.ready_at)
+
+        # Nobody else can take the copy; the member it was set aside for collects it
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout(self.book, self.silver)
+        circulation.checkout(self.book, self.regular)
+        self.refresh(self.book, regular, self.regular)
+        self.assertEqual((self.book.available_copies, self.book.status), (0, 'borrowed'))
+        self.assertEqual((regular.status, self.regular.current_borrowed), ('fulfilled', 1))
+
+    def test_return_without_queue_puts_copy_back(self):
+        circulation.return_loan(self.loan)
+        self.refresh(self.book)
+        self.assertEqual((self.book.available_copies, self.book.status), (1, 'available'))
+
+    def test_expired_hold_passes_to_next_member_then_shelf(self):
+        first = circulation.place_hold(self.book, self.gold)
+        second = circulation.place_hold(self.book, self.silver)
+        circulation.return_loan(self.loan)
+
+        later = timezone.now() + timedelta(days=settings.HOLD_PICKUP_DAYS, hours=1)
+        self.assertEqual(circulation.expire_holds(later), 1)
+        self.refresh(first, second)
+        self.assertEqual((first.status, second.status), ('expired', 'ready'))
+
+        circulation.cancel_hold(second)
+        self.refresh(self.book)
+        self.assertEqual((self.book.available_copies, self.book.status), (1, 'available'))
+        self.assertEqual(circulation.expire_holds(later), 0)
+
+    def test_allocation_is_one_indexed_seek(self):
+        members = Member.objects.bulk_create([
+            Member(user=User.objects.create_user(f'queued{i}'), full_name=f'q{i}', phone='0') for i in range(30)
+        ])
+        Reservation.objects.bulk_create([Reservation(book=self.book, member=m) for m in members])
+        with CaptureQueriesContext(connection) as queries:
+            circulation.next_in_line(self.book.pk)
+        self.assertEqual(len(queries), 1)
+        plan = circulation.hold_queue(self.book.pk).values_list('pk', flat=True)[:1].explain()
+        self.assertIn('reservation_queue_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_reservation_pages(self):
+        self.client.force_login(User.objects.create_user('desk'))
+        response = self.client.post(reverse('core:reservation_create'), {'book': self.book.pk, 'member': self.gold.pk})
+        self.assertRedirects(response, reverse('core:reservation_list'))
+        hold = Reservation.objects.get()
+        self.assertContains(self.client.get(reverse('core:reservation_list'), {'status': 'waiting'}), 'عضو 1')
+        self.client.post(reverse('core:reservation_cancel', args=[hold.pk]))
+        self.refresh(hold)
+        self.assertEqual(hold.status, 'cancelled')
+
+
+class CirculationDeskTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(title=f'كتاب {i}', isbn=f'97800000000{i:02d}', total_copies=2, available_copies=2)
+            for i in range(12)
+        ]
+        cls.member, cls.other = (
+            Member.objects.create(user=User.objects.create_user(f'reader{i}'), full_name=f'قارئ {i}', phone='0',
+                                  max_borrow_limit=12)
+            for i in range(2)
+        )
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_basket_is_one_transaction_with_constant_queries(self):
+        def checkout(books, member):
+            with CaptureQueriesContext(connection) as queries:
+                loans = circulation.checkout_many(books, member)
+            return loans, len(queries)
+
+        _, small = checkout(self.books[:2], self.other)
+        loans, large = checkout(self.books[2:11] + [self.books[2]], self.member)  # one book scanned twice
+        self.assertEqual(small, large)
+        self.assertEqual(len(loans), 10)
+        self.assertEqual(Borrow.objects.filter(member=self.member, status='active').count(), 10)
+        self.refresh(self.member, self.books[2], self.books[3])
+        self.assertEqual(self.member.current_borrowed, 10)
+        self.assertEqual((self.books[2].available_copies, self.books[2].status), (0, 'borrowed'))
+        self.assertEqual((self.books[3].available_copies, self.books[3].status), (1, 'available'))
+        self.assertEqual(DashboardCounter.objects.get(name='total_borrowed').value, 12)
+
+    def test_failed_basket_changes_nothing(self):
+        Book.objects.filter(pk=self.books[1].pk).update(available_copies=0, status='borrowed')
+        with self.assertRaises(circulation.CirculationError) as raised:
+            circulation.checkout_many(self.books[:3], self.member)
+        self.assertIn('كتاب 1', raised.exception.messages[0])
+
+        Member.objects.filter(pk=self.member.pk).update(max_borrow_limit=2)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout_many([self.books[0], self.books[2], self.books[3]], self.member)
+        self.assertFalse(Borrow.objects.exists())
+        self.refresh(self.books[0], self.member)
+        self.assertEqual((self.books[0].available_copies, self.member.current_borrowed), (2, 0))
+
+    def test_batch_return_frees_slots_and_serves_holds(self):
+        book = self.books[0]
+        circulation.checkout_many([book, book], self.other)
+        mine = circulation.checkout_many(self.books[1:4], self.member)
+        hold = circulation.place_hold(book, self.member)
+
+        # Two members' loans in one batch; the held book's first copy goes to the hold
+        loans = circulation.open_loans_for([book, book, *self.books[1:4]])
+        self.assertEqual(circulation.return_many(loans), 5)
+        self.refresh(book, hold, self.member, self.other, self.books[1])
+        self.assertEqual((hold.status, book.available_copies, book.status), ('ready', 1, 'available'))
+        self.assertEqual((self.member.current_borrowed, self.other.current_borrowed), (0, 0))
+        self.assertEqual(self.books[1].available_copies, 2)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.return_many(mine)
+
+    def test_return_needs_member_when_book_is_lent_twice(self):
+        circulation.checkout_many([self.books[0]], self.member)
+        circulation.checkout_many([self.books[0]], self.other)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.open_loans_for([self.books[0]])
+        [loan] = circulation.open_loans_for([self.books[0]], member=self.other)
+        self.assertEqual(loan.member_id, self.other.pk)
+
+    def test_desk_pages(self):
+        self.client.force_login(User.objects.create_user('desk'))
+        self.assertEqual(self.client.get(reverse('core:circulation_desk')).status_code, 200)
+
+        codes = '\n'.join(book.isbn for book in self.books[:3]) + '\n978-0000000003\n'
+        response = self.client.post(reverse('core:desk_checkout'), {'out-member': self.member.pk, 'out-codes': codes})
+        self.assertContains(response, 'تمت إعارة 4 كتب')
+        self.assertEqual(Borrow.objects.filter(member=self.member).count(), 4)
+
+        response = self.client.post(reverse('core:desk_checkout'), {'out-member': self.member.pk, 'out-codes': '123'})
+        self.assertContains(response, 'رموز غير معروفة: 123')
+
+        response = self.client.post(reverse('core:desk_return'), {'in-codes': codes})
+        self.assertContains(response, 'تم إرجاع 4 كتب')
+        self.assertFalse(Borrow.objects.filter(status='active').exists())
+
+    def test_desk_finds_legacy_codes_with_hyphens(self):
+        legacy = Book.objects.create(title='قديم', isbn='LIB-0042')
+        form = DeskCheckoutForm({'out-member': self.member.pk, 'out-codes': 'LIB-0042\nLIB0042x'}, prefix='out')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['codes'], ['رموز غير معروفة: LIB0042x'])
+        form = DeskCheckoutForm({'out-member': self.member.pk, 'out-codes': f'LIB-0042 {self.books[0].isbn}'},
+                                prefix='out')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['codes'], [legacy, self.books[0]])
+
+
+class CounterReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(
+            user=User.objects.create_user('reader'), full_name='قارئ', phone='0', max_borrow_limit=4,
+        )
+        cls.idle = Member.objects.create(user=User.objects.create_user('idle'), full_name='خامل', phone='0')
+        cls.book = Book.objects.create(title='كتاب', isbn='9780000000001', total_copies=3, available_copies=3)
+        cls.other = Book.objects.create(title='آخر', isbn='9780000000002', total_copies=1, available_copies=1)
+
+    def setUp(self):
+        circulation.checkout(self.book, self.member)
+        circulation.checkout(self.other, self.member)
+        Borrow.objects.create(book=self.book, member=self.member, status='returned')
+
+    def test_reconcile_reports_and_repairs_drift(self):
+        self.assertEqual(circulation.reconcile_counters(), {'members': [], 'books': []})
+
+        # Hand edits through the forms, or raw SQL, leave the counters out of step
+        Member.objects.filter(pk=self.member.pk).update(current_borrowed=0)
+        Member.objects.filter(pk=self.idle.pk).update(current_borrowed=2)
+        Book.objects.filter(pk=self.other.pk).update(available_copies=1, status='available')
+        with CaptureQueriesContext(connection) as queries:
+            drift = circulation.reconcile_counters()
+        self.assertEqual(drift, {
+            'members': [(self.member.pk, 0, 2), (self.idle.pk, 2, 0)],
+            'books': [(self.other.pk, 1, 0)],
+        })
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 2)
+
+        self.member.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.member.current_borrowed, 2)
+        self.assertEqual((self.other.available_copies, self.other.status), (0, 'borrowed'))
+        self.assertEqual(circulation.reconcile_counters(), {'members': [], 'books': []})
+
+    def test_reconcile_command(self):
+        Book.objects.filter(pk=self.book.pk).update(available_copies=3)
+        out = StringIO()
+        call_command('reconcile_circulation_counters', stdout=out)
+        self.assertIn(f'book {self.book.pk}: 3 -> 2', out.getvalue())
+
+    def test_member_pages_show_live_counts(self):
+        Member.objects.filter(pk=self.member.pk).update(current_borrowed=0)
+        member = circulation.with_borrow_stats(Member.objects.all()).get(pk=self.member.pk)
+        self.assertEqual((member.borrowed_count, member.borrow_percentage), (2, 50))
+
+        self.client.force_login(User.objects.create_user('desk'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:member_list'))
+        self.assertContains(response, '2 / 4')
+        self.assertContains(response, 'width: 50%')
+        self.assertEqual(len([q for q in queries if 'members_member' in q['sql']]), 1)
+        self.assertContains(self.client.get(reverse('core:member_detail', args=[self.member.pk])), '2 من')
+
+
+class CirculationReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='رواية')
+        cls.book = Book.objects.create(title='كتاب', isbn='9780000000001', total_copies=5, available_copies=5,
+                                       category=cls.category)
+        cls.student = Member.objects.create(user=User.objects.create_user('student'), full_name='طالب', phone='0')
+        cls.staff = Member.objects.create(user=User.objects.create_user('teacher'), full_name='أستاذ', phone='0',
+                                          membership_type='staff')
+
+    def loan(self, member, borrowed, due, returned=None, fine=0):
+        borrow = Borrow.objects.create(book=self.book, member=member, due_date=due, return_date=returned,
+                                       fine_amount=fine, status='returned' if returned else 'active')
+        Borrow.objects.filter(pk=borrow.pk).update(borrow_date=borrowed)
+        return borrow
+
+    def test_build_is_incremental_and_idempotent(self):
+        self.loan(self.student, date(2024, 1, 1), date(2024, 1, 10), date(2024, 1, 12), fine=4)
+        self.loan(self.staff, date(2024, 1, 1), date(2024, 1, 15), date(2024, 1, 5))
+        reports.build_rollups(until=date(2024, 1, 31))
+
+        rows = {(r.day, r.membership_type): r for r in DailyCirculation.objects.all()}
+        self.assertEqual(rows[date(2024, 1, 1), 'student'].loans, 1)
+        self.assertEqual(rows[date(2024, 1, 1), 'staff'].loans, 1)
+        self.assertEqual(rows[date(2024, 1, 5), 'staff'].returns, 1)
+        self.assertEqual(rows[date(2024, 1, 11), 'student'].overdue, 1)
+        returned = rows[date(2024, 1, 12), 'student']
+        self.assertEqual((returned.returns, returned.fines, returned.category_id), (1, Decimal('4'), self.category.pk))
+
+        # The next run starts from the last rolled-up day and only adds what is new
+        self.loan(self.student, date(2024, 2, 3), date(2024, 2, 17))
+        reports.build_rollups(until=date(2024, 2, 29))
+        reports.build_rollups(until=date(2024, 2, 29))
+        totals = reports.summary(date(2024, 1, 1), date(2024, 2, 29))
+        self.assertEqual(totals, {'loans': 3, 'returns': 2, 'overdue': 2, 'fines': Decimal('4')})
+        self.assertEqual(reports.rolled_up_through(), date(2024, 2, 18))
+
+    def test_reports_read_only_rollups(self):
+        self.loan(self.student, date(2024, 3, 1), date(2024, 3, 15))
+        call_command('build_circulation_rollups', until='2024-03-31', stdout=StringIO())
+        self.assertEqual(reports.top_books(date(2024, 3, 1), date(2024, 3, 31))[0]['loans'], 1)
+        self.assertEqual([m['month'] for m in reports.monthly_trend(date(2024, 1, 1), date(2024, 12, 31))],
+                         [date(2024, 3, 1)])
+
+        self.client.force_login(User.objects.create_superuser('boss'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:circulation_report'),
+                                       {'date_from': '2024-01', 'date_to': '2024-12'})
+        self.assertContains(response, 'كتاب')
+        self.assertFalse([q for q in queries if 'borrowing_borrow' in q['sql']])
+        self.assertEqual(self.client.get(reverse('core:circulation_report')).status_code, 200)
+
+
+class RecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(title=f'كتاب {i}', isbn=f'978000000000{i}', total_copies=10, available_copies=10)
+            for i in range(4)
+        ]
+        cls.members = [
+            Member.objects.create(user=User.objects.create_user(f'reader{i}'), full_name=f'قارئ {i}', phone='0')
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        state = tempfile.TemporaryDirectory()
+        self.addCleanup(state.cleanup)
+        overrides = override_settings(
+            RECOMMENDATIONS_MATRIX=os.path.join(state.name, 'matrix.npz'), RECOMMENDATIONS_MIN_SUPPORT=1,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def lend(self, member, *books):
+        for book in books:
+            Borrow.objects.create(book=self.books[book], member=self.members[member])
+
+    def neighbors(self, book):
+        return [(n.neighbor_id, round(n.score, 2)) for n in recommendations.also_borrowed(self.books[book].pk)]
+
+    def test_incremental_update_matches_full_rebuild(self):
+        import numpy as np
+
+        rng = np.random.default_rng(1)
+        members, books = rng.integers(0, 50, 400), rng.integers(0, 80, 400)
+        full = recommendations.cooccurrence(recommendations.borrow_matrix(members, books, (50, 80)))
+        head = recommendations.cooccurrence(recommendations.borrow_matrix(members[:300], books[:300], (50, 80)))
+        touched = np.isin(members[:300], members[300:])
+        updated, rows = recommendations.add_loans(
+            head, members[:300][touched], books[:300][touched], members[300:], books[300:],
+        )
+        self.assertEqual((updated != full).nnz, 0)
+        self.assertTrue(set(books[300:]) <= set(rows))
+
+        ranked = recommendations.top_neighbors(full, 3)
+        self.assertTrue(all(np.bincount(ranked[0]) <= 3))
+        self.assertFalse((ranked[0] == ranked[1]).any())
+
+    def test_build_then_fold_in_new_loans(self):
+        b0, b1, b2, _ = (book.pk for book in self.books)
+        self.lend(0, 0, 1)
+        self.lend(1, 0, 1, 2)
+        self.assertEqual(recommendations.build(), {'loans': 5, 'books': b2 + 1})
+        self.assertEqual(self.neighbors(0), [(b1, 1.0), (b2, 0.5)])
+
+        self.lend(2, 0, 2)
+        self.lend(2, 0)  # a repeat loan counts once
+        result = recommendations.build()
+        self.assertEqual(result['loans'], 3)
+        self.assertEqual(self.neighbors(0), [(b1, 0.67), (b2, 0.67)])
+        self.assertEqual(self.neighbors(2), [(b0, 1.0), (b1, 0.5)])
+        self.assertEqual(recommendations.build(), {'loans': 0, 'books': 0})
+
+    def test_pages_read_the_neighbour_table(self):
+        self.lend(0, 0, 1)
+        self.lend(1, 0, 2)
+        self.lend(2, 1)
+        call_command('build_recommendations', stdout=StringIO())
+
+        self.client.force_login(User.objects.create_user('desk'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:book_detail', args=[self.books[0].pk]))
+        self.assertContains(response, 'كتاب 1')
+        self.assertEqual(len([q for q in queries if 'recommendations_bookneighbor' in q['sql']]), 1)
+
+        # Member 2 borrowed book 1, whose neighbour is book 0
+        suggestions = list(recommendations.suggested_for(self.members[2].pk))
+        self.assertEqual([s['neighbor_id'] for s in suggestions], [self.books[0].pk])
+        self.assertContains(self.client.get(reverse('core:member_detail', args=[self.members[2].pk])), 'كتاب 0')
+
+
+class LoanArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_superuser('manager', password='pass')
+        cls.book = Book.objects.create(title='الأيام', isbn='9780000000001', total_copies=5, available_copies=5)
+        cls.member = Member.objects.create(user=User.objects.create_user('reader'), full_name='قارئ', phone='0')
+
+    def loan(self, borrowed, returned=None):
+        borrow = Borrow.objects.create(book=self.book, member=self.member, due_date=borrowed + timedelta(days=14),
+                                       return_date=returned, status='returned' if returned else 'active')
+        Borrow.objects.filter(pk=borrow.pk).update(borrow_date=borrowed)
+        return borrow
+
+    def setUp(self):
+        self.old = [self.loan(date(2023, 3, day), date(2023, 3, day + 5)) for day in range(1, 6)]
+        self.late_open = self.loan(date(2023, 6, 1))  # still out: never archived
+        self.recent = self.loan(date(2025, 2, 1), date(2025, 2, 3))
+
+    def test_moves_returned_loans_in_chunks_and_keeps_ids(self):
+        chunks = []
+        moved = archive.archive_loans(date(2024, 1, 1), chunk_size=2, on_chunk=lambda *chunk: chunks.append(chunk))
+        self.assertEqual(moved, 5)
+        self.assertEqual([count for _, _, count in chunks], [2, 2, 1])
+        self.assertEqual(sorted(ArchivedBorrow.objects.values_list('id', flat=True)), [b.pk for b in self.old])
+        self.assertEqual(set(Borrow.objects.values_list('id', flat=True)), {self.late_open.pk, self.recent.pk})
+        archived = ArchivedBorrow.objects.get(pk=self.old[0].pk)
+        self.assertEqual((archived.borrow_date, archived.return_date), (date(2023, 3, 1), date(2023, 3, 6)))
+        self.assertEqual(archive.archived_through(), date(2023, 3, 10))
+
+        out = StringIO()
+        call_command('archive_loans', '--before', '2024-01-01', stdout=out)
+        self.assertIn('0 loans', out.getvalue())
+        self.assertEqual(archive.default_cutoff(date(2026, 5, 1)), date(2025, 1, 1))
+
+    def test_history_is_read_only_when_asked_for(self):
+        archive.archive_loans(date(2024, 1, 1))
+        self.client.force_login(self.manager)
+
+        url = reverse('core:member_loans', args=[self.member.pk])
+        live = self.client.get(url)
+        self.assertEqual([b.pk for b in live.context['loans']], [self.recent.pk, self.late_open.pk])
+
+        # Walk the merged history two rows at a time, newest first
+        seen, params = [], {'history': '1', 'per_page': 2}
+        while True:
+            page = self.client.get(url, params).context['page']
+            seen += [b.pk for b in page]
+            if not page.has_next:
+                break
+            params['after'] = page.next_cursor
+        self.assertEqual(seen, [self.recent.pk, self.late_open.pk] + [b.pk for b in reversed(self.old)])
+
+        export = reverse('core:borrowing_export')
+        rows = b''.join(self.client.get(export, {'member': self.member.pk}).streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(rows.splitlines()), 3)
+        rows = b''.join(self.client.get(export, {'member': self.member.pk, 'history': 'on'}).streaming_content)
+        ids = [int(line.split(',')[0]) for line in rows.decode('utf-8-sig').splitlines()[1:]]
+        self.assertEqual(ids, sorted(b.pk for b in [*self.old, self.late_open, self.recent]))
+
+    def test_rollups_and_recommendations_still_count_archived_loans(self):
+        archive.archive_loans(date(2024, 1, 1))
+        reports.build_rollups(until=date(2025, 2, 28))
+        self.assertEqual(reports.summary(date(2023, 3, 1), date(2023, 3, 31))['loans'], 5)
+        self.assertEqual(reports.summary(date(2023, 3, 1), date(2025, 2, 28))['returns'], 6)
+
+        other = Book.objects.create(title='آخر', isbn='9780000000002')
+        Borrow.objects.create(book=other, member=self.member)
+        with tempfile.TemporaryDirectory() as state, override_settings(RECOMMENDATIONS_MIN_SUPPORT=1):
+            recommendations.build(path=os.path.join(state, 'matrix.npz'))
+        self.assertEqual([n.neighbor_id for n in recommendations.also_borrowed(other.pk)], [self.book.pk])
+
+
+class AuditLogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_superuser('manager', password='pass')
+        cls.clerk = User.objects.create_user('clerk', password='pass')
+
+    def setUp(self):
+        overrides = override_settings(AUDIT_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_records_create_update_and_delete_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='كتاب', isbn='9780000000001', total_copies=2, available_copies=2)
+            # Nothing reaches the table before the transaction commits
+            self.assertFalse(AuditEvent.objects.exists())
+        created = AuditEvent.objects.get()
+        self.assertEqual((created.action, created.model, created.object_id), ('create', 'book', str(book.pk)))
+        self.assertEqual(created.changes['title'], [None, 'كتاب'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = 'عنوان جديد'
+            book.save()
+            book.save()  # nothing changed: no event
+        update = AuditEvent.objects.filter(action='update').get()
+        self.assertEqual(update.changes, {'title': ['كتاب', 'عنوان جديد']})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        deleted = AuditEvent.objects.get(action='delete')
+        self.assertEqual(deleted.changes['isbn'], ['9780000000001', None])
+
+    def test_save_reads_the_stored_row_once(self):
+        book = Book.objects.create(title='كتاب', isbn='9780000000001')
+        member = Member.objects.create(user=self.clerk, full_name='عضو', phone='0')
+        loan = Borrow.objects.create(book=book, member=member)
+        for instance, table in ((book, 'books_book'), (loan, 'borrowing_borrow')):
+            with CaptureQueriesContext(connection) as queries:
+                instance.save()
+            sql = [q['sql'] for q in queries]
+            before_update = sql[:next(i for i, query in enumerate(sql) if query.startswith(f'UPDATE "{table}"'))]
+            self.assertEqual(len(before_update), 1, before_update)
+
+    def test_actor_comes_from_the_request(self):
+        book = Book.objects.create(title='كتاب', isbn='9780000000001')
+        self.client.force_login(self.clerk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:book_delete', args=[book.pk]))
+        event = AuditEvent.objects.get(action='delete')
+        self.assertEqual((event.actor, event.actor_name), (self.clerk, 'clerk'))
+
+    def test_returns_and_overdue_sweep_are_recorded(self):
+        book = Book.objects.create(title='كتاب', isbn='9780000000001', total_copies=3, available_copies=3)
+        member = Member.objects.create(user=self.clerk, full_name='عضو', phone='0')
+        employee = Employee.objects.create(user=self.manager, role='manager', phone='0')
+        loans = [circulation.checkout(book, member) for _ in range(3)]
+        AuditEvent.objects.all().delete()
+        self.client.force_login(self.manager)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:borrowing_update', args=[loans[0].pk]), {
+                'book': book.pk, 'member': member.pk, 'employee': employee.pk, 'due_date': loans[0].due_date, 'status': 'returned',
+            })
+        event = AuditEvent.objects.get(model='borrow', object_id=str(loans[0].pk), changes__has_key='status')
+        self.assertEqual(event.changes, {'status': ['active', 'returned'], 'return_date': [None, str(date.today())]})
+        self.assertEqual((event.actor_name, event.object_repr), ('manager', 'كتاب - عضو'))
+
+        Borrow.objects.filter(pk=loans[1].pk).update(due_date=date.today() - timedelta(days=3))
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.sweep_overdue(rates={'basic': Decimal('1.00')})
+        event = AuditEvent.objects.get(model='borrow', object_id=str(loans[1].pk))
+        self.assertEqual(event.changes['status'], ['active', 'overdue'])
+        self.assertEqual(event.object_repr, 'كتاب - عضو')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:desk_return'), {'in-codes': f'{book.isbn}\n{book.isbn}'})
+        events = AuditEvent.objects.filter(model='borrow', object_id__in=[str(loans[1].pk), str(loans[2].pk)],
+                                           changes__has_key='return_date')
+        self.assertEqual(sorted(e.changes['status'][0] for e in events), ['active', 'overdue'])
+
+    def test_viewer_is_manager_only_and_filters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='كتاب', isbn='9780000000001')
+            Member.objects.create(user=self.clerk, full_name='عضو', phone='0')
+
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.client.get(reverse('core:audit_log')).status_code, 302)
+
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('core:audit_log'), {'model': 'member'})
+        self.assertEqual([e.model for e in response.context['events']], ['member'])
+        self.assertContains(response, 'عضو')
+
+        response = self.client.get(reverse('core:audit_log'), {'actor': 'manager'})
+        self.assertEqual(list(response.context['events']), [])
+        plan = AuditEvent.objects.filter(actor_name='manager').order_by('-timestamp', '-id').explain()
+        self.assertIn('audit_actor_name_idx', plan)
+
+
+class AuditListenerTests(TransactionTestCase):
+
+    def test_listener_writes_queued_events_in_batches(self):
+        self.addCleanup(audit.stop)
+        with override_settings(AUDIT_ASYNC=True), CaptureQueriesContext(connection) as queries:
+            for i in range(5):
+                Book.objects.create(title=f'كتاب {i}', isbn=f'978000000000{i}')
+            self.assertTrue(audit.flush(timeout=10))
+        # The saving connection never wrote an audit row; the listener thread did
+        self.assertFalse([q for q in queries if 'INSERT INTO "audit_auditevent"' in q['sql']])
+        self.assertEqual(AuditEvent.objects.filter(action='create', model='book').count(), 5)
+
+
+class IsbnTests(TestCase):
+
+    def test_normalizes_every_scanned_form(self):
+        for code in ('0-306-40615-2', '978-0-306-40615-7', '9780306406157', '978030640615751000', '٩٧٨٠٣٠٦٤٠٦١٥٧'):
+            self.assertEqual(isbn13(code), '9780306406157', code)
+        self.assertEqual(isbn13('080442957x'), '9780804429573')
+        for code in ('9780306406158', '0306406153', '12345', '', None):
+            self.assertIsNone(isbn13(code), code)
+
+    def test_form_validates_checksum_and_stores_isbn13(self):
+        data = {'title': 'كتاب', 'total_copies': 1, 'available_copies': 1, 'status': 'available',
+                'author_names': 'مؤلف', 'category_name': 'أدب'}
+        self.assertFalse(BookForm(data={**data, 'isbn': '9780306406158'}).is_valid())
+        book = BookForm(data={**data, 'isbn': '0-306-40615-2'})
+        self.assertTrue(book.is_valid(), book.errors)
+        book = book.save()
+        self.assertEqual((book.isbn, book.isbn13), ('9780306406157', '9780306406157'))
+        self.assertIn('isbn', BookForm(data={**data, 'isbn': '978-0-306-40615-7'}).errors)
+
+    def test_legacy_code_stays_editable(self):
+        legacy = Book.objects.create(title='قديم', isbn='12345', total_copies=1, available_copies=1)
+        data = {'title': 'قديم ٢', 'isbn': '12345', 'total_copies': 1, 'available_copies': 1, 'status': 'available',
+                'author_names': 'مؤلف', 'category_name': 'أدب'}
+        form = BookForm(data=data, instance=legacy)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().isbn, '12345')
+        self.assertIn('isbn', BookForm(data={**data, 'isbn': '12346'}, instance=legacy).errors)
+
+    def test_duplicate_left_null_can_still_be_saved(self):
+        Book.objects.create(title='أ', isbn='9780306406157')
+        Book.objects.bulk_create([Book(title='ب', isbn='0306406152')])  # as left by migration 0013
+        duplicate = Book.objects.get(isbn='0306406152')
+        duplicate.title = 'ب ٢'
+        duplicate.save()
+        self.assertIsNone(Book.objects.get(pk=duplicate.pk).isbn13)
+
+        duplicate.isbn = '978-0-306-40615-7'
+        with self.assertRaises(ValidationError) as raised:
+            duplicate.full_clean()
+        self.assertIn('isbn', raised.exception.message_dict)
+
+    def test_scan_endpoint_is_one_indexed_query(self):
+        book = Book.objects.create(title='كتاب', isbn='0306406152', total_copies=3, available_copies=2)
+        legacy = Book.objects.create(title='قديم', isbn='LIB-0042')
+        self.assertEqual(book.isbn13, '9780306406157')
+        self.client.force_login(User.objects.create_user('desk'))
+
+        url = reverse('core:api_book_scan')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url, {'code': '978030640615751000'}).json()
+        self.assertEqual((data['id'], data['available_copies'], data['status']), (book.pk, 2, 'available'))
+        self.assertEqual(len([q for q in queries if 'books_book' in q['sql']]), 1)
+        plan = Book.objects.filter(isbn13='9780306406157').explain()
+        self.assertIn('USING INDEX', plan)
+
+        self.assertEqual(self.client.get(url, {'code': 'LIB-0042'}).json()['id'], legacy.pk)
+        missing = self.client.get(url, {'code': '9780804429573'})
+        self.assertEqual((missing.status_code, missing.json()['isbn13']), (404, '9780804429573'))
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class IsbnMigrationTests(TransactionTestCase):
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('core', target)])
+        return executor.loader.project_state([('core', target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_keeps_oldest_of_duplicate_forms(self):
+        OldBook = self.migrate('0012_borrow_archive').get_model('core', 'Book')
+        first = OldBook.objects.create(title='أ', isbn='0-306-40615-2')
+        second = OldBook.objects.create(title='ب', isbn='9780306406157')
+        invalid = OldBook.objects.create(title='ج', isbn='9780000000001')
+
+        Book = self.migrate('0013_book_isbn13').get_model('core', 'Book')
+        stored = dict(Book.objects.values_list('pk', 'isbn13'))
+        self.assertEqual(stored, {first.pk: '9780306406157', second.pk: None, invalid.pk: None})
@@ -0,0 +1,67 @@
+import re
+
+# Tashkeel (fathatan .. sukun), superscript alef and tatweel
+_DIACRITICS = re.compile('[\u064B-\u0652\u0670\u0640]')
+_LETTER_MAP = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و',
+    'ئ': 'ي',
+})
+
+
+def normalize_arabic(text):
+    """
+    Fold the spelling variants people type interchangeably in Arabic
+    (hamza forms of alef, taa marbuta, alef maqsura, diacritics).
+    """
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', text)
+    return text.translate(_LETTER_MAP).lower()
+
+
+def normalize_name(name):
+    """Identity key for author/category names: folded and whitespace-collapsed."""
+    return ' '.join(normalize_arabic(name).split())
+
+
+# ==========================================
+# ISBN
+# ==========================================
+
+# Arabic-Indic and Eastern Arabic-Indic digits typed on Arabic keyboards
+_DIGIT_MAP = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '0123456789' * 2)
+_NOT_ISBN = re.compile('[^0-9X]')
+
+
+def ean13(first12):
+    """Complete 12 digits with their EAN-13 (ISBN-13) check digit."""
+    return first12 + str(-sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(first12)) % 10)
+
+
+def _isbn10_valid(code):
+    total = sum((10 - i) * (10 if d == 'X' else int(d)) for i, d in enumerate(code))
+    return 'X' not in code[:9] and total % 11 == 0
+
+
+def isbn13(code):
+    """
+    Canonical ISBN-13 for any form a person or scanner produces: ISBN-10,
+    ISBN-13, hyphens/spaces, Arabic digits, EAN-13 with a 2 or 5 digit
+    add-on. None when the code is not a valid ISBN (bad length or check digit).
+    """
+    if not code:
+        return None
+    code = _NOT_ISBN.sub('', str(code).translate(_DIGIT_MAP).upper())
+    if len(code) in (15, 18) and code[:3] in ('978', '979'):
+        code = code[:13]  # price/issue add-on printed after the EAN
+    if len(code) == 10 and _isbn10_valid(code):
+        return ean13('978' + code[:9])
+    if len(code) == 13 and code.isdigit() and code[:3] in ('978', '979') and ean13(code[:12]) == code:
+        return code
+    return None
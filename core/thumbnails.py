@@ -0,0 +1,155 @@
+import logging
+import os
+import queue
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'books/thumbs'
+
+# Rendition name -> CSS box in pixels; each is also rendered at 2x for dense screens
+RENDITIONS = {
+    'list': (40, 60),
+    'detail': (200, 300),
+}
+DENSITIES = (1, 2)
+_LARGEST = tuple(max(box[i] for box in RENDITIONS.values()) * max(DENSITIES) for i in (0, 1))
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_name(cover_name, rendition, density, ext):
+    width, height = RENDITIONS[rendition]
+    stem = os.path.splitext(os.path.basename(cover_name))[0]
+    return f'{THUMBNAIL_DIR}/{stem}-{width * density}x{height * density}.{ext}'
+
+
+def _all_names(cover_name):
+    for rendition in RENDITIONS:
+        for density in DENSITIES:
+            for ext in FORMATS:
+                yield thumbnail_name(cover_name, rendition, density, ext)
+
+
+def srcsets(cover_name):
+    """
+    {rendition: {'src', 'webp', 'jpg'}} with srcset strings for the
+    generated files. Pure string work: no storage access per book.
+    """
+    result = {}
+    for rendition in RENDITIONS:
+        urls = {
+            ext: ', '.join(
+                f'{default_storage.url(thumbnail_name(cover_name, rendition, density, ext))} {density}x'
+                for density in DENSITIES
+            )
+            for ext in FORMATS
+        }
+        urls['src'] = default_storage.url(thumbnail_name(cover_name, rendition, 1, 'jpg'))
+        result[rendition] = urls
+    return result
+
+
+def render(cover_name):
+    """Write every rendition of one cover to storage."""
+    from PIL import Image, ImageOps
+
+    with default_storage.open(cover_name, 'rb') as f:
+        image = Image.open(f)
+        # For JPEG sources, let the decoder downscale by 1/2..1/8 up front
+        image.draft('RGB', _LARGEST)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    for rendition, (width, height) in RENDITIONS.items():
+        for density in DENSITIES:
+            # Crop to the box like the templates' object-fit: cover
+            thumb = ImageOps.fit(image, (width * density, height * density), Image.LANCZOS)
+            for ext, (fmt, options) in FORMATS.items():
+                buffer = BytesIO()
+                thumb.save(buffer, fmt, **options)
+                name = thumbnail_name(cover_name, rendition, density, ext)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def remove(cover_name):
+    for name in _all_names(cover_name):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def generate(book_id, old_cover=None):
+    """
+    Render the thumbnails for the book's current cover and mark them ready.
+    The flag is only set if the cover did not change again meanwhile.
+    """
+    cover = Book.objects.filter(pk=book_id).values_list('cover_image', flat=True).first()
+    if old_cover and old_cover != cover:
+        remove(old_cover)
+    if not cover:
+        return False
+    render(cover)
+    # Bumping last_updated also retires the cached list row that showed the full-size cover
+    return bool(Book.objects.filter(pk=book_id, cover_image=cover).update(
+        cover_thumbnail_source=cover, last_updated=timezone.now(),
+    ))
+
+
+# ==========================================
+# BACKGROUND WORKER
+# ==========================================
+
+_queue = queue.Queue()
+_worker = []
+_worker_lock = threading.Lock()
+
+
+def _run():
+    while True:
+        book_id, old_cover = _queue.get()
+        try:
+            close_old_connections()
+            generate(book_id, old_cover)
+        except Exception:
+            logger.exception('Cover thumbnails failed for book %s', book_id)
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+def _ensure_worker():
+    with _worker_lock:
+        if not _worker or not _worker[0].is_alive():
+            thread = threading.Thread(target=_run, name='cover-thumbnails', daemon=True)
+            thread.start()
+            _worker[:] = [thread]
+
+
+def schedule(book_id, old_cover=None):
+    """Queue thumbnail generation once the surrounding transaction commits."""
+    def enqueue():
+        if not getattr(settings, 'THUMBNAILS_ASYNC', True):
+            generate(book_id, old_cover)
+            return
+        _ensure_worker()
+        _queue.put((book_id, old_cover))
+
+    transaction.on_commit(enqueue)
+
+
+def wait(timeout=None):
+    """Block until the worker has drained its queue (for commands and tests)."""
+    with _queue.all_tasks_done:
+        return _queue.all_tasks_done.wait_for(lambda: not _queue.unfinished_tasks, timeout)
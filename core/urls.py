@@ -1,23 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
 
 app_name = 'core'
 
+# Read-only pages have async twins for ASGI deployments
+read = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     
-    path('dashboard/', views.home, name='home'),
+    path('dashboard/', read.home, name='home'),
+    path('metrics', views.metrics_view, name='metrics'),
     
     
-    path('books/', views.book_list, name='book_list'),
+    path('books/', read.book_list, name='book_list'),
+    path('books/search/', views.book_search, name='book_search'),
     path('books/create/', views.book_create, name='book_create'),
-    path('books/<int:pk>/', views.book_detail, name='book_detail'),
+    path('books/<int:pk>/', read.book_detail, name='book_detail'),
     path('books/<int:pk>/update/', views.book_update, name='book_update'),
     path('books/<int:pk>/delete/', views.book_delete, name='book_delete'),
 
     
     path('members/', views.member_list, name='member_list'),
     path('members/create/', views.member_create, name='member_create'),
-    path('members/<int:pk>/', views.member_detail, name='member_detail'),
+    path('members/<int:pk>/', read.member_detail, name='member_detail'),
+    path('members/<int:pk>/loans/', views.member_loans, name='member_loans'),
     path('members/<int:pk>/update/', views.member_update, name='member_update'),
     path('members/<int:pk>/delete/', views.member_delete, name='member_delete'),
     path('signup/', views.SignUpView.as_view(), name='signup'),
@@ -30,9 +37,31 @@ urlpatterns = [
     path('employees/<int:pk>/delete/', views.employee_delete, name='employee_delete'),
 
     
-    path('borrowing/', views.borrowing_list, name='borrowing_list'),
+    path('borrowing/', read.borrowing_list, name='borrowing_list'),
     path('borrowing/create/', views.borrowing_create, name='borrowing_create'),
-    path('borrowing/<int:pk>/', views.borrowing_detail, name='borrowing_detail'),
+    path('borrowing/export/', views.borrowing_export, name='borrowing_export'),
+    path('borrowing/desk/', views.circulation_desk, name='circulation_desk'),
+    path('borrowing/desk/checkout/', views.desk_checkout, name='desk_checkout'),
+    path('borrowing/desk/return/', views.desk_return, name='desk_return'),
+    path('borrowing/<int:pk>/', read.borrowing_detail, name='borrowing_detail'),
     path('borrowing/<int:pk>/update/', views.borrowing_update, name='borrowing_update'),
     path('borrowing/<int:pk>/delete/', views.borrowing_delete, name='borrowing_delete'),
+
+    
+    path('reservations/', views.reservation_list, name='reservation_list'),
+    path('reservations/create/', views.reservation_create, name='reservation_create'),
+    path('reservations/<int:pk>/cancel/', views.reservation_cancel, name='reservation_cancel'),
+
+    
+    path('reports/', views.circulation_report, name='circulation_report'),
+    path('audit/', views.audit_log, name='audit_log'),
+
+    
+    path('api/books/', api.book_list, name='api_book_list'),
+    path('api/books/lookup/', api.book_lookup, name='api_book_lookup'),
+    path('api/books/scan/', api.book_scan, name='api_book_scan'),
+    path('api/books/<int:pk>/', api.book_detail, name='api_book_detail'),
+    path('api/books/<int:pk>/availability/', api.book_availability, name='api_book_availability'),
+    path('api/authors/', api.author_list, name='api_author_list'),
+    path('api/categories/', api.category_list, name='api_category_list'),
 ]
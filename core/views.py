@@ -1,11 +1,26 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Book, Author, Category, Member, Employee, Borrow
-from .forms import BookForm, MemberForm, EmployeeForm, EmployeeUpdateForm, BorrowForm
+from .models import AuditEvent, Book, Author, Category, Member, Employee, Borrow, Reservation
+from . import archive, circulation, exports, metrics, recommendations, reports
+from .auth import is_manager
+from .forms import BookForm, MemberForm, EmployeeForm, EmployeeUpdateForm, BorrowForm, DeskCheckoutForm, DeskReturnForm, LoanExportForm, ReservationForm, ReportPeriodForm
+from .pagination import keyset_paginate, keyset_paginate_merged
+from .search import search_books
+from .stats import get_dashboard_counters
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.http import require_POST
 from django.contrib.auth.forms import UserCreationForm
 from django.urls import reverse_lazy
 from django.views import generic
+from datetime import date, timedelta
+import re
+import tempfile
 
 # ==========================================
 # DASHBOARD / HOME VIEW
@@ -13,18 +28,32 @@ from django.views import generic
 
 @login_required
 def home(request):
+    # Totals come from the materialized counters, not COUNT(*) on every hit
     context = {
-        'total_books': Book.objects.count(),
-        'total_members': Member.objects.count(),
-        'total_employees': Employee.objects.count(),
-        'total_borrowed': Borrow.objects.filter(status='active').count(),
+        **get_dashboard_counters(),
         'latest_books': Book.objects.select_related('category').order_by('-id')[:5],
         'latest_borrowings': Borrow.objects.select_related('book', 'member').order_by('-borrow_date')[:5],
     }
     return render(request, 'index.html', context)
 
 def is_manager_or_admin(user):
-    return user.is_superuser or (hasattr(user, 'employee') and user.employee.role == 'manager')
+    # Cached role lookup: shared with the is_manager context processor
+    return is_manager(user)
+
+# ==========================================
+# METRICS VIEW
+# ==========================================
+
+def metrics_view(request):
+    # Staff session, or the METRICS_TOKEN bearer token for Prometheus scrapers
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized and token:
+        authorized = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized:
+        return HttpResponseForbidden()
+    body = metrics.render_prometheus(metrics.collect())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # ==========================================
 # ==========================================
@@ -34,8 +63,15 @@ def is_manager_or_admin(user):
 @login_required
 def book_list(request):
     # Optimize: select_related for ForeignKey, prefetch_related for ManyToMany
-    books = Book.objects.select_related('category').prefetch_related('authors').all()
-    return render(request, 'books/book_list.html', {'books': books})
+    books = Book.objects.select_related('category').prefetch_related('authors')
+    page = keyset_paginate(request, books, keys=('id',))
+    return render(request, 'books/book_list.html', {'books': page, 'page': page})
+
+@login_required
+def book_search(request):
+    query = request.GET.get('q', '').strip()
+    books = search_books(query) if query else []
+    return render(request, 'books/book_list.html', {'books': books, 'query': query})
 
 @login_required
 def book_create(request):
@@ -71,7 +107,9 @@ def book_delete(request, pk):
 @login_required
 def book_detail(request, pk):
     book = get_object_or_404(Book, pk=pk)
-    return render(request, 'books/book_detail.html', {'book': book, 'title': book.title})
+    return render(request, 'books/book_detail.html', {
+        'book': book, 'title': book.title, 'also_borrowed': recommendations.also_borrowed(book.pk, limit=6),
+    })
 
 # ==========================================
 # MEMBERS VIEWS
@@ -79,13 +117,28 @@ def book_detail(request, pk):
 
 @login_required
 def member_detail(request, pk):
+    member = get_object_or_404(circulation.with_borrow_stats(Member.objects.all()), pk=pk)
+    return render(request, 'members/member_detail.html', {
+        'member': member, 'title': member.full_name, 'suggestions': recommendations.suggested_for(member.pk),
+    })
+
+@login_required
+def member_loans(request, pk):
     member = get_object_or_404(Member, pk=pk)
-    return render(request, 'members/member_detail.html', {'member': member, 'title': member.full_name})
+    # Only the live table unless the archived history is asked for
+    history = request.GET.get('history') == '1'
+    page = keyset_paginate_merged(
+        request, archive.member_loans(member.pk, history), keys=('borrow_date', 'id'), descending=True,
+    )
+    return render(request, 'members/member_loans.html', {
+        'member': member, 'loans': page, 'page': page, 'history': history, 'title': member.full_name,
+    })
 
 @login_required
 def member_list(request):
-    members = Member.objects.all()
-    return render(request, 'members/member_list.html', {'members': members})
+    # Live loan counts and percentages come from one correlated subquery per page, not per-row lookups
+    page = keyset_paginate(request, circulation.with_borrow_stats(Member.objects.all()), keys=('id',))
+    return render(request, 'members/member_list.html', {'members': page, 'page': page})
 
 @login_required
 def member_create(request):
@@ -140,9 +193,6 @@ def employee_list(request):
     employees = Employee.objects.select_related('user').all()
     return render(request, 'employees/employee_list.html', {'employees': employees})
 
-def is_manager_or_admin(user): 
-    return user.is_superuser or (hasattr(user, 'employee') and user.employee.role == 'manager')
-
 @login_required
 @user_passes_test(is_manager_or_admin)
 def employee_create(request):
@@ -209,28 +259,95 @@ def borrowing_detail(request, pk):
 @login_required
 def borrowing_list(request):
     # Optimize: select_related for all related foreign keys
-    borrowings = Borrow.objects.select_related('book', 'member', 'employee__user').all()
-    return render(request, 'borrowing/borrow_list.html', {'borrowings': borrowings})
+    borrowings = Borrow.objects.select_related('book', 'member', 'employee__user')
+    # Newest loans first, seeking on (borrow_date, id) so the page never needs OFFSET
+    page = keyset_paginate(request, borrowings, keys=('borrow_date', 'id'), descending=True)
+    return render(request, 'borrowing/borrow_list.html', {'borrowings': page, 'page': page})
 
 @login_required
 def borrowing_create(request):
     if request.method == 'POST':
         form = BorrowForm(request.POST)
         if form.is_valid():
-            form.save()
-            return redirect('core:borrowing_list')
+            data = form.cleaned_data
+            try:
+                circulation.checkout(data['book'], data['member'], employee=data['employee'], due_date=data['due_date'])
+            except circulation.CirculationError as e:
+                form.add_error(None, e)
+            else:
+                return redirect('core:borrowing_list')
     else:
         form = BorrowForm()
     return render(request, 'borrowing/borrow_form.html', {'form': form, 'title': 'تسجيل إعارة جديدة'})
 
+# Circulation desk: a member card and a stream of scanned ISBNs per POST
+
+def _desk(request, checkout_form=None, return_form=None, **result):
+    return render(request, 'borrowing/desk.html', {
+        'checkout_form': checkout_form or DeskCheckoutForm(prefix='out'),
+        'return_form': return_form or DeskReturnForm(prefix='in'),
+        'title': 'مكتب الإعارة', **result,
+    })
+
+@login_required
+def circulation_desk(request):
+    return _desk(request)
+
+@login_required
+@require_POST
+def desk_checkout(request):
+    form = DeskCheckoutForm(request.POST, prefix='out')
+    if form.is_valid():
+        data = form.cleaned_data
+        try:
+            loans = circulation.checkout_many(
+                data['codes'], data['member'], employee=Employee.objects.filter(user=request.user).first(),
+                due_date=data['due_date'],
+            )
+        except circulation.CirculationError as e:
+            form.add_error(None, e)
+        else:
+            return _desk(request, member=data['member'], checked_out=loans)
+    return _desk(request, checkout_form=form)
+
+@login_required
+@require_POST
+def desk_return(request):
+    form = DeskReturnForm(request.POST, prefix='in')
+    if form.is_valid():
+        try:
+            with transaction.atomic():
+                loans = circulation.open_loans_for(form.cleaned_data['codes'], form.cleaned_data['member'])
+                circulation.return_many(loans)
+        except circulation.CirculationError as e:
+            form.add_error(None, e)
+        else:
+            return _desk(request, returned=loans)
+    return _desk(request, return_form=form)
+
 @login_required
 def borrowing_update(request, pk):
     borrow = get_object_or_404(Borrow, pk=pk)
+    was_open = borrow.status in circulation.OPEN_STATUSES
     if request.method == 'POST':
         form = BorrowForm(request.POST, instance=borrow)
         if form.is_valid():
-            form.save()
-            return redirect('core:borrowing_list')
+            closing = was_open and form.cleaned_data['status'] == 'returned'
+            if was_open and ({'book', 'member'} & set(form.changed_data)):
+                form.add_error(None, 'لا يمكن تغيير الكتاب أو العضو لإعارة مفتوحة، قم بإرجاعها ثم سجل إعارة جديدة.')
+            elif not was_open and form.cleaned_data['status'] != 'returned':
+                form.add_error('status', 'لا يمكن إعادة فتح إعارة مرجعة، قم بتسجيل إعارة جديدة.')
+            else:
+                try:
+                    with transaction.atomic():
+                        if closing:
+                            # Copies and member slots are only released through the circulation service
+                            circulation.return_loan(borrow, return_date=form.cleaned_data['return_date'])
+                        form.save()
+                except circulation.CirculationError as e:
+                    form.add_error(None, e)
+                else:
+                    return redirect('core:borrowing_list')
     else:
         form = BorrowForm(instance=borrow)
     return render(request, 'borrowing/borrow_form.html', {'form': form, 'title': 'تعديل بيانات الإعارة'})
@@ -239,10 +356,132 @@ def borrowing_update(request, pk):
 def borrowing_delete(request, pk):
     borrow = get_object_or_404(Borrow, pk=pk)
     if request.method == 'POST':
-        borrow.delete()
+        with transaction.atomic():
+            if borrow.status in circulation.OPEN_STATUSES:
+                circulation.return_loan(borrow)
+            borrow.delete()
         return redirect('core:borrowing_list')
     return render(request, 'borrowing/borrow_confirm_delete.html', {'borrow': borrow})
 
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+@login_required
+@user_passes_test(is_manager_or_admin)
+def borrowing_export(request):
+    form = LoanExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    data = form.cleaned_data
+    filters = (data['date_from'], data['date_to'], data['status'], data['member'])
+    # Archived loans are only read when the export asks for history
+    archived = exports.archived_queryset(*filters) if data['history'] else None
+    rows = exports.iter_loan_rows(exports.loan_queryset(*filters), archived=archived)
+    filename = f'loans-{date.today():%Y%m%d}'
+
+    if data['format'] == 'xlsx':
+        # xlsx is a zip archive, so it is spooled to a temp file rather than streamed
+        stream = tempfile.TemporaryFile()
+        exports.write_xlsx(rows, stream)
+        stream.seek(0)
+        return FileResponse(stream, as_attachment=True, filename=f'{filename}.xlsx')
+
+    response = StreamingHttpResponse(exports.iter_csv(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if _accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response.streaming_content = compress_sequence(response.streaming_content)
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+# ==========================================
+# RESERVATIONS VIEWS
+# ==========================================
+
+@login_required
+def reservation_list(request):
+    reservations = Reservation.objects.select_related('book', 'member')
+    status = request.GET.get('status')
+    if status in dict(Reservation.STATUS_CHOICES):
+        reservations = reservations.filter(status=status)
+    page = keyset_paginate(request, reservations, keys=('id',), descending=True)
+    return render(request, 'reservations/reservation_list.html', {
+        'reservations': page, 'page': page, 'status': status, 'status_choices': Reservation.STATUS_CHOICES,
+    })
+
+@login_required
+def reservation_create(request):
+    if request.method == 'POST':
+        form = ReservationForm(request.POST)
+        if form.is_valid():
+            try:
+                circulation.place_hold(form.cleaned_data['book'], form.cleaned_data['member'])
+            except circulation.CirculationError as e:
+                form.add_error(None, e)
+            else:
+                return redirect('core:reservation_list')
+    else:
+        form = ReservationForm()
+    return render(request, 'reservations/reservation_form.html', {'form': form, 'title': 'حجز كتاب'})
+
+@login_required
+@require_POST
+def reservation_cancel(request, pk):
+    reservation = get_object_or_404(Reservation, pk=pk)
+    try:
+        circulation.cancel_hold(reservation)
+    except circulation.CirculationError:
+        pass  # already collected, expired or cancelled
+    return redirect('core:reservation_list')
+
+# ==========================================
+# REPORTS VIEWS
+# ==========================================
+
+@login_required
+@user_passes_test(is_manager_or_admin)
+def circulation_report(request):
+    # Reads only the monthly rollups (build_circulation_rollups), never the Borrow table
+    form = ReportPeriodForm(request.GET)
+    data = form.cleaned_data if form.is_valid() else {}
+    date_to = reports.month_end(data.get('date_to') or date.today())
+    date_from = reports.month_start(data.get('date_from') or date_to - timedelta(days=365))
+    return render(request, 'reports/circulation_report.html', {
+        'form': form,
+        'date_from': date_from,
+        'date_to': date_to,
+        'rolled_up_through': reports.rolled_up_through(),
+        'summary': reports.summary(date_from, date_to),
+        'top_books': reports.top_books(date_from, date_to),
+        'categories': reports.by_category(date_from, date_to),
+        'membership_types': reports.by_membership_type(date_from, date_to),
+        'months': reports.monthly_trend(date_from, date_to),
+        'title': 'تقارير الإعارة',
+    })
+
+# ==========================================
+# AUDIT LOG VIEWS
+# ==========================================
+
+AUDITED_MODELS = {'book': 'الكتب', 'member': 'الأعضاء', 'employee': 'الموظفين', 'borrow': 'الإعارات'}
+
+@login_required
+@user_passes_test(is_manager_or_admin)
+def audit_log(request):
+    events = AuditEvent.objects.all()
+    filters = {name: request.GET.get(name, '').strip() for name in ('model', 'action', 'actor', 'object_id')}
+    if filters['model'] in AUDITED_MODELS:
+        events = events.filter(model=filters['model'])
+        if filters['object_id']:
+            events = events.filter(object_id=filters['object_id'])
+    if filters['action'] in dict(AuditEvent.ACTION_CHOICES):
+        events = events.filter(action=filters['action'])
+    if filters['actor']:
+        events = events.filter(actor_name=filters['actor'])
+    page = keyset_paginate(request, events, keys=('timestamp', 'id'), descending=True)
+    return render(request, 'audit/audit_list.html', {
+        'events': page, 'page': page, 'filters': filters,
+        'models': AUDITED_MODELS, 'actions': AuditEvent.ACTION_CHOICES, 'title': 'سجل التدقيق',
+    })
 
 import logging
 # استدعاء الـ logger الذي عرفناه في settings
@@ -0,0 +1,20 @@
+# Gunicorn settings for serving library.asgi with uvicorn workers:
+#
+#   gunicorn -c gunicorn_asgi.conf.py library.asgi:application
+#
+# Single-process alternative for development:
+#
+#   uvicorn library.asgi:application --workers 2
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
+worker_class = 'uvicorn_worker.UvicornWorker'
+# SQLite has a single writer, so more workers than cores only adds lock contention
+workers = int(os.getenv('GUNICORN_WORKERS', min(4, multiprocessing.cpu_count())))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth
+max_requests = 2000
+max_requests_jitter = 200
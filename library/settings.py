@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,11 +57,13 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.AuditActorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # 'axes.middleware.AxesMiddleware',  # Disabled for performance on free hosting
@@ -93,10 +96,33 @@ WSGI_APPLICATION = 'library.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH') or BASE_DIR / 'db.sqlite3',
+        # Keep each worker's connection (and its PRAGMAs) instead of reopening per request
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN: a read-then-write transaction can then wait
+            # on busy_timeout instead of failing at once with "database is locked".
+            # Trade-off: every atomic() block takes that lock, so transactions are
+            # serialized even when they turn out to only read (reads outside atomic()
+            # are unaffected). Keep atomic() to write paths; set DEFERRED to opt out.
+            # Requires Django >= 5.1.
+            'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000,
+        },
     }
 }
 
+# Applied to every new SQLite connection by core.sqlite.configure (empty value: skip)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),  # readers no longer block the writer
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # safe with WAL, fsync only at checkpoints
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),  # negative: KiB per connection
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -143,6 +169,82 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Render cover thumbnails in a background thread (False: right after commit, in-process)
+THUMBNAILS_ASYNC = os.getenv('THUMBNAILS_ASYNC', 'True') == 'True'
+
+# Route the read-only pages to core/async_views.py (library/asgi.py turns this on)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# Audit log: events are queued in-process and written in batches by a listener
+# thread (False: written right after commit, e.g. for tests)
+AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'True') == 'True'
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '1.0'))
+
+# Days a returned copy stays on the hold shelf for the member next in line
+HOLD_PICKUP_DAYS = int(os.getenv('HOLD_PICKUP_DAYS', '3'))
+
+# archive_loans moves returned loans older than this many full years out of borrowing_borrow
+LOAN_ARCHIVE_KEEP_YEARS = int(os.getenv('LOAN_ARCHIVE_KEEP_YEARS', '1'))
+
+# List pagination (keyset / cursor based)
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '25'))
+LIST_MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', '100'))
+
+# Most ids + ISBNs accepted by one call to the JSON bulk lookup (api/books/lookup/)
+API_LOOKUP_LIMIT = int(os.getenv('API_LOOKUP_LIMIT', '500'))
+
+# "Also borrowed" recommendations (build_recommendations): neighbours kept per book,
+# members two books must share to count, and where the co-occurrence matrix is kept
+RECOMMENDATIONS_TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', '10'))
+RECOMMENDATIONS_MIN_SUPPORT = int(os.getenv('RECOMMENDATIONS_MIN_SUPPORT', '2'))
+RECOMMENDATIONS_MATRIX = os.getenv('RECOMMENDATIONS_MATRIX', str(BASE_DIR / 'recommendations.npz'))
+
+# Maximum number of ranked results returned by the catalog search
+SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', '50'))
+
+# Shared cache for all workers: dashboard counters, cached users/roles and
+# cached_db sessions, all of which must be invalidated across processes.
+# Point CACHE_BACKEND/CACHE_LOCATION at memcached or redis in production; the
+# file backend is only a no-extra-service fallback, and lists its directory
+# on every write, so it must stay small.
+#
+# Rendered catalog rows live in their own per-process cache: their keys are
+# versioned by Book.last_updated (never invalidated, only left to expire), so
+# they need no sharing and must not crowd the shared entries out.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'library_cache')),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', '300')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000'))},
+    },
+    'fragments': {
+        'BACKEND': os.getenv('FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('FRAGMENT_CACHE_LOCATION', 'library-fragments'),
+        # Seconds a rendered catalog row stays cached
+        'TIMEOUT': int(os.getenv('FRAGMENT_CACHE_TTL', '86400')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', '5000'))},
+    },
+}
+
+# Seconds the dashboard counters may be served from cache
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '30'))
+
+# Per-view request metrics (served at /metrics). With several gunicorn workers,
+# point METRICS_DIR at a shared directory so a scrape reports the whole pool.
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', '15'))
+# Optional bearer token for Prometheus, as an alternative to a staff session
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Overdue fine per day, by Member.membership_level (used by sweep_overdue)
+FINE_RATES_PER_DAY = {
+    'regular': os.getenv('FINE_RATE_REGULAR', '1.00'),
+    'silver': os.getenv('FINE_RATE_SILVER', '0.50'),
+    'gold': os.getenv('FINE_RATE_GOLD', '0.25'),
+}
+
 # Authentication Redirects
 # Authentication Redirects
 LOGIN_REDIRECT_URL = 'core:home' 
@@ -151,9 +253,20 @@ LOGIN_URL = 'login'
 
 AUTHENTICATION_BACKENDS = [
     'axes.backends.AxesBackend', # يدعم تسجيل المحاولات الفاشلة
+    # ModelBackend with get_user() served from the cache (see core/auth.py)
+    'core.auth.CachedModelBackend',
+    # Transition only: sessions opened before CachedModelBackend still name this
+    # backend and would be logged out without it. Remove once they have expired
+    # (SESSION_COOKIE_AGE, two weeks by default).
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Seconds a user row / employee role may be served from cache (dropped on change anyway)
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', '3600'))
+
 AXES_FAILURE_LIMIT = 5             # الحد الأقصى للمحاولات
 AXES_COOLOFF_TIME = 1              # مدة الحظر (بالساعات)
 AXES_LOCK_OUT_BY_COMBINATION_USER_AND_IP = True  # الحظر بناءً على اسم المستخدم والـ IP معاً